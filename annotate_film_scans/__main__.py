@@ -16,8 +16,8 @@
 #### imports ####
 import sys
 
-from . import app as app
 from .constants import Constants
+from .__version__ import __version__
 
 ##############################################################################
 #
@@ -28,7 +28,25 @@ from .constants import Constants
 def main_inner() -> int:
     global gApp
 
+    # --version on its own needs nothing else; this is the same output
+    # as argparse would give, without importing the app.
+    if sys.argv[1:] == [ "--version" ]:
+        print(f"annotate_film_scans v{__version__}")
+        return 0
+
+    # subcommands
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from . import batch
+        return batch.main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "validate":
+        from . import validate
+        return validate.main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        from . import watch
+        return watch.main(sys.argv[2:])
+
     # create an app object
+    from . import app
     try:
         gApp = app.App()
     except Exception as e:
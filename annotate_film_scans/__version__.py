@@ -13,6 +13,7 @@
 #
 ##############################################################################
 
-# use the version from pyproject.toml:
-from importlib.metadata import version as _version
-__version__ = _version("annotate_film_scans")
+# This is the one place the version is set; pyproject.toml reads it from
+# here (see [tool.hatch.version]). It used to come from importlib.metadata,
+# but importing that took longer than the rest of startup put together.
+__version__ = "3.0.0b6"	# uv won't accept 3.0.0-pre1, makes it 3.0.0rc1; so use a for Alpha, b for Beta, or rc.
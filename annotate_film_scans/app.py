@@ -17,20 +17,26 @@
 import argparse
 import copy
 from datetime import datetime, timezone
-from importlib.resources import files as importlib_files
-import itertools
 import json
-import jsons
 import logging
+import os
 import pathlib
-import re
-import subprocess
-from typing import Union
+import threading
+import time
 
 from .constants import Constants
-from .shotinfo import ShotInfoFile
+from .fieldparsers import comment_key
+from .fileutil import atomic_write_text, fast_copy, is_partial_path, partial_path, prefetch_file
+from .manifest import Journal, Manifest
+from .plan import Plan
+from .settings import SettingsCatalog
+from .stats import Stats
 from .__version__ import __version__
 
+# The rest of our modules, and the heavier library modules, are imported
+# where they're first needed, so that `--help`, `--version` and argument
+# errors don't pay for them.
+
 ##############################################################################
 #
 # The application class
@@ -38,25 +44,29 @@ from .__version__ import __version__
 ##############################################################################
 
 class App():
-    def __init__(self):
+    def __init__(self, argv: list | None = None, settings: dict | None = None, exiftool: "ExifToolPool | None" = None, check_only: bool = False):
+        """
+        Set up the app from argv (default: the command line). A caller
+        running many rolls can pass in settings (from App.load_settings())
+        and an exiftool pool to share; a shared pool is not closed by run().
+
+        If check_only, the app is only used to read the shot-info file
+        (see validate.py): input files and the output directory are
+        optional, and run() must not be called.
+        """
         # load the constants
         self.constants = Constants()
+        self.check_only = check_only
 
-        # read the JSON settings file -- this is needed for arguments
-        settings_file = importlib_files("annotate_film_scans").joinpath("settings.json")
-        if not settings_file.is_file():
-            raise self.Error(f"Can't find setup JSON file: {settings_file}")
-
-        settings_text = ""
-        try:
-            settings_text = settings_file.read_text()
-        except:
-            raise self.Error(f"Can't read: {settings_file}")
-
-        self.settings = jsons.loads(settings_text)
+        # read the JSON settings files -- this is needed for arguments,
+        # and depends on where the shot-info file is.
+        if settings == None:
+            settings = self.load_settings(self._find_shot_info_dir(argv))
+        self.settings = settings
+        self.shared_exiftool = exiftool
 
         # now parse the args
-        args = self._parse_arguments()
+        args = self._parse_arguments(argv)
         self.args = args
 
         # initialize logging
@@ -74,16 +84,108 @@ class App():
         self.log.info("App is initialized")
         return
 
+    @classmethod
+    def load_settings(cls, directory: pathlib.Path | None = None) -> dict:
+        """
+        read the settings: the packaged settings.json, as changed by the
+        user's settings and those for the shot-info file's directory
+        (merged and cached; see SettingsCatalog)
+        """
+        try:
+            return SettingsCatalog(directory).load()
+        except SettingsCatalog.Error as e:
+            raise cls.Error(str(e))
+
+    #
+    # The settings are needed to set up the parser, so find the
+    # shot-info file (if any) the hard way first.
+    #
+    @staticmethod
+    def _find_shot_info_dir(argv: list | None) -> pathlib.Path | None:
+        parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+        parser.add_argument("--shot-info-file", "-s", type=pathlib.Path)
+        args, _ = parser.parse_known_args(argv)
+        if args.shot_info_file == None:
+            return None
+        return args.shot_info_file.expanduser().parent
+
     def _initialize(self):
         self.log.debug("App.initialize called")
         self.outputDir = self.args.dir
-        if not self.outputDir.exists():
+        if self.args.execute_plan == None and not self.check_only and not self.outputDir.exists():
             raise self.Error("Output directory does not exist: " + str(self.outputDir) + " -- either create it or use the -d switch to select a different one")
 
+        # no input files: find them.
+        if self.args.execute_plan == None and not self.check_only and len(self.args.input_files) == 0:
+            self._find_input_files()
+
+        # scanner make/model, by input path, and the chunks of input
+        # files they're for; filled by _prefetch_make_model()
+        self.make_model = dict()
+        self.prefetched = dict()
+
+        # what run() did, for summaries: frames planned, written,
+        # skipped because they were already up to date, and linked to
+        # identical outputs (--link-duplicates); and earlier outputs
+        # that no frame makes any more (see _check_stale_outputs()).
+        self.counts = { "frames": 0, "written": 0, "current": 0, "linked": 0, "stale": 0 }
+        self.counts_lock = threading.Lock()
+
+        # where the time goes, for --stats and --stats-json
+        self.stats = Stats()
+
+    #
+    # With no input files given, use the images next to the shot-info
+    # file; or else, the images in the one directory named for the roll
+    # (--roll, or the shot-info file's directory) under the scan roots.
+    # They're found through the ScanCatalog, in natural order.
+    #
+    # Unless --forward or --reverse is given, the order is the one last
+    # given for that directory (a lab's scans of a kind of film tend to
+    # come back the same way each time); and if one is given, it's
+    # remembered. The shot-info file's Forward option overrides both.
+    #
+    def _find_input_files(self) -> None:
+        from .catalog import ScanCatalog
+        args = self.args
+        catalog = ScanCatalog(self.log).load()
+        try:
+            scan_dir = args.shot_info_file.expanduser().parent
+            input_files = catalog.images(scan_dir)
+            if len(input_files) == 0 and len(args.scan_roots) != 0:
+                names = [ args.roll ] if args.roll != None else []
+                names.append(scan_dir.absolute().name)
+                for name in names:
+                    found = catalog.find(name, args.scan_roots)
+                    if len(found) > 1:
+                        raise self.Error(f"more than one directory of scans for roll {name}: {', '.join(str(path) for path in found)}")
+                    if len(found) == 1:
+                        scan_dir = found[0]
+                        input_files = catalog.images(scan_dir)
+                        break
+            if len(input_files) == 0:
+                where = "next to the shot-info file" + (" or under the scan roots" if len(args.scan_roots) != 0 else "")
+                raise self.Error(f"no input files given, and no images found {where}")
+            self.log.info("found %d input files in %s", len(input_files), scan_dir)
+
+            if args.forward == None:
+                args.forward = catalog.get_forward(scan_dir)
+                if args.forward != None:
+                    self.log.info("using the order last given for %s: %s", scan_dir, "forward" if args.forward else "reverse")
+            else:
+                catalog.set_forward(scan_dir, args.forward)
+            args.input_files = input_files
+        finally:
+            catalog.save()
+
+    def _count(self, name: str) -> None:
+        with self.counts_lock:
+            self.counts[name] += 1
+
     #######################
     # parse the arguments #
     #######################
-    def _parse_arguments(self):
+    def _parse_arguments(self, argv: list | None = None):
         constants = self.constants
         settings = self.settings
         parser = argparse.ArgumentParser(
@@ -112,8 +214,26 @@ class App():
         parser.add_argument(
             "--forward", "-f",
             action='store_true',
+            default=None,
             help="number files in ascending order, rather than reversing; many scans are in reverse order compared to the film"
             )
+        parser.add_argument(
+            "--reverse",
+            dest="forward",
+            action='store_false',
+            help="number files in descending order (the default; but if the input files are found automatically, the default is the order last given for their directory)"
+            )
+        parser.add_argument(
+            "--order",
+            choices=Constants.INPUT_ORDERS,
+            help=f"put the input files in this order before numbering them: as given (the default), by name in natural order, by the time each was scanned (from its EXIF data), or as listed in an order map (--order-map, or {Constants.ORDER_MAP_NAME} next to the shot-info file)"
+            )
+        parser.add_argument(
+            "--order-map",
+            metavar="{map}",
+            type=pathlib.Path,
+            help="a file listing the input files' names, one to a line, in the order of the frames on the film; implies --order map"
+            )
         parser.add_argument(
             "--camera",
             default=list(settings["camera"])[0],
@@ -177,13 +297,115 @@ class App():
         parser.add_argument(
             "input_files",
             metavar="{InputFile}",
-            nargs="+",
-            help="Name of an input file, generally a pattern ending in .jpg"
+            nargs="*",
+            help="Name of an input file, generally a pattern ending in .jpg (default: the images next to the shot-info file, or in a directory named for the roll under a --scan-root)"
+            )
+        parser.add_argument(
+            "--scan-root",
+            metavar="{dir}",
+            dest="scan_roots",
+            action="append",
+            type=pathlib.Path,
+            default=[],
+            help=f"if no input files are given, and there are no images next to the shot-info file, look for them in a directory named for the roll (--roll, or the shot-info file's directory) in this tree; may be repeated (also: ${Constants.SCAN_ROOTS_ENV})"
             )
         parser.add_argument(
             "--dry-run", "-n",
             action="store_true",
-            help="go through the motions, but don't write files"
+            help=f"plan the run, but don't write any images; just write the plan (to --plan, or {Constants.PLAN_NAME} in the output directory)"
+        )
+        parser.add_argument(
+            "--plan",
+            metavar="{plan-json}",
+            type=pathlib.Path,
+            help="write the plan (every frame's input, output and tags) to this file"
+        )
+        parser.add_argument(
+            "--execute-plan",
+            metavar="{plan-json}",
+            type=pathlib.Path,
+            help="write the frames in a plan saved by an earlier run (with --plan or --dry-run), rather than reading a shot-info file"
+        )
+        parser.add_argument(
+            "--frames",
+            metavar="{first}[-{last}]",
+            help="with --execute-plan, write only the plan's frames numbered first to last (or just first), so a plan can be split between runs or machines"
+        )
+        parser.add_argument(
+            "--output-mode",
+            dest="output_mode",
+            choices=("rewrite", "inplace", "sidecar"),
+            default="rewrite",
+            help="how to write each output: 'rewrite' has exiftool read the input and write a new output; 'inplace' makes a fast copy (reflink or link where possible) and has exiftool edit that; 'sidecar' links the image and writes the tags to an .xmp file next to it (default %(default)s)"
+        )
+        parser.add_argument(
+            "--in-place",
+            dest="output_mode",
+            action="store_const",
+            const="inplace",
+            help="same as --output-mode inplace"
+        )
+        parser.add_argument(
+            "--sidecar",
+            dest="output_mode",
+            action="store_const",
+            const="sidecar",
+            help="same as --output-mode sidecar"
+        )
+        parser.add_argument(
+            "--define-namespaces",
+            action="store_true",
+            help="start exiftool with a config defining the XMP-AnalogExif and XMP-AnnotateFilmScans namespaces as the sidecar writer writes them (in place of any definitions of them in your ~/.ExifTool_config, which is otherwise loaded as usual)"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="continue an interrupted run: skip the frames its journal shows were completed"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="write every frame, even if the output directory's manifest shows it's already up to date"
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="remove the outputs that earlier runs wrote into the output directory, but that no frame of this run makes (for example, because the frames were matched to different files); otherwise they're only reported"
+        )
+        parser.add_argument(
+            "--find-duplicates",
+            action="store_true",
+            help="hash the input files (in the background; hashes are kept between runs) and warn about identical scans used for different frames, or seen before in other rolls"
+        )
+        parser.add_argument(
+            "--link-duplicates",
+            action="store_true",
+            help="like --find-duplicates; and if an identical output (same input contents, output mode and tags) was written before, in any output directory, hard-link it rather than writing it again"
+        )
+        parser.add_argument(
+            "--jobs", "-j",
+            metavar="{jobs}",
+            type=int,
+            default=1,
+            help="number of frames to write in parallel, each with its own exiftool process; 0 means one per CPU (default %(default)d)"
+        )
+        parser.add_argument(
+            "--read-ahead",
+            metavar="{frames}",
+            type=int,
+            default=Constants.READ_AHEAD_FRAMES,
+            help="start reading the inputs of this many frames ahead of the ones being written, so slow (network) storage stays busy; 0 to turn off (default %(default)d)"
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="print a table of time spent in each stage, and bytes and frames processed, at the end of the run"
+        )
+        parser.add_argument(
+            "--stats-json",
+            metavar="{stats-json}",
+            type=pathlib.Path,
+            help="write the stage timings and per-frame statistics to this file, as JSON"
         )
         parser.add_argument(
             "--developer",
@@ -210,11 +432,46 @@ class App():
         )
 
         # parse the args, and return
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
 
         # expand the args
         args.input_files = [ pathlib.Path(iArg).expanduser() for iArg in args.input_files ]
         args.dir = pathlib.Path(args.dir).expanduser()
+        if args.order_map != None:
+            args.order_map = args.order_map.expanduser()
+            if args.order == None:
+                args.order = "map"
+        if args.execute_plan != None:
+            args.execute_plan = args.execute_plan.expanduser()
+            if len(args.input_files) != 0 or args.shot_info_file != None:
+                parser.error("--execute-plan takes its inputs from the plan; don't give input files or a shot-info file")
+            if args.frames != None:
+                first, dash, last = args.frames.partition("-")
+                try:
+                    args.frames = (int(first), int(last) if dash != "" else int(first))
+                except ValueError:
+                    parser.error(f"--frames must be a frame number, or two separated by '-': {args.frames}")
+        else:
+            if args.shot_info_file == None:
+                parser.error("a shot-info file (--shot-info-file) is required")
+            if args.frames != None:
+                parser.error("--frames is only used with --execute-plan")
+        args.scan_roots = [ root.expanduser() for root in args.scan_roots ]
+        for name in os.environ.get(Constants.SCAN_ROOTS_ENV, "").split(os.pathsep):
+            if name != "":
+                args.scan_roots.append(pathlib.Path(name).expanduser())
+        if args.plan != None:
+            args.plan = args.plan.expanduser()
+        if args.stats_json != None:
+            args.stats_json = args.stats_json.expanduser()
+        if args.link_duplicates:
+            args.find_duplicates = True
+        if args.jobs == 0:
+            args.jobs = os.cpu_count() or 1
+        if args.jobs < 0:
+            parser.error(f"--jobs must not be negative: {args.jobs}")
+        if args.read_ahead < 0:
+            parser.error(f"--read-ahead must not be negative: {args.read_ahead}")
         return args
 
     class Error(Exception):
@@ -225,24 +482,112 @@ class App():
     # Run the app and return status #
     #################################
     def run(self) -> int:
-        def to_int(row: dict, field: str) -> int:
-            result = None
-            try:
-                result = int(row[field])
-            except Exception as e:
-                raise self.Error(f"Not an int: {field=}[{row[field]}] line={row['line_num']}: {e}")
-            return result
+        args = self.args
+
+        # the exiftool processes, shared by all the commands in this run
+        # (and perhaps by other runs, if the caller gave us a pool).
+        if self.shared_exiftool != None:
+            self.exiftool = self.shared_exiftool
+        else:
+            from .exiftool import ExifToolPool
+            self.exiftool = ExifToolPool(self.log, define_namespaces=args.define_namespaces)
+
+        # the content hashes of inputs and outputs, for --find-duplicates
+        # and --link-duplicates
+        if args.find_duplicates:
+            from .contenthash import ContentIndex
+            self.content_index = ContentIndex(self.log).load()
+        else:
+            self.content_index = None
+
+        self.manifest = None
+        self.journal = None
+        complete = False
+        try:
+            # work out what to do...
+            if args.execute_plan != None:
+                plan = Plan.load(args.execute_plan)
+                self.outputDir = plan.dir
+                if not self.outputDir.exists():
+                    raise self.Error(f"Output directory from plan does not exist: {self.outputDir}")
+                self.log.info("executing plan %s: %d frames", args.execute_plan, len(plan.frames))
+                if args.frames != None:
+                    self.log.info("writing frames %d to %d", *args.frames)
+            else:
+                # unless we need the whole plan first, write each frame
+                # as soon as it's planned.
+                plan = self.make_plan(stream=not args.dry_run and args.plan == None)
+
+            # ...and then either save it, or do it.
+            if args.dry_run:
+                planpath = args.plan if args.plan != None else self.outputDir / self.constants.PLAN_NAME
+                plan.save(planpath)
+                self.log.warning("dry run: plan for %d frames written to %s", len(plan.frames), planpath)
+                return 0
+            if args.plan != None:
+                plan.save(args.plan)
+
+            # the record of what's already in the output directory,
+            # including anything done by an interrupted run.
+            self.manifest = Manifest(self.outputDir, self.log).load()
+            self.journal = Journal(self.outputDir, self.log)
+            self.completed = self.journal.read()
+            self.manifest.update(self.completed)
+            if not args.resume:
+                self.completed = dict()
+            self.journal.open(resume=args.resume)
+
+            self.execute_plan(plan)
+            complete = True
+            return 0
+        finally:
+            if self.shared_exiftool == None:
+                self.exiftool.close()
+            if self.manifest != None:
+                self.manifest.save()
+            if self.journal != None:
+                # keep the journal if we didn't finish, for --resume
+                self.journal.close(remove=complete)
+            if self.content_index != None:
+                self.content_index.close()
+            self._report_stats(complete or args.dry_run)
+
+    #
+    # --stats and --stats-json: report where the time went, even if the
+    # run failed.
+    #
+    def _report_stats(self, complete: bool) -> None:
+        self.stats.status = "ok" if complete else "failed"
+        if self.args.stats:
+            print(self.stats.format_table(), end="")
+        if self.args.stats_json != None:
+            atomic_write_text(self.args.stats_json, json.dumps(self.stats.to_json(), indent=2) + "\n")
 
+    ############################################
+    # Plan the run: read the shot-info file,   #
+    # match frames to files and build the tags #
+    ############################################
+    def make_plan(self, stream: bool = False) -> Plan:
+        """
+        Plan the run. The options and header of the shot-info file are
+        read now; the frames are planned as the rows are read. If
+        stream, the plan's frames are an iterator that does that as
+        they're used; otherwise, the whole plan is made now.
+        """
         args = self.args
 
         # read the shot-info file
-        info = []
+        from .shotinfo import ShotInfoFile
         shot_info_object = ShotInfoFile(self)
-        info = shot_info_object.read_from_path(pathlib.Path(args.shot_info_file).expanduser())
+        info = shot_info_object.frames_from_path(pathlib.Path(args.shot_info_file).expanduser())
 
-        input_files = args.input_files
-        if not args.forward:
-            list.reverse(input_files)
+        input_files = self._order_input_files(args.input_files)
+
+        # start hashing the input files, so duplicates can be found as
+        # the frames are matched to them.
+        if self.content_index != None:
+            with self.stats.stage("content hash"):
+                shot_info_object.file_digests = self.content_index.digests(input_files)
 
         self.log.debug(f"{input_files=}")
         self.log.debug(f"{len(input_files)=}")
@@ -270,26 +615,77 @@ class App():
         # display what we've done.
         self.log.debug("attributes: %s", attributes)
 
+        # the paths are absolute, so the plan can be run from anywhere.
+        plan = Plan(self.outputDir.absolute(), args.output_mode, self._plan_frames(info, input_files, attributes))
+        if not stream:
+            plan.frames = list(plan.frames)
+        return plan
+
+    #
+    # Put the input files in order (--order, or the shot-info file's
+    # Order option) and direction: the order they were scanned in,
+    # reversed unless --forward; or, for "map", the order on the film.
+    #
+    def _order_input_files(self, input_files: list) -> list:
+        from .ordering import InputOrdering
+        args = self.args
+        order = args.order if args.order != None else "given"
+        map_path = args.order_map
+        if order == "map" and map_path == None:
+            map_path = pathlib.Path(args.shot_info_file).expanduser().parent / Constants.ORDER_MAP_NAME
+
+        ordering = InputOrdering(self.log, exiftool=self.exiftool, stats=self.stats, map_path=map_path)
+        try:
+            input_files = ordering.order(order, input_files)
+        except InputOrdering.Error as e:
+            raise self.Error(str(e))
+        if order != "map" and not args.forward:
+            list.reverse(input_files)
+        return input_files
+
+    #
+    # Match the frames from the shot-info file to the input files, and
+    # yield a Plan.Frame for each.
+    #
+    # The rows needn't be in frame order, and a frame can be listed
+    # more than once: the later entries are merged into the earlier. So
+    # all the frames are read before the first is planned. They're small
+    # (a frame refers to its row, which is shared by all the frames of a
+    # range); the tags are still built, and the frames planned and
+    # written, one at a time.
+    #
+    def _plan_frames(self, info, input_files: list, attributes: dict):
+        frames = dict()
+        for iFrame, record in info:
+            # just in case, merge things rather than overwriting
+            if iFrame in frames:
+                frames[iFrame].merge(record)
+            else:
+                frames[iFrame] = record
+
         # we need to know the first index in the table!
-        iFirstFrame,_ = sorted(info.items())[0]
-        iShot = iFirstFrame - 1
+        if len(frames) == 0:
+            raise self.Error("no frames in shot-info file")
+        iShot = min(frames) - 1
 
-        # copy files, renaming. manually index through the shots
+        # work out which file goes with which frame, where it goes,
+        # and how it's tagged. manually index through the shots
         for i in range(len(input_files)):
             frame_info = None
             # skipping shots requires an explicit entry
             # where exposure is "skip".
             while True:
                 iShot = iShot + 1
-                if iShot in info:
-                    frame_info = info[iShot]
-                    self.log.debug("info[%d]=%s", iShot, frame_info)
-                    if not (self.constants.TAG_SKIP in frame_info):
+                frame_info = frames.pop(iShot, None)
+                if frame_info != None:
+                    self.log.debug("info[%d]: file %d, skip %s", iShot, frame_info.file, frame_info.skip)
+                    if not frame_info.skip:
                         break
                 else:
                     # in case we were looping
-                    frame_info = None
                     break
+            if frame_info == None:
+                raise self.Error(f"the shot-info file has no frame {iShot}, for input file {i + 1} of {len(input_files)}")
 
             #
             # input_files[] is the list of input files from the command line, in the order
@@ -298,21 +694,243 @@ class App():
             # If frame_info == info[iShot] has a Files column, use that to get the input file.
             # If not, if forward use `i`; if reverse use len(input_files) - i - 1.
             #
-            assert "file" in frame_info
-            iFile = to_int(frame_info, "file") - 1
+            iFile = frame_info.file - 1
 
             inpath = input_files[iFile]
             base_inpath = inpath.name
-            outpath = self.outputDir / f"{(iShot):03d}-{base_inpath}"
+            outpath = self.outputDir.absolute() / f"{(iShot):03d}-{base_inpath}"
             self.log.debug("%d: %s -> %s", i, str(inpath), str(outpath) )
 
-            # copy the file
+            # read the scanner make/model of this input, and the ones
+            # after it, in as few exiftool commands as we can.
+            self._prefetch_make_model(input_files, iFile)
+
+            try:
+                with self.stats.stage("build tags"):
+                    tags = self._build_settings(inpath, copy.copy(attributes), frame_info.tags())
+            except Exception as e:
+                raise self.Error(f"frame {iShot}: {inpath}: {e}")
+            self.log.debug("make_plan: frame %d tags: %s", iShot, json.dumps(tags, indent=2))
+            yield Plan.Frame(iShot, inpath.absolute(), outpath, tags)
+
+        if self.content_index != None:
+            self._report_seen_before(input_files)
+
+    #
+    # --find-duplicates: warn about input files that are identical to
+    # files seen before, elsewhere (like a roll delivered twice).
+    #
+    def _report_seen_before(self, input_files: list) -> None:
+        digests = dict()
+        for inpath, future in zip(input_files, self.content_index.digests(input_files)):
+            try:
+                digests[future.result()] = str(pathlib.Path(inpath).absolute())
+            except OSError:
+                # it'll be reported when it's written.
+                pass
+
+        ours = set(digests.values())
+        found = []
+        for digest, paths in self.content_index.seen(set(digests)).items():
+            others = sorted(path for path in paths if not path in ours)
+            if len(others) != 0:
+                found.append((digests[digest], others))
+
+        # a roll delivered twice would give a warning for every file.
+        found.sort()
+        for inpath, others in found[:self.constants.DUPLICATES_REPORTED]:
+            self.log.warning("input %s is identical to %s", inpath, ", ".join(others))
+        if len(found) > self.constants.DUPLICATES_REPORTED:
+            self.log.warning("... and %d more input files identical to files seen before", len(found) - self.constants.DUPLICATES_REPORTED)
+
+    #
+    # Write (and tag) each frame in the plan, either one at a time or,
+    # with --jobs, in a pool of worker threads (each of which has its
+    # own exiftool process).
+    #
+    # The plan's frames may be an iterator (see make_plan()), so we take
+    # them as we go, keeping only a few more in the pool than there are
+    # workers.
+    #
+    # The inputs of the next few frames (--read-ahead) are read into the
+    # page cache in the background meanwhile (see _read_ahead()).
+    #
+    # Each output is written under a temporary name, and renamed into
+    # place when it's complete, so a failed or interrupted frame never
+    # leaves a half-written output behind. In the parallel case, the
+    # first failure stops us from starting more frames; the ones in
+    # progress are allowed to finish. All the failures are reported,
+    # frame by frame.
+    #
+    def execute_plan(self, plan: Plan) -> None:
+        output_mode = plan.output_mode
+
+        # temporary files left by an interrupted run are of no use.
+        for path in self.outputDir.iterdir():
+            if is_partial_path(path):
+                self.log.info("removing incomplete output: %s", path)
+                path.unlink(missing_ok=True)
+
+        produced = set()
+        frames = self._read_ahead(self._selected_frames(self._note_outputs(plan.frames, produced)), output_mode)
+        if self.args.jobs <= 1:
+            try:
+                for frame in frames:
+                    self._count("frames")
+                    try:
+                        self._write_frame(frame, output_mode)
+                    except Exception as e:
+                        raise self.Error(f"frame {frame.frame}: {frame.input}: {e}")
+            finally:
+                frames.close()
+            self._check_stale_outputs(produced)
+            return
+
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        self.log.info("writing frames with %d jobs", self.args.jobs)
+        failures = []
+        running = dict()
+
+        def collect(done) -> None:
+            for future in done:
+                frame = running.pop(future)
+                e = future.exception()
+                if e != None:
+                    self.log.error("frame %d: %s: %s", frame.frame, frame.input, e)
+                    failures.append((frame.frame, frame.input, e))
+
+        with ThreadPoolExecutor(max_workers=self.args.jobs, thread_name_prefix="annotate") as executor:
+            try:
+                for frame in frames:
+                    while len(running) >= 2 * self.args.jobs:
+                        collect(wait(running, return_when=FIRST_COMPLETED).done)
+                    if len(failures) != 0:
+                        break
+                    self._count("frames")
+                    running[executor.submit(self._write_frame, frame, output_mode)] = frame
+            finally:
+                # whatever happened, let the frames in progress finish.
+                collect(wait(running).done)
+                frames.close()
+
+        if len(failures) != 0:
+            failures.sort(key=lambda failure: failure[0])
+            raise self.Error(
+                f"{len(failures)} frame(s) failed: " +
+                "; ".join(f"frame {iShot}: {inpath}: {e}" for iShot, inpath, e in failures)
+                )
+        self._check_stale_outputs(produced)
+
+    @staticmethod
+    def _note_outputs(frames, produced: set):
+        for frame in frames:
+            produced.add(frame.output.name)
+            yield frame
 
-            self._copy(inpath, outpath, copy.copy(attributes), frame_info)
-            # self.log.info("/bin/cp -p %s %s", str(inpath), str(outpath) )
-            # subprocess.run([ "/bin/cp", "-p", str(inpath), str(outpath)], check=True)
+    #
+    # --frames: the frames to write. The outputs of the others are
+    # still the plan's (see _note_outputs()), so they aren't stale.
+    #
+    def _selected_frames(self, frames):
+        if self.args.frames == None:
+            yield from frames
+            return
+        first, last = self.args.frames
+        for frame in frames:
+            if first <= frame.frame <= last:
+                yield frame
 
-        return 0
+    #
+    # Outputs are recorded in the manifest by name. If a frame's output
+    # is named differently than on an earlier run (because the frames
+    # were matched to different files, say), the old output is left
+    # behind, with its manifest entry. Once every frame of the plan has
+    # been written, report those outputs; with --prune, remove them.
+    # (Outputs that aren't in the manifest aren't ours, and are left
+    # alone.)
+    #
+    def _check_stale_outputs(self, produced: set) -> None:
+        with self.manifest.lock:
+            stale = sorted(name for name in self.manifest.frames if not name in produced)
+        for name in stale:
+            outpath = self.outputDir / name
+            paths = [ path for path in self._output_paths(outpath, self.manifest.get(outpath).get("mode")) if path.exists() ]
+            if len(paths) == 0:
+                # already gone: just forget it.
+                self.manifest.forget(outpath)
+                continue
+            self._count("stale")
+            if self.args.prune:
+                for path in paths:
+                    self.log.info("pruning: %s", path)
+                    path.unlink(missing_ok=True)
+                self.manifest.forget(outpath)
+            else:
+                self.log.warning("not made by this run (use --prune to remove): %s", ", ".join(str(path) for path in paths))
+        if self.counts["stale"] != 0 and self.args.prune:
+            self.log.warning("pruned %d outputs not made by this run", self.counts["stale"])
+
+    #
+    # Yield the frames, each one only once the inputs of the next
+    # --read-ahead frames have been handed to a background thread to
+    # prefetch. Frames that won't be written (already up to date, or
+    # completed by an interrupted run) aren't prefetched, and neither
+    # are the inputs of --sidecar, which are only linked.
+    #
+    # If getting the next frame fails (like a mistake in the shot-info
+    # file, found while planning), the frames already taken are still
+    # yielded, so they're written as they would be without read-ahead,
+    # and then the error is raised.
+    #
+    def _read_ahead(self, frames, output_mode: str):
+        if self.args.read_ahead == 0 or output_mode == "sidecar":
+            yield from frames
+            return
+
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        window = deque()
+        executor = ThreadPoolExecutor(max_workers=Constants.READ_AHEAD_THREADS, thread_name_prefix="readahead")
+        try:
+            try:
+                for frame in frames:
+                    if self._needs_writing(frame, output_mode):
+                        executor.submit(self._prefetch_input, frame.input)
+                    window.append(frame)
+                    if len(window) > self.args.read_ahead:
+                        yield window.popleft()
+            except Exception:
+                while len(window) != 0:
+                    yield window.popleft()
+                raise
+            while len(window) != 0:
+                yield window.popleft()
+        finally:
+            # if we stopped early, there's no point in reading more.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prefetch_input(self, inpath: pathlib.Path) -> None:
+        try:
+            with self.stats.stage("read ahead"):
+                prefetch_file(inpath)
+        except OSError as e:
+            # it'll be reported when the frame is written.
+            self.log.debug("_prefetch_input: %s: %s", inpath, e)
+
+    #
+    # False if _write_one_frame() will find the frame is already done.
+    #
+    def _needs_writing(self, frame: Plan.Frame, output_mode: str) -> bool:
+        outpaths = self._output_paths(frame.output, output_mode)
+        if frame.output.name in self.completed and all(path.exists() for path in outpaths):
+            return False
+        if self.args.force:
+            return True
+        try:
+            record = Manifest.make_record(frame.input, output_mode, frame.tags)
+        except OSError:
+            return False
+        return not self.manifest.is_current(outpaths, record)
 
     #
     # Supply missing author attributes as needed.
@@ -342,7 +960,132 @@ class App():
         copy_value("XMP-dc:Creator", name)
         copy_value("XMP-dc:Rights", name)
 
-    def _copy(self, inpath: pathlib.Path, outpath: pathlib.Path, settings, frame_settings):
+    #
+    # Write one frame of a plan, and record how it went in the stats.
+    #
+    def _write_frame(self, frame: Plan.Frame, output_mode: str) -> None:
+        start = time.perf_counter()
+        status = "failed"
+        exiftool_status = None
+        error = None
+        try:
+            status = self._write_one_frame(frame, output_mode)
+            if status == "written" and output_mode != "sidecar":
+                exiftool_status = 0
+        except self.exiftool.Error as e:
+            exiftool_status = 1
+            error = str(e)
+            raise
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            bytes_in = 0
+            bytes_out = 0
+            if status == "written":
+                bytes_in = frame.input.stat().st_size
+                bytes_out = sum(path.stat().st_size for path in self._output_paths(frame.output, output_mode))
+            self.stats.add_time("write frame", seconds)
+            self.stats.frame(frame.frame, frame.input, frame.output, status, seconds, bytes_in, bytes_out, exiftool_status, error)
+
+    def _write_one_frame(self, frame: Plan.Frame, output_mode: str) -> str:
+        inpath = frame.input
+        outpath = frame.output
+        settings = frame.tags
+        json_settings_str = json.dumps(settings, indent=2)
+
+        # if we're resuming, and the interrupted run finished this frame,
+        # there's nothing to do.
+        outpaths = self._output_paths(outpath, output_mode)
+        if outpath.name in self.completed and all(path.exists() for path in outpaths):
+            self.log.info("completed by interrupted run, skipping: %s", outpath)
+            self._count("current")
+            return "current"
+
+        # if the manifest says we've already made this output from the
+        # same input and settings, there's nothing to do.
+        record = Manifest.make_record(inpath, output_mode, settings)
+        if not self.args.force and self.manifest.is_current(outpaths, record):
+            self.log.info("up to date, skipping: %s", outpath)
+            self._count("current")
+            return "current"
+
+        # if we made this output on an earlier run, but from a different
+        # input or settings, remove it so we can write it again. (Outputs
+        # that aren't in the manifest aren't ours, and are left alone.)
+        previous = self.manifest.get(outpath)
+        if previous != None:
+            for path in self._output_paths(outpath, previous.get("mode")):
+                self.log.info("replacing: %s", path)
+                path.unlink(missing_ok=True)
+            self.manifest.forget(outpath)
+
+        # --link-duplicates: if we've written this output before, from
+        # the same contents and with the same tags, link to that (unless
+        # we're told to write everything).
+        key = None
+        if self.args.link_duplicates and output_mode != "sidecar" and not self.args.force:
+            key = self.content_index.output_key(self.content_index.digest(inpath), output_mode, settings)
+            if self._link_output(key, outpath):
+                self.manifest.put(outpath, record)
+                self.journal.append(outpath, record)
+                self._count("linked")
+                return "linked"
+
+        match output_mode:
+            case "inplace":
+                self._write_inplace(inpath, outpath, json_settings_str)
+            case "sidecar":
+                self._write_sidecar(inpath, outpath, settings)
+            case _:
+                self._write_rewrite(inpath, outpath, json_settings_str)
+
+        if key != None:
+            self.content_index.add_output(key, outpath)
+        self.manifest.put(outpath, record)
+        self.journal.append(outpath, record)
+        self._count("written")
+        return "written"
+
+    #
+    # Make outpath a hard link to an earlier output made from key, if
+    # there is one (and it's on the same file system). Outputs are only
+    # ever replaced by renaming, never changed in place, so the link is
+    # safe from us; but editing either file in place changes both.
+    #
+    def _link_output(self, key: str, outpath: pathlib.Path) -> bool:
+        earlier = self.content_index.find_output(key)
+        if earlier == None or earlier == outpath.absolute():
+            return False
+
+        self._check_new_output(outpath)
+        tmppath = partial_path(outpath)
+        try:
+            os.link(earlier, tmppath)
+            os.replace(tmppath, outpath)
+        except OSError as e:
+            tmppath.unlink(missing_ok=True)
+            self.log.info("can't link %s to %s, writing it: %s", outpath, earlier, e)
+            return False
+        self.log.info("identical to %s, linked: %s", earlier, outpath)
+        return True
+
+    #
+    # The files written for an output in a given mode
+    #
+    @staticmethod
+    def _output_paths(outpath: pathlib.Path, output_mode: str) -> list:
+        if output_mode == "sidecar":
+            return [ outpath, outpath.with_suffix(".xmp") ]
+        return [ outpath ]
+
+    #
+    # Build the final tag settings for one frame: the run-wide settings,
+    # updated from the frame settings, plus the scanner, lens and comment
+    # fixups.
+    #
+    def _build_settings(self, inpath: pathlib.Path, settings: dict, frame_settings: dict) -> dict:
         def _replace_settings(name: str, value: str | None = None) -> None:
             if name in settings:
                 settings["XMP-AnnotateFilmScans-Scanner-" + name] = settings[name]
@@ -396,33 +1139,106 @@ class App():
                           settings["XMP-aux:Lens"])
 
         self._analogexif_to_comment(settings)
+        return settings
 
-        json_settings_str = json.dumps(settings, indent=2)
+    #
+    # the default: exiftool reads inpath and writes outpath.
+    #
+    def _write_rewrite(self, inpath: pathlib.Path, outpath: pathlib.Path, json_settings_str: str) -> None:
+        tmppath = partial_path(outpath)
         args = [
                 "exiftool",
                 "-unsafe",
                 "-XMP-exif:DateTimeDigitized<XMP:CreateDate",
                 "-json=-",
-                "-o", str(outpath),
+                "-o", str(tmppath),
                 str(inpath)
                 ]
 
         self.log.info(" ".join(args))
-        self.log.debug("_copy: json_settings: %s", json_settings_str)
-        if not self.args.dry_run:
-            subprocess.run(args, input=json_settings_str, check=True, text=True)
-        else:
-            self.log.info("(skipping copy due to --dry-run)")
+        self._check_new_output(outpath)
+        try:
+            self.exiftool.execute(args[1:], input=json_settings_str)
+            os.replace(tmppath, outpath)
+        except:
+            tmppath.unlink(missing_ok=True)
+            raise
+
+    #
+    # --in-place: rather than having exiftool read inpath and write outpath,
+    # put a copy of inpath at outpath (a reflink or hard link if we can)
+    # and have exiftool edit that. -overwrite_original makes exiftool
+    # write a temporary file and rename it over the copy, which breaks a
+    # hard link rather than changing the input.
+    #
+    def _write_inplace(self, inpath: pathlib.Path, outpath: pathlib.Path, json_settings_str: str) -> None:
+        tmppath = partial_path(outpath)
+        args = [
+                "exiftool",
+                "-unsafe",
+                "-XMP-exif:DateTimeDigitized<XMP:CreateDate",
+                "-json=-",
+                "-overwrite_original",
+                str(tmppath)
+                ]
+
+        self.log.info("copy %s %s", str(inpath), str(tmppath))
+        self.log.info(" ".join(args))
+        self._check_new_output(outpath)
+        try:
+            method = fast_copy(inpath, tmppath, allow_link=True)
+            self.log.debug("_write_inplace: copied by %s: %s", method, tmppath)
+            self.exiftool.execute(args[1:], input=json_settings_str)
+            os.replace(tmppath, outpath)
+        except:
+            tmppath.unlink(missing_ok=True)
+            raise
+
+    #
+    # --sidecar: the image goes to outpath unchanged (as a reflink or hard
+    # link where possible), and the tags go in an XMP sidecar next to it.
+    # We write the XMP ourselves, so exiftool isn't involved.
+    #
+    def _write_sidecar(self, inpath: pathlib.Path, outpath: pathlib.Path, settings: dict) -> None:
+        from .xmp import write_sidecar
+        xmppath = outpath.with_suffix(".xmp")
+        tmppath = partial_path(outpath)
+        tmpxmppath = partial_path(xmppath)
+
+        self.log.info("copy %s %s", str(inpath), str(outpath))
+        self.log.info("write sidecar %s", str(xmppath))
+        self._check_new_output(outpath)
+        self._check_new_output(xmppath)
+        try:
+            method = fast_copy(inpath, tmppath, allow_link=True)
+            self.log.debug("_write_sidecar: copied by %s: %s", method, outpath)
+            write_sidecar(tmpxmppath, settings, self.log)
+            os.replace(tmpxmppath, xmppath)
+            os.replace(tmppath, outpath)
+        except:
+            tmppath.unlink(missing_ok=True)
+            tmpxmppath.unlink(missing_ok=True)
+            xmppath.unlink(missing_ok=True)
+            raise
+
+    #
+    # Outputs are renamed into place, which would silently replace an
+    # existing file; but (like exiftool -o) we refuse to replace files
+    # that we didn't write. (_write_frame removes our own old outputs.)
+    # Stale temporary files are ours, and are removed.
+    #
+    def _check_new_output(self, outpath: pathlib.Path) -> None:
+        if outpath.exists():
+            raise self.Error(f"output file already exists: {outpath}")
+        partial_path(outpath).unlink(missing_ok=True)
 
     def _analogexif_to_comment(self, settings: dict) -> dict:
-        pattern = re.compile(r"(XMP-AnalogExif|Exif|XMP|ExifIFD|XMP-AnnotateFilmScans):(.*)", flags=re.IGNORECASE)
         comment_dict = dict()
         for item in settings.items():
-            key = item[0]
-            match = re.fullmatch(pattern, key)
-            if match != None and match.group(2) != "UserComment":
+            key = comment_key(item[0])
+            if key != None:
                 # add to the comment
-                comment_dict[match.group(2)] = str(item[1]).strip()
+                comment_dict[key] = str(item[1]).strip()
 
         comment = "Photo information: \n"
         for key in sorted(comment_dict):
@@ -432,11 +1248,52 @@ class App():
         settings["ExifIFD:UserComment"] = comment
         return settings
 
+    #
+    # Read the make and model of the chunk of input files that includes
+    # input_files[iFile], if we haven't already, and save them for
+    # _read_make_model(). Only the last few chunks are kept, so this
+    # doesn't grow with the number of files.
+    #
+    # If a chunk fails (for example, because one of the files can't be
+    # read), we just don't save anything for that chunk;
+    # _read_make_model() will then read the files one by one, and report
+    # the error against the file that caused it.
+    #
+    def _prefetch_make_model(self, input_files: list, iFile: int) -> None:
+        batch_size = self.constants.EXIFTOOL_BATCH_SIZE
+        iChunk = iFile // batch_size
+        if iChunk in self.prefetched:
+            return
+
+        chunk = input_files[iChunk * batch_size : (iChunk + 1) * batch_size]
+        self.prefetched[iChunk] = chunk
+        if len(self.prefetched) > self.constants.EXIFTOOL_PREFETCH_CHUNKS:
+            for inpath in self.prefetched.pop(next(iter(self.prefetched))):
+                self.make_model.pop(pathlib.Path(inpath), None)
+
+        args = [ "exiftool", "-json", "-s", "-make", "-model" ] + [ str(inpath) for inpath in chunk ]
+        self.log.info("exiftool -json -s -make -model {%d files}", len(chunk))
+        try:
+            with self.stats.stage("make/model prefetch"):
+                results = json.loads(self.exiftool.execute(args[1:]))
+        except (self.exiftool.Error, ValueError) as e:
+            self.log.warning("_prefetch_make_model: can't read %d files at once, will read one by one: %s", len(chunk), e)
+            return
+
+        for result in results:
+            self.make_model[pathlib.Path(result["SourceFile"])] = result
+        self.log.debug("_prefetch_make_model: %d files from %d", len(results), iChunk * batch_size)
+
     def _read_make_model(self, inpath):
+        result = self.make_model.get(pathlib.Path(inpath))
+        if result != None:
+            self.log.debug("_read_make_model: (prefetched) %s", result)
+            return result
+
         args = [ "exiftool", "-json", "-s", "-make", "-model", str(inpath) ]
 
         self.log.info(" ".join(args))
-        subprocess_result = subprocess.run(args, capture_output=True, check=True, text=True)
-        result = json.loads(subprocess_result.stdout)[0]
+        with self.stats.stage("make/model read"):
+            result = json.loads(self.exiftool.execute(args[1:]))[0]
         self.log.debug("_read_make_model: %s", result)
         return result
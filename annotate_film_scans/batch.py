@@ -0,0 +1,300 @@
+##############################################################################
+#
+# Name: batch.py
+#
+# Function:
+#       BatchApp() class, for processing many rolls in one run
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import glob
+import json
+import logging
+import os
+import pathlib
+import time
+
+from .app import App
+from .catalog import natural_key
+from .constants import Constants
+from .exiftool import ExifToolPool
+from .__version__ import __version__
+
+##############################################################################
+#
+# The batch application class
+#
+##############################################################################
+
+class BatchApp():
+    """
+    Process many rolls in one run. Each roll is a shot-info file, the
+    scans that go with it, and an output directory; each is run by its
+    own App, but the settings are read once for each directory, and all
+    the rolls share one pool of exiftool processes.
+
+    Rolls come from manifest files (JSON; see _read_manifest()), or from
+    directory trees, where every directory with a `shots-*.csv` file is
+    a roll, and the image files in that directory are its scans.
+    """
+
+    class Error(Exception):
+        """ this is the Exception thrown for batch errors """
+        pass
+
+    class Roll():
+        """ one roll to be processed, and what happened when we did """
+        def __init__(self, name: str, shot_info_file: pathlib.Path, input_files: list, dir: pathlib.Path, options: list | None = None):
+            self.name = name
+            self.shot_info_file = shot_info_file
+            self.input_files = input_files
+            self.dir = dir
+            self.options = list(options or [])
+            self.counts = None
+            self.seconds = 0.0
+            self.error = None
+
+    def __init__(self, argv: list | None = None):
+        self.constants = Constants()
+        self.args, self.roll_options = self._parse_arguments(argv)
+
+        loglevel = logging.ERROR - 10 * self.args.verbose
+        if loglevel < 0:
+            loglevel = 0
+
+        logging.basicConfig(level=loglevel, format='%(relativeCreated)6d %(levelname)-6s %(message)s')
+        self.log = logging.getLogger(__name__)
+        self.log.info("annotate_film_scans batch v%s", __version__)
+
+        # the settings, by shot-info directory (see App.load_settings())
+        self.settings = dict()
+
+    #######################
+    # parse the arguments #
+    #######################
+    def _parse_arguments(self, argv: list | None):
+        parser = argparse.ArgumentParser(
+            prog="annotate_film_scans batch",
+            description="Annotate many rolls of film scans in one run. Options not listed here are passed to each roll (see annotate_film_scans --help).",
+            allow_abbrev=False
+            )
+        parser.add_argument(
+            "--verbose", "-v",
+            action='count', default=0,
+            help="increase verbosity, once for each use"
+            )
+        parser.add_argument(
+            "--dir", "-d",
+            type=pathlib.Path,
+            help=f"put each roll's output in a subdirectory of this directory, named for the roll (default: a '{Constants.BATCH_OUTPUT_DIR}' subdirectory of each roll's directory)"
+            )
+        parser.add_argument(
+            "--define-namespaces",
+            action="store_true",
+            help="start exiftool with a config defining the XMP-AnalogExif and XMP-AnnotateFilmScans namespaces as the sidecar writer writes them (in place of any definitions of them in your ~/.ExifTool_config, which is otherwise loaded as usual)"
+            )
+        parser.add_argument(
+            "sources",
+            metavar="{manifest-or-dir}",
+            nargs="+",
+            type=pathlib.Path,
+            help="a JSON manifest listing rolls, or a directory tree to search for shot-info files"
+            )
+
+        # anything we don't know goes to every roll
+        args, roll_options = parser.parse_known_args(argv)
+        args.dir = args.dir.expanduser() if args.dir != None else None
+        args.sources = [ source.expanduser() for source in args.sources ]
+        return args, roll_options
+
+    #############################
+    # find the rolls to process #
+    #############################
+    def find_rolls(self) -> list:
+        rolls = []
+        for source in self.args.sources:
+            rolls += self._find_rolls_in(source)
+        return rolls
+
+    def _find_rolls_in(self, source: pathlib.Path) -> list:
+        if source.is_dir():
+            return self._find_rolls_in_tree(source)
+        elif source.is_file():
+            return self._read_manifest(source)
+        else:
+            raise self.Error(f"not a manifest or directory: {source}")
+
+    def _default_dir(self, root: pathlib.Path, rolldir: pathlib.Path) -> pathlib.Path:
+        if self.args.dir != None:
+            return self.args.dir / rolldir.relative_to(root) if rolldir != root else self.args.dir / rolldir.name
+        return rolldir / Constants.BATCH_OUTPUT_DIR
+
+    def _find_rolls_in_tree(self, root: pathlib.Path) -> list:
+        rolls = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            rolldir = pathlib.Path(dirpath)
+
+            # don't look in our own output directories.
+            dirnames[:] = [
+                name for name in dirnames
+                if not (rolldir / name / Constants.MANIFEST_NAME).exists()
+                ]
+
+            roll = self._roll_in_dir(root, rolldir, filenames)
+            if roll != None:
+                rolls.append(roll)
+        return rolls
+
+    #
+    # The roll in rolldir (one of the directories of the tree at root,
+    # holding the files named), or None if it has no shot-info file.
+    # If shot_info_file is given, that's the roll's shot-info file,
+    # whatever it's called.
+    #
+    def _roll_in_dir(self, root: pathlib.Path, rolldir: pathlib.Path, filenames: list, shot_info_file: pathlib.Path | None = None) -> "BatchApp.Roll | None":
+        if shot_info_file != None:
+            shot_info_files = [ shot_info_file ]
+        else:
+            shot_info_files = sorted(rolldir.glob(Constants.SHOT_INFO_GLOB))
+        if len(shot_info_files) == 0:
+            return None
+
+        input_files = self._scans_in_dir(rolldir, filenames)
+        name = str(rolldir.relative_to(root)) if rolldir != root else rolldir.name
+        roll = self.Roll(name, shot_info_files[0], input_files, self._default_dir(root, rolldir))
+        if len(shot_info_files) > 1:
+            roll.error = f"more than one shot-info file: {', '.join(path.name for path in shot_info_files)}"
+        return roll
+
+    #
+    # The scans among the files named in rolldir: the image files, in
+    # natural order (as App finds them).
+    #
+    @staticmethod
+    def _scans_in_dir(rolldir: pathlib.Path, filenames: list) -> list:
+        return sorted(
+            (rolldir / name for name in filenames
+             if pathlib.Path(name).suffix.lower() in Constants.IMAGE_SUFFIXES),
+            key=lambda path: natural_key(path.name)
+            )
+
+    #
+    # A manifest is a JSON list of rolls. Each is an object with:
+    #
+    #   "shot_info_file"  (required) the shot-info file
+    #   "input_files"     (optional) list of input files or glob patterns;
+    #                     default is all the images next to the shot-info file
+    #   "dir"             (optional) output directory
+    #   "options"         (optional) list of more command-line options
+    #
+    # Relative paths are relative to the directory holding the manifest.
+    #
+    def _read_manifest(self, path: pathlib.Path) -> list:
+        try:
+            entries = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise self.Error(f"can't read manifest {path}: {e}")
+        if type(entries) != list:
+            raise self.Error(f"manifest must be a list of rolls: {path}")
+
+        base = path.parent
+        rolls = []
+        for entry in entries:
+            if type(entry) != dict or not "shot_info_file" in entry:
+                raise self.Error(f"manifest entry must be an object with a shot_info_file: {path}: {entry}")
+            shot_info_file = base / pathlib.Path(entry["shot_info_file"]).expanduser()
+            rolldir = shot_info_file.parent
+
+            if "input_files" in entry:
+                input_files = []
+                for pattern in entry["input_files"]:
+                    pattern = str(base / pathlib.Path(pattern).expanduser())
+                    # a pattern can match in more than one directory
+                    input_files += sorted((pathlib.Path(match) for match in glob.glob(pattern)), key=lambda path: natural_key(str(path)))
+            else:
+                input_files = self._scans_in_dir(rolldir, [ child.name for child in rolldir.iterdir() if child.is_file() ])
+
+            if "dir" in entry:
+                outdir = base / pathlib.Path(entry["dir"]).expanduser()
+            else:
+                outdir = self._default_dir(base, rolldir)
+
+            name = str(shot_info_file.relative_to(base)) if shot_info_file.is_relative_to(base) else str(shot_info_file)
+            rolls.append(self.Roll(name, shot_info_file, input_files, outdir, entry.get("options", [])))
+        return rolls
+
+    #################################
+    # Run the app and return status #
+    #################################
+    def run(self) -> int:
+        rolls = self.find_rolls()
+        self.log.info("%d rolls", len(rolls))
+
+        with ExifToolPool(self.log, define_namespaces=self.args.define_namespaces) as exiftool:
+            for roll in rolls:
+                self._run_roll(roll, exiftool)
+
+        self._print_summary(rolls)
+        return 0 if all(roll.error == None for roll in rolls) else 1
+
+    def _run_roll(self, roll: "BatchApp.Roll", exiftool: ExifToolPool) -> None:
+        if roll.error != None:
+            self.log.error("%s: %s", roll.name, roll.error)
+            return
+        if len(roll.input_files) == 0:
+            roll.error = "no input files"
+            self.log.error("%s: %s", roll.name, roll.error)
+            return
+
+        argv = [ "-d", str(roll.dir), "-s", str(roll.shot_info_file) ]
+        argv += [ "-v" ] * self.args.verbose
+        argv += self.roll_options + roll.options
+        argv += [ "--" ] + [ str(path) for path in roll.input_files ]
+
+        self.log.info("%s: %d input files -> %s", roll.name, len(roll.input_files), roll.dir)
+        start = time.monotonic()
+        app = None
+        try:
+            roll.dir.mkdir(parents=True, exist_ok=True)
+            settings = self._settings_for(roll.shot_info_file.parent)
+            app = App(argv, settings=settings, exiftool=exiftool)
+            app.run()
+        except SystemExit as e:
+            # argparse reports errors by exiting
+            roll.error = f"bad options (exit status {e.code})"
+        except Exception as e:
+            roll.error = str(e)
+        roll.seconds = time.monotonic() - start
+        if app != None:
+            roll.counts = app.counts
+
+        if roll.error != None:
+            self.log.error("%s: %s", roll.name, roll.error)
+
+    def _settings_for(self, directory: pathlib.Path) -> dict:
+        if not directory in self.settings:
+            self.settings[directory] = App.load_settings(directory)
+        return self.settings[directory]
+
+    def _print_summary(self, rolls: list) -> None:
+        width = max([ len("roll") ] + [ len(roll.name) for roll in rolls ])
+        print(f"{'roll':<{width}}  {'frames':>6}  {'written':>7}  {'current':>7}  {'seconds':>7}  status")
+        for roll in rolls:
+            counts = roll.counts if roll.counts != None else { "frames": 0, "written": 0, "current": 0 }
+            status = "ok" if roll.error == None else f"FAILED: {roll.error}"
+            print(f"{roll.name:<{width}}  {counts['frames']:>6}  {counts['written']:>7}  {counts['current']:>7}  {roll.seconds:>7.2f}  {status}")
+
+        failed = sum(roll.error != None for roll in rolls)
+        print(f"{len(rolls)} rolls, {failed} failed")
+
+def main(argv: list | None = None) -> int:
+    return BatchApp(argv).run()
@@ -0,0 +1,250 @@
+##############################################################################
+#
+# Name: catalog.py
+#
+# Function:
+#       ScanCatalog() class: an index of the scan directories, kept
+#       across runs, for finding the input files of a roll
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+
+from .constants import Constants
+from .fileutil import atomic_write_text
+from .settings import user_cache_dir
+
+_RE_DIGITS = re.compile(r"(\d+)")
+
+# runs in the same process (batch, watch, and --order scan-time within a
+# run) share the catalog file
+_save_lock = threading.Lock()
+
+def natural_key(name: str) -> list:
+    """ sort key putting "scan2.jpg" before "scan10.jpg" """
+    # re.split() with a group alternates text and digits, starting with
+    # text, so keys compare text with text and numbers with numbers.
+    parts = _RE_DIGITS.split(name)
+    parts[1::2] = [ int(digits) for digits in parts[1::2] ]
+    parts[0::2] = [ text.lower() for text in parts[0::2] ]
+    return parts
+
+#### The ScanCatalog class
+class ScanCatalog:
+    """
+    What's in each scan directory we've looked at: how many image files
+    it has (and, for the directories scans were taken from, their names,
+    in natural order), its subdirectories, and whether it's one of our
+    output directories. It's kept in the user's cache directory (in
+    Constants.SCAN_CATALOG_NAME), and a directory is only read again if
+    its mtime has changed (which it does whenever a file is added,
+    removed or renamed in it). So finding a roll under a large archive
+    costs a stat() of each directory, rather than a listing of every
+    file.
+
+    The catalog also remembers, for each directory, the order its scans
+    were last said to be in (--forward or --reverse), for runs that
+    don't say; and, for each scan whose scan time has been read (for
+    --order scan-time), that time, with the file's size and mtime, so
+    it's read again only if the file changes.
+
+    Other ScanCatalogs (of other runs, or of this one) may save the
+    same file meanwhile, so save() merges what this one changed into
+    what's on disk, rather than replacing it.
+
+    It's only a cache: an unreadable catalog is ignored.
+    """
+    FORMAT = 3
+
+    # the tables in the file
+    TABLES = ("dirs", "forward", "times")
+
+    def __init__(self, log: logging.Logger = None, path: pathlib.Path | None = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.path = pathlib.Path(path) if path != None else user_cache_dir() / Constants.SCAN_CATALOG_NAME
+        self.dirs = dict()
+        self.forward = dict()
+        self.times = dict()
+
+        # the keys of each table this one has changed (or removed), to
+        # merge on save()
+        self.changed = { table: set() for table in self.TABLES }
+
+    @property
+    def dirty(self) -> bool:
+        return any(len(keys) != 0 for keys in self.changed.values())
+
+    def _changed(self, table: str, key: str) -> None:
+        self.changed[table].add(key)
+
+    def load(self) -> "ScanCatalog":
+        """ read the catalog, if there is one """
+        self.dirs, self.forward, self.times = self._read()
+        return self
+
+    def _read(self) -> tuple:
+        try:
+            contents = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return dict(), dict(), dict()
+        except (OSError, ValueError) as e:
+            self.log.warning("ignoring unreadable scan catalog %s: %s", self.path, e)
+            return dict(), dict(), dict()
+        if type(contents) != dict or contents.get("format") != self.FORMAT:
+            return dict(), dict(), dict()
+        return tuple(contents.get(table, dict()) for table in self.TABLES)
+
+    def save(self) -> None:
+        """
+        merge what this catalog changed into the one on disk (which
+        another may have changed meanwhile), and write it, if anything
+        changed
+        """
+        if not self.dirty:
+            return
+        with _save_lock:
+            tables = dict(zip(self.TABLES, self._read()))
+            for table, keys in self.changed.items():
+                ours = getattr(self, table)
+                for key in keys:
+                    if key in ours:
+                        tables[table][key] = ours[key]
+                    else:
+                        tables[table].pop(key, None)
+            contents = { "format": self.FORMAT, **tables }
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_text(self.path, json.dumps(contents, separators=(",", ":")))
+            except OSError as e:
+                # it's only a cache
+                self.log.warning("can't write scan catalog %s: %s", self.path, e)
+                return
+        self.dirs, self.forward, self.times = (tables[table] for table in self.TABLES)
+        self.changed = { table: set() for table in self.TABLES }
+        self.log.debug("ScanCatalog.save: %d directories: %s", len(self.dirs), self.path)
+
+    #
+    # The entry for directory (a str), read again if it has changed;
+    # None if it's not a directory (any more). Entries list the names of
+    # their images only once they've been asked for (by images()): to
+    # find a roll, we only need to know whether a directory has any.
+    #
+    def _entry(self, directory: str, names: bool = False) -> dict | None:
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            if self.dirs.pop(directory, None) != None:
+                self._changed("dirs", directory)
+            return None
+
+        entry = self.dirs.get(directory)
+        if entry != None and entry["mtime_ns"] == mtime_ns and (not names or "names" in entry):
+            return entry
+
+        images = []
+        subdirs = []
+        output = False
+        try:
+            with os.scandir(directory) as scan:
+                for item in scan:
+                    name = item.name
+                    if name == Constants.MANIFEST_NAME:
+                        output = True
+                    elif name.startswith("."):
+                        continue
+                    elif item.is_dir():
+                        subdirs.append(name)
+                    elif os.path.splitext(name)[1].lower() in Constants.IMAGE_SUFFIXES and item.is_file():
+                        images.append(name)
+        except OSError as e:
+            self.log.debug("ScanCatalog: can't read %s: %s", directory, e)
+            return None
+
+        entry = {
+            "mtime_ns": mtime_ns,
+            "images": len(images),
+            "subdirs": sorted(subdirs),
+            "output": output
+            }
+        if names:
+            entry["names"] = sorted(images, key=natural_key)
+        self.dirs[directory] = entry
+        self._changed("dirs", directory)
+        self.log.debug("ScanCatalog: read %s: %d images", directory, len(images))
+        return entry
+
+    def images(self, directory: pathlib.Path) -> list:
+        """
+        the image files in directory, in natural order; none if it's one
+        of our output directories
+        """
+        directory = pathlib.Path(directory).absolute()
+        entry = self._entry(str(directory), names=True)
+        if entry == None or entry["output"]:
+            return []
+        return [ directory / name for name in entry["names"] ]
+
+    def find(self, name: str, roots: list) -> list:
+        """ the directories named name, holding images, in the trees at roots """
+        result = []
+        for root in roots:
+            stack = [ str(pathlib.Path(root).absolute()) ]
+            while len(stack) != 0:
+                directory = stack.pop()
+                entry = self._entry(directory)
+                if entry == None or entry["output"]:
+                    continue
+                if entry["images"] != 0 and os.path.basename(directory) == name:
+                    result.append(pathlib.Path(directory))
+                stack += [ os.path.join(directory, subdir) for subdir in reversed(entry["subdirs"]) ]
+        return result
+
+    def get_forward(self, directory: pathlib.Path) -> bool | None:
+        """ the order last given for the scans in directory, if any """
+        return self.forward.get(str(pathlib.Path(directory).absolute()))
+
+    def set_forward(self, directory: pathlib.Path, forward: bool) -> None:
+        key = str(pathlib.Path(directory).absolute())
+        if self.forward.get(key) != forward:
+            self.forward[key] = forward
+            self._changed("forward", key)
+
+    def scan_times(self, paths: list, read) -> dict:
+        """
+        { absolute path (a str): scan time } for paths. The times we
+        don't have, or whose files have changed, are read all at once
+        with read(paths) -> { absolute path: time }, and kept.
+        """
+        result = dict()
+        unknown = []
+        stats = dict()
+        for path in paths:
+            key = str(pathlib.Path(path).absolute())
+            stat = os.stat(key)
+            entry = self.times.get(key)
+            if entry != None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                result[key] = entry[2]
+            else:
+                unknown.append(key)
+                stats[key] = stat
+
+        if len(unknown) != 0:
+            self.log.debug("ScanCatalog.scan_times: reading %d of %d", len(unknown), len(paths))
+            times = read(unknown)
+            for key in unknown:
+                result[key] = times[key]
+                self.times[key] = [ stats[key].st_size, stats[key].st_mtime_ns, times[key] ]
+                self._changed("times", key)
+        return result
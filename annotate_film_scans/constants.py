@@ -15,7 +15,6 @@
 
 #### imports ####
 import re
-import uuid
 
 #### The Constants class
 class Constants:
@@ -54,4 +53,60 @@ class Constants:
         TAG_DEVELOPER = "XMP=AnnotateFilmScans:Developer"
         TAG_DEVELOP_TIME = "XMP-AnnotateFilmScans:DevelopmentTime"
         TAG_DEVELOP_TEMP = "XMP-AnnotateFilmScans:DevelopmentTemperature"
-        TAG_DEVELOP_NOTES = "XMP-AnnotateFilmScans:DevelopmentNotes"
\ No newline at end of file
+        TAG_DEVELOP_NOTES = "XMP-AnnotateFilmScans:DevelopmentNotes"
+
+        # seconds to wait for a response from exiftool before giving up
+        EXIFTOOL_TIMEOUT = 300
+
+        # maximum number of files to name in one exiftool read command
+        EXIFTOOL_BATCH_SIZE = 256
+
+        # how many of those chunks of make/model results to keep
+        EXIFTOOL_PREFETCH_CHUNKS = 4
+
+        # frames whose inputs are read ahead of the ones being written,
+        # by default, and the threads doing the reading
+        READ_AHEAD_FRAMES = 4
+        READ_AHEAD_THREADS = 2
+
+        # name of the manifest kept in each output directory
+        MANIFEST_NAME = ".annotate_film_scans-manifest.json"
+
+        # name of the progress journal kept in each output directory during a run
+        JOURNAL_NAME = ".annotate_film_scans-journal.jsonl"
+
+        # name of the plan written by --dry-run, if not told otherwise
+        PLAN_NAME = "annotation-plan.json"
+
+        # settings overlays: the file next to a shot-info file, and the
+        # environment variable naming more files (see SettingsCatalog)
+        LOCAL_SETTINGS_NAME = "annotate_film_scans-settings.json"
+        SETTINGS_ENV = "ANNOTATE_FILM_SCANS_SETTINGS"
+
+        # the directory of the index of content hashes, in the user's cache
+        # directory (see ContentIndex)
+        CONTENT_INDEX_NAME = "content-index"
+
+        # the index of scan directories, in the user's cache directory
+        # (see ScanCatalog), and the environment variable naming more
+        # trees to find scans in (separated by os.pathsep)
+        SCAN_CATALOG_NAME = "scan-catalog.json"
+        SCAN_ROOTS_ENV = "ANNOTATE_FILM_SCANS_SCAN_ROOTS"
+
+        # the ways the input files can be put in order (see
+        # InputOrdering), for --order and the Order option
+        INPUT_ORDERS = ("given", "name", "scan-time", "map")
+
+        # the order map used by --order map, if --order-map doesn't
+        # name one: next to the shot-info file
+        ORDER_MAP_NAME = "order-map.txt"
+
+        # how many inputs seen before to name, with --find-duplicates
+        DUPLICATES_REPORTED = 5
+
+        # for finding rolls: shot-info files, and the scans next to them
+        SHOT_INFO_GLOB = "shots-*.csv"
+        IMAGE_SUFFIXES = frozenset({ ".jpg", ".jpeg", ".tif", ".tiff", ".png", ".psd", ".dng", ".arw", ".rw2" })
+
+        # where batch runs put each roll's output, if not told otherwise
+        BATCH_OUTPUT_DIR = "tagged"
\ No newline at end of file
@@ -0,0 +1,327 @@
+##############################################################################
+#
+# Name: contenthash.py
+#
+# Function:
+#       ContentIndex() class: content hashes of input files, and the
+#       outputs made from them, kept across runs
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from .constants import Constants
+from .fileutil import atomic_write_text
+from .settings import user_cache_dir
+from .__version__ import __version__
+
+# runs in the same process (batch, watch) share the index file
+_save_lock = threading.Lock()
+
+#### The ContentIndex class
+class ContentIndex:
+    """
+    An index of file contents, kept in the user's cache directory (in
+    Constants.CONTENT_INDEX_NAME) and shared by all runs:
+
+    - `files`: for each file hashed, its size, mtime and content digest,
+      so a file isn't read again until it changes; and
+    - `outputs`: for each output written, the key it was made from (the
+      digest of the input, the output mode and the tags; see
+      output_key()), so an identical output can be found again, in any
+      output directory.
+
+    The index is split into shards, one small JSON file for each
+    SHARD_DIGITS-hex-digit prefix of the key's digest (the output key
+    for outputs, and a digest of the path for files). A shard is read
+    when one of its keys is first needed, and only the shards a run
+    changed are written back. When a shard is written, the files and
+    outputs that no longer exist are dropped, and then the least
+    recently used entries beyond SHARD_FILES_MAX and SHARD_OUTPUTS_MAX.
+
+    Files are hashed in chunks, in a small pool of threads (hashlib
+    doesn't hold the GIL while hashing a chunk), so hashing overlaps
+    with reading, and with the rest of the run.
+
+    It's only a cache: an unreadable shard is ignored, and entries for
+    files that have changed are ignored and replaced.
+    """
+    FORMAT = 2
+
+    # bytes read and hashed at a time
+    CHUNK_SIZE = 1024 * 1024
+
+    # threads hashing files at once
+    WORKERS = 4
+
+    # the length of a shard's name; 2 digits is 256 shards
+    SHARD_DIGITS = 2
+
+    # the most entries kept in a shard; the least recently used go first
+    SHARD_FILES_MAX = 500
+    SHARD_OUTPUTS_MAX = 500
+
+    def __init__(self, log: logging.Logger = None, path: pathlib.Path | None = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.path = pathlib.Path(path) if path != None else user_cache_dir() / Constants.CONTENT_INDEX_NAME
+
+        # the shards read so far, as { name: (files, outputs) }
+        self.shards = dict()
+
+        # what this run added or used, to merge into the index on
+        # save(); and the outputs found to be gone or changed, to remove
+        # from it.
+        self.new_files = dict()
+        self.new_outputs = dict()
+        self.stale_outputs = dict()
+
+        self.lock = threading.Lock()
+        self.executor = None
+        self.futures = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def load(self) -> "ContentIndex":
+        """ get ready to use the index; its shards are read as they're needed """
+        return self
+
+    def _shard_path(self, name: str) -> pathlib.Path:
+        return self.path / f"{name}.json"
+
+    def _file_shard(self, key: str) -> str:
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()[:self.SHARD_DIGITS]
+
+    def _output_shard(self, key: str) -> str:
+        return key[:self.SHARD_DIGITS]
+
+    def _read(self, name: str) -> tuple:
+        path = self._shard_path(name)
+        try:
+            contents = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return dict(), dict()
+        except (OSError, ValueError) as e:
+            self.log.warning("ignoring unreadable content index %s: %s", path, e)
+            return dict(), dict()
+        if type(contents) != dict or contents.get("format") != self.FORMAT:
+            return dict(), dict()
+        return contents.get("files", dict()), contents.get("outputs", dict())
+
+    #
+    # The (files, outputs) of the shard called name, read if it hasn't
+    # been. The caller must hold self.lock to use them.
+    #
+    def _shard(self, name: str) -> tuple:
+        with self.lock:
+            shard = self.shards.get(name)
+            if shard == None:
+                shard = self.shards[name] = self._read(name)
+            return shard
+
+    def save(self) -> None:
+        """
+        merge what this run added into the shards on disk that it
+        changed (which another run may have changed meanwhile), drop
+        what's gone or too old, and write them
+        """
+        with self.lock:
+            if len(self.new_files) == 0 and len(self.new_outputs) == 0 and len(self.stale_outputs) == 0:
+                return
+            changes = dict()
+            for key, entry in self.new_files.items():
+                changes.setdefault(self._file_shard(key), (dict(), dict(), dict()))[0][key] = entry
+            for key, entries in self.new_outputs.items():
+                changes.setdefault(self._output_shard(key), (dict(), dict(), dict()))[1][key] = entries
+            for key, gone in self.stale_outputs.items():
+                changes.setdefault(self._output_shard(key), (dict(), dict(), dict()))[2][key] = gone
+            self.new_files = dict()
+            self.new_outputs = dict()
+            self.stale_outputs = dict()
+
+        with _save_lock:
+            for name, (new_files, new_outputs, stale_outputs) in sorted(changes.items()):
+                files, outputs = self._read(name)
+
+                # what's changed goes to the end: the order is the order of use.
+                for key, entry in new_files.items():
+                    files.pop(key, None)
+                    files[key] = entry
+                for key, gone in stale_outputs.items():
+                    entries = [ entry for entry in outputs.pop(key, []) if not tuple(entry) in gone ]
+                    if len(entries) != 0:
+                        outputs[key] = entries
+                for key, entries in new_outputs.items():
+                    known = [ entry for entry in outputs.pop(key, []) if not entry[0] in { new[0] for new in entries } ]
+                    outputs[key] = entries + known
+                self._evict(files, outputs)
+
+                path = self._shard_path(name)
+                contents = { "format": self.FORMAT, "tool": __version__, "files": files, "outputs": outputs }
+                try:
+                    self.path.mkdir(parents=True, exist_ok=True)
+                    atomic_write_text(path, json.dumps(contents, separators=(",", ":")))
+                except OSError as e:
+                    # it's only a cache
+                    self.log.warning("can't write content index %s: %s", path, e)
+                    return
+                self.log.debug("ContentIndex.save: %d files, %d outputs: %s", len(files), len(outputs), path)
+
+    #
+    # Drop the entries of a shard whose files are gone, and then the
+    # oldest, beyond the limits.
+    #
+    def _evict(self, files: dict, outputs: dict) -> None:
+        for key in [ key for key in files if not os.path.exists(key) ]:
+            del files[key]
+        for key in list(outputs):
+            entries = [ entry for entry in outputs[key] if os.path.exists(entry[0]) ]
+            if len(entries) != 0:
+                outputs[key] = entries
+            else:
+                del outputs[key]
+
+        for table, limit in ((files, self.SHARD_FILES_MAX), (outputs, self.SHARD_OUTPUTS_MAX)):
+            for key in list(itertools.islice(table, max(0, len(table) - limit))):
+                del table[key]
+
+    def close(self) -> None:
+        """ stop hashing, and save the index """
+        if self.executor != None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.save()
+
+    ##################
+    # hashing inputs #
+    ##################
+    @staticmethod
+    def _key(path: pathlib.Path) -> str:
+        return str(pathlib.Path(path).absolute())
+
+    def _hash(self, path: pathlib.Path) -> str:
+        key = self._key(path)
+        stat = os.stat(path)
+        files = self._shard(self._file_shard(key))[0]
+        with self.lock:
+            entry = files.get(key)
+            if entry != None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                # it's been used: keep it.
+                self.new_files[key] = entry
+                return entry[2]
+
+        digest = hashlib.blake2b(digest_size=32)
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if n == 0:
+                    break
+                digest.update(view[:n])
+        result = digest.hexdigest()
+
+        entry = [ stat.st_size, stat.st_mtime_ns, result ]
+        with self.lock:
+            files[key] = entry
+            self.new_files[key] = entry
+        return result
+
+    def digests(self, paths: list) -> list:
+        """
+        start hashing the files in paths, and return a Future for the
+        digest of each (whose result() raises OSError if the file can't
+        be read)
+        """
+        if self.executor == None:
+            self.executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="hash")
+        result = []
+        for path in paths:
+            key = self._key(path)
+            with self.lock:
+                future = self.futures.get(key)
+                if future == None:
+                    future = self.futures[key] = self.executor.submit(self._hash, path)
+            result.append(future)
+        return result
+
+    def digest(self, path: pathlib.Path) -> str:
+        """ the digest of path: from digests(), if it was started there; otherwise, now """
+        with self.lock:
+            future = self.futures.get(self._key(path))
+        if future != None:
+            return future.result()
+        return self._hash(path)
+
+    def seen(self, digests: set) -> dict:
+        """ { digest: [ path, ... ] } for the files in the index with any of these digests """
+        # this needs all of the shards.
+        for shard_path in self.path.glob("*.json"):
+            self._shard(shard_path.stem)
+        result = dict()
+        with self.lock:
+            for files, outputs in self.shards.values():
+                for path, entry in files.items():
+                    if entry[2] in digests:
+                        result.setdefault(entry[2], []).append(path)
+        return result
+
+    ###########
+    # outputs #
+    ###########
+    @staticmethod
+    def output_key(digest: str, output_mode: str, settings: dict) -> str:
+        """ the key of an output: what it's made from, and how """
+        made_from = json.dumps([ digest, output_mode, settings, __version__ ], sort_keys=True)
+        return hashlib.blake2b(made_from.encode("utf-8"), digest_size=32).hexdigest()
+
+    def find_output(self, key: str) -> pathlib.Path | None:
+        """
+        an existing output made from key, unchanged since it was
+        written; or None. Those found to be gone or changed are
+        forgotten.
+        """
+        outputs = self._shard(self._output_shard(key))[1]
+        with self.lock:
+            entries = list(outputs.get(key, []))
+        for path, size, mtime_ns in entries:
+            try:
+                stat = os.stat(path)
+                if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                    return pathlib.Path(path)
+            except OSError:
+                pass
+            self.log.debug("ContentIndex.find_output: forgetting %s", path)
+            with self.lock:
+                known = [ entry for entry in outputs.pop(key, []) if entry[0] != path ]
+                if len(known) != 0:
+                    outputs[key] = known
+                self.stale_outputs.setdefault(key, set()).add((path, size, mtime_ns))
+        return None
+
+    def add_output(self, key: str, path: pathlib.Path) -> None:
+        """ record that path (now complete) was made from key """
+        stat = os.stat(path)
+        entry = [ self._key(path), stat.st_size, stat.st_mtime_ns ]
+        outputs = self._shard(self._output_shard(key))[1]
+        with self.lock:
+            entries = [ entry ] + [ known for known in outputs.get(key, []) if known[0] != entry[0] ]
+            outputs[key] = entries
+            self.new_outputs[key] = [ entry ] + [ known for known in self.new_outputs.get(key, []) if known[0] != entry[0] ]
@@ -0,0 +1,227 @@
+##############################################################################
+#
+# Name: dirwatch.py
+#
+# Function:
+#       Classes for watching directory trees for changes: inotify (on
+#       Linux, through ctypes), or polling
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       A watcher only says *where* something may have changed; the
+#       caller looks at the directories to see what (and whether they
+#       have stopped changing). So both kinds of watcher look the same
+#       to the caller: wait() returns the set of directories to look at,
+#       or None to look at everything.
+#
+##############################################################################
+
+#### imports ####
+import errno
+import logging
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+
+#### The PollingWatcher class
+class PollingWatcher:
+    """
+    Watch directory trees by looking at all of them every so often:
+    wait() sleeps for the interval, and then returns None. This works
+    everywhere (including network file systems, where inotify doesn't
+    see changes made by other machines), at the cost of a walk of the
+    trees each time.
+    """
+    def __init__(self, roots: list, interval: float, log: logging.Logger = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.roots = [ pathlib.Path(root) for root in roots ]
+        self.interval = interval
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def wait(self, timeout: float | None = None) -> set | None:
+        """ wait for the interval (or timeout, if sooner); look at everything """
+        time.sleep(self.interval if timeout == None else min(timeout, self.interval))
+        return None
+
+    def close(self) -> None:
+        pass
+
+#### The InotifyWatcher class
+class InotifyWatcher:
+    """
+    Watch directory trees with Linux inotify, called through ctypes (so
+    there's nothing to install). Each directory in the trees gets a
+    watch; new directories get one as they appear. wait() blocks until
+    something changes (or timeout), and returns the directories where it
+    did. If the kernel's event queue overflows, wait() returns None, and
+    the caller should look at everything.
+
+    exclude(path) -> bool, if given, names directories not to watch
+    (for example, our own output directories).
+
+    Raises InotifyWatcher.Error if inotify isn't available, so the
+    caller can fall back to PollingWatcher.
+    """
+
+    class Error(Exception):
+        """ this is the Exception thrown if inotify can't be used """
+        pass
+
+    # from <sys/inotify.h>
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    # a file finished or arrived, or a directory appeared or went away.
+    # (Not IN_MODIFY: that's every write of a file being uploaded.)
+    MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+            IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    # struct inotify_event, not counting the name that follows
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, roots: list, log: logging.Logger = None, exclude = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.roots = [ pathlib.Path(root) for root in roots ]
+        self.exclude = exclude if exclude != None else (lambda path: False)
+        self.paths = dict()
+        self.fd = None
+
+        if sys.platform != "linux":
+            raise self.Error(f"inotify isn't available on {sys.platform}")
+
+        import ctypes
+        import ctypes.util
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self.libc.inotify_init1.argtypes = [ ctypes.c_int ]
+            self.libc.inotify_add_watch.argtypes = [ ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 ]
+        except (OSError, AttributeError) as e:
+            raise self.Error(f"can't find inotify in the C library: {e}")
+
+        fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise self.Error(f"inotify_init1: {os.strerror(ctypes.get_errno())}")
+        self.fd = fd
+
+        try:
+            for root in self.roots:
+                self._watch_tree(root)
+        except:
+            self.close()
+            raise
+        self.log.debug("InotifyWatcher: watching %d directories", len(self.paths))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _watch(self, path: pathlib.Path) -> None:
+        import ctypes
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # gone already, or not ours to look at.
+                return
+            if error == errno.ENOSPC:
+                raise self.Error(f"too many directories to watch (see /proc/sys/fs/inotify/max_user_watches): {path}")
+            raise self.Error(f"inotify_add_watch {path}: {os.strerror(error)}")
+        self.paths[wd] = path
+
+    #
+    # Watch every directory in the tree at root, and return them all
+    # (a tree that's moved in arrives complete, with no events of its
+    # own, so the caller has to look at all of it).
+    #
+    def _watch_tree(self, root: pathlib.Path) -> set:
+        found = set()
+        if self.exclude(root):
+            return found
+        self._watch(root)
+        found.add(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            directory = pathlib.Path(dirpath)
+            dirnames[:] = [ name for name in dirnames if not self.exclude(directory / name) ]
+            for name in dirnames:
+                self._watch(directory / name)
+                found.add(directory / name)
+        return found
+
+    def wait(self, timeout: float | None = None) -> set | None:
+        """
+        wait up to timeout seconds (forever if None) for changes, and
+        return the directories where something changed (perhaps none);
+        or None if events were lost.
+        """
+        ready, _, _ = select.select([ self.fd ], [], [], timeout)
+        if len(ready) == 0:
+            return set()
+
+        changed = set()
+        overflow = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = self.EVENT.unpack_from(buffer, offset)
+                offset += self.EVENT.size
+                name = buffer[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                directory = self.paths.get(wd)
+                if directory == None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # the watch went away with its directory.
+                    del self.paths[wd]
+                    continue
+
+                changed.add(directory)
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    changed |= self._watch_tree(directory / os.fsdecode(name))
+
+        if overflow:
+            # directories that appeared may not have watches yet.
+            self.log.warning("InotifyWatcher: events were lost; looking at everything")
+            for root in self.roots:
+                self._watch_tree(root)
+            return None
+        return changed
+
+    def close(self) -> None:
+        if self.fd != None:
+            os.close(self.fd)
+            self.fd = None
+            self.paths = dict()
@@ -0,0 +1,285 @@
+##############################################################################
+#
+# Name: exiftool.py
+#
+# Function:
+#       Class for a long-lived exiftool session (using -stay_open)
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import logging
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+
+from .constants import Constants
+
+#### The ExifTool class
+class ExifTool:
+    """
+    Run commands through a single exiftool process, started with
+    `-stay_open True -@ -`, rather than launching Perl for each command.
+
+    Each command is written to the process's stdin one argument per line,
+    followed by `-echo4 {readyN}` and `-executeN`; exiftool answers with
+    `{readyN}` on stdout (and, because of the -echo4, on stderr) once
+    the command is complete.
+
+    If define_namespaces, exiftool is given the config from
+    xmp.exiftool_config(), so it knows the non-standard XMP namespaces
+    we write (XMP-AnalogExif and XMP-AnnotateFilmScans) just as the
+    sidecar writer does; otherwise it has only the user's own config.
+
+    The process is started on first use. If it has died before a
+    command can be sent, it is restarted and the command is sent to the
+    new process. If it dies while running a command, the command isn't
+    run again (commands aren't idempotent: a second `-o` would find the
+    first one's output, and an edit could be applied twice); that's an
+    error, and the next command starts a new process. If a command
+    times out, the process is killed (and restarted by the next
+    command).
+    """
+
+    class Error(Exception):
+        """ this is the Exception thrown for exiftool errors """
+        pass
+
+    class Timeout(Error):
+        """ exiftool didn't answer in time """
+        pass
+
+    class _Crashed(Error):
+        """ internal: the exiftool process went away """
+        pass
+
+    class _NotSent(_Crashed):
+        """ internal: the exiftool process went away before the command was sent """
+        pass
+
+    def __init__(self, log: logging.Logger = None, executable: str = "exiftool", timeout: float = Constants.EXIFTOOL_TIMEOUT, define_namespaces: bool = False):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.executable = executable
+        self.timeout = timeout
+        self.define_namespaces = define_namespaces
+        self.process = None
+        self.stdout_queue = None
+        self.stderr_queue = None
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self) -> None:
+        """ start the exiftool process, if not already running """
+        if self.process != None and self.process.poll() == None:
+            return
+
+        # -config has to come first.
+        args = [ self.executable ]
+        if self.define_namespaces:
+            from .settings import user_cache_dir
+            from .xmp import exiftool_config_path
+            config = exiftool_config_path(user_cache_dir(), self.log)
+            if config != None:
+                args += [ "-config", str(config) ]
+        args += [ "-stay_open", "True", "-@", "-" ]
+        self.log.debug("ExifTool.start: %s", " ".join(args))
+        try:
+            self.process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                bufsize=1
+                )
+        except OSError as e:
+            self.process = None
+            raise self.Error(f"can't start {self.executable}: {e}")
+
+        # exiftool writes to both stdout and stderr; drain each one in
+        # its own thread, so neither pipe can fill up and block the other.
+        self.stdout_queue = self._start_reader(self.process.stdout)
+        self.stderr_queue = self._start_reader(self.process.stderr)
+
+    @staticmethod
+    def _start_reader(stream) -> queue.Queue:
+        lines = queue.Queue()
+        def reader():
+            for line in stream:
+                lines.put(line)
+            # end of file: the process has exited.
+            lines.put(None)
+        threading.Thread(target=reader, daemon=True).start()
+        return lines
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        """
+        Run one exiftool command (args excludes the program name), and
+        return its stdout. If input is given, it's supplied in place
+        of any `-json=-` argument (stdin is the command stream, so we
+        pass it via a temporary file).
+
+        Raises ExifTool.Error if exiftool reports an error.
+        """
+        with self.lock:
+            input_path = None
+            try:
+                if input != None:
+                    with tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8", delete=False) as f:
+                        f.write(input)
+                        input_path = f.name
+                    args = [ f"-json={input_path}" if arg == "-json=-" else arg for arg in args ]
+
+                try:
+                    return self._execute(args)
+                except self._NotSent as e:
+                    self.log.warning("exiftool exited unexpectedly (%s); restarting", e)
+                    self._kill()
+                except self._Crashed as e:
+                    self._kill()
+                    raise self.Error(f"exiftool exited unexpectedly while running the command ({e}): {' '.join(args)}")
+
+                try:
+                    return self._execute(args)
+                except self._Crashed as e:
+                    self._kill()
+                    raise self.Error(f"exiftool exited unexpectedly twice ({e}): {' '.join(args)}")
+            finally:
+                if input_path != None:
+                    os.unlink(input_path)
+
+    def _execute(self, args: list) -> str:
+        self.start()
+
+        self.sequence = self.sequence + 1
+        ready = f"{{ready{self.sequence}}}"
+        command = "\n".join(args + [ "-echo4", ready, f"-execute{self.sequence}" ]) + "\n"
+
+        try:
+            self.process.stdin.write(command)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise self._NotSent(f"write failed: {e}")
+
+        try:
+            stdout = self._read_until_ready(self.stdout_queue, ready)
+            stderr = self._read_until_ready(self.stderr_queue, ready)
+        except self.Timeout:
+            self.log.error("exiftool timed out after %gs; killing it", self.timeout)
+            self._kill()
+            raise
+
+        if stderr != "":
+            if any(line.startswith("Error") for line in stderr.splitlines()):
+                raise self.Error(f"exiftool {' '.join(args)}: {stderr.strip()}")
+            self.log.debug("exiftool: %s", stderr.strip())
+        return stdout
+
+    def _read_until_ready(self, lines: queue.Queue, ready: str) -> str:
+        result = ""
+        while True:
+            try:
+                line = lines.get(timeout=self.timeout)
+            except queue.Empty:
+                raise self.Timeout(f"no response from exiftool within {self.timeout}s")
+            if line == None:
+                raise self._Crashed(f"exit status {self.process.wait()}")
+            if line.rstrip() == ready:
+                return result
+            result += line
+
+    def _kill(self) -> None:
+        if self.process == None:
+            return
+        self.process.kill()
+        self.process.wait()
+        self.process = None
+
+    def close(self) -> None:
+        """ ask exiftool to exit, and wait for it """
+        with self.lock:
+            if self.process == None:
+                return
+            if self.process.poll() == None:
+                try:
+                    self.process.stdin.write("-stay_open\nFalse\n")
+                    self.process.stdin.flush()
+                    self.process.stdin.close()
+                    self.process.wait(timeout=self.timeout)
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    self.log.warning("exiftool didn't exit cleanly (%s); killing it", e)
+                    self.process.kill()
+                    self.process.wait()
+            self.log.debug("ExifTool.close: exit status %d", self.process.returncode)
+            self.process = None
+
+#### The ExifToolPool class
+class ExifToolPool:
+    """
+    A set of ExifTool sessions that threads can use to run exiftool
+    commands concurrently. `execute()` has the same signature as
+    ExifTool.execute(); it runs the command in an idle session, starting
+    a new one only if all of them are busy. So there are never more
+    exiftool processes than commands running at once, and a pool can be
+    shared by several runs (and thread pools) in turn.
+    """
+    Error = ExifTool.Error
+
+    def __init__(self, log: logging.Logger = None, executable: str = "exiftool", timeout: float = Constants.EXIFTOOL_TIMEOUT, define_namespaces: bool = False):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.executable = executable
+        self.timeout = timeout
+        self.define_namespaces = define_namespaces
+        self.idle = []
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _acquire(self) -> ExifTool:
+        with self.lock:
+            if len(self.idle) != 0:
+                return self.idle.pop()
+            session = ExifTool(self.log, self.executable, self.timeout, self.define_namespaces)
+            self.sessions.append(session)
+            self.log.debug("ExifToolPool: %d sessions", len(self.sessions))
+            return session
+
+    def _release(self, session: ExifTool) -> None:
+        with self.lock:
+            self.idle.append(session)
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        session = self._acquire()
+        try:
+            return session.execute(args, input)
+        finally:
+            self._release(session)
+
+    def close(self) -> None:
+        """ shut down all the sessions """
+        with self.lock:
+            sessions = self.sessions
+            self.sessions = []
+            self.idle = []
+        for session in sessions:
+            session.close()
@@ -0,0 +1,127 @@
+##############################################################################
+#
+# Name: fieldparsers.py
+#
+# Function:
+#       Parsers for the values of shot-info fields and tag names, with
+#       precompiled patterns and memoized results
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       The same few values ("1/250", "f/8", "09:14:00") appear over and
+#       over in a shot-info file, so each parser remembers its recent
+#       results. All the results are immutable (strings, numbers,
+#       times), so they can safely be shared. Dates aren't memoized:
+#       each appears about once. Invalid values raise ValueError; the
+#       callers turn that into their own errors, with line numbers.
+#
+##############################################################################
+
+#### imports ####
+from datetime import time
+from functools import lru_cache
+import re
+
+from .constants import Constants
+
+# how many distinct values each parser remembers
+CACHE_SIZE = 4096
+
+# the patterns, compiled once
+RE_FSTOP = re.compile(Constants.re_fstop, flags=re.IGNORECASE)
+RE_EXPOSURE = re.compile(Constants.re_exposure, flags=re.IGNORECASE)
+RE_TIME_WITHTZ = re.compile(Constants.re_time_withtz)
+RE_TIME_MINUTES = re.compile(Constants.re_time_minutes, flags=re.IGNORECASE)
+RE_TEMPERATURE_C = re.compile(Constants.re_temperature_c, flags=re.IGNORECASE)
+RE_COMMENT_TAG = re.compile(r"(XMP-AnalogExif|Exif|XMP|ExifIFD|XMP-AnnotateFilmScans):(.*)", flags=re.IGNORECASE)
+
+# the value of a field that was deliberately left unrecorded
+NOT_RECORDED = "not recorded"
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_fnumber(value: str | None) -> float | str | None:
+    """ "f/8" -> 8.0; "?" -> NOT_RECORDED; blank -> None """
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return NOT_RECORDED
+    result = RE_FSTOP.fullmatch(value)
+    if result == None:
+        raise ValueError(f"invalid f-stop: {value}")
+    return float(result.group(1))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_exposure(value: str | None) -> str | None:
+    """ check an exposure time ("1/250", "2", "0.5"); "?" -> NOT_RECORDED; blank -> None """
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return NOT_RECORDED
+    if RE_EXPOSURE.fullmatch(value) == None:
+        raise ValueError(f"invalid exposure: {value}")
+    return value
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_time_minutes(value: str | None) -> str | None:
+    """ check a duration in minutes ("7", "7:30"); "?" -> NOT_RECORDED; blank -> None """
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return NOT_RECORDED
+    if RE_TIME_MINUTES.fullmatch(value) == None:
+        raise ValueError(f"invalid time duration (minutes): {value}")
+    return value
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_temperature_c(value: str | None) -> float | str | None:
+    """ "20c", "20.5" -> degrees C; "?" -> NOT_RECORDED; blank -> None """
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return NOT_RECORDED
+    result = RE_TEMPERATURE_C.fullmatch(value)
+    if result == None:
+        raise ValueError(f"invalid temperature (minutes): {value}")
+    if result.group(2) != None:
+        return float(result.group(1) + result.group(2))
+    else:
+        return float(result.group(1))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_time(value: str) -> str:
+    """ fix up a missing colon in a timezone: "09:14+0400" -> "09:14+04:00" """
+    timematch = RE_TIME_WITHTZ.fullmatch(value)
+    if timematch and timematch.group(4) and not timematch.group(8):
+        # we have nnnn; convert to nn:nn
+        return timematch.group(1) + "+" + timematch.group(6) + ":" + timematch.group(7)
+    return value
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_time(value: str) -> time:
+    """ parse a time of day, with or without a timezone """
+    return time.fromisoformat(normalize_time(value))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def comment_key(tag: str) -> str | None:
+    """ the name under which tag is listed in the photo-information comment, or None """
+    match = RE_COMMENT_TAG.fullmatch(tag)
+    if match != None and match.group(2) != "UserComment":
+        return match.group(2)
+    return None
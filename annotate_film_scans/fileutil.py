@@ -0,0 +1,159 @@
+##############################################################################
+#
+# Name: fileutil.py
+#
+# Function:
+#       File-system helpers: fast file copies, atomic writes, partial
+#       files, read-ahead
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import errno
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+# Linux ioctl to make dst share src's extents (btrfs, xfs, bcachefs...)
+FICLONE = 0x40049409
+
+# errors that just mean "this method isn't available here; try another"
+_UNSUPPORTED = {
+    errno.EXDEV, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EINVAL,
+    errno.ENOSYS, errno.ENOTTY, errno.EPERM, errno.EBADF
+    }
+
+def _reflink(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    if sys.platform != "linux":
+        return False
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    dst.unlink()
+    return False
+
+def _copy_file_range(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        try:
+            offset = 0
+            while offset < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset, offset, offset)
+                if n == 0:
+                    break
+                offset += n
+            if offset == size:
+                return True
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    dst.unlink()
+    return False
+
+def fast_copy(src: pathlib.Path, dst: pathlib.Path, allow_link: bool = False) -> str:
+    """
+    Copy src to a new file dst as cheaply as the file system allows, and
+    return the name of the method used: "reflink", "link",
+    "copy_file_range" or "copy".
+
+    "link" makes dst a hard link to src, so it's only allowed if the
+    caller promises never to modify dst in place -- only to replace it
+    by renaming a new file over it (which is what exiftool does with
+    -overwrite_original). That breaks the link, and src is untouched.
+
+    dst must not already exist.
+    """
+    src = pathlib.Path(src)
+    dst = pathlib.Path(dst)
+
+    if _reflink(src, dst):
+        return "reflink"
+
+    if allow_link:
+        try:
+            os.link(src, dst)
+            return "link"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    if _copy_file_range(src, dst):
+        return "copy_file_range"
+
+    # shutil uses sendfile() or fcopyfile() where it can.
+    shutil.copyfile(src, dst)
+    return "copy"
+
+def atomic_write_bytes(path: pathlib.Path, data: bytes) -> None:
+    """
+    Write data to path by writing a temporary file in the same
+    directory and renaming it into place, so readers see either the
+    old contents or the new, never a partial file. Each call gets its
+    own temporary file, so threads can write the same path at once (the
+    last rename wins).
+    """
+    path = pathlib.Path(path)
+    fd, tmpname = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    tmppath = pathlib.Path(tmpname)
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmppath, path)
+    except:
+        tmppath.unlink(missing_ok=True)
+        raise
+
+def atomic_write_text(path: pathlib.Path, text: str) -> None:
+    """ like atomic_write_bytes(), for text (as UTF-8) """
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+def partial_path(path: pathlib.Path) -> pathlib.Path:
+    """
+    The name to write path under until it's complete: hidden, in the
+    same directory (so it can be renamed into place), and with the same
+    suffix (so exiftool knows the file type).
+    """
+    path = pathlib.Path(path)
+    return path.with_name(f".{path.stem}.partial{path.suffix}")
+
+def is_partial_path(path: pathlib.Path) -> bool:
+    """ true if path looks like a name returned by partial_path() """
+    path = pathlib.Path(path)
+    return path.name.startswith(".") and path.with_suffix("").name.endswith(".partial")
+
+# bytes read at a time by prefetch_file(), where it has to read
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+def prefetch_file(path: pathlib.Path) -> None:
+    """
+    Get path into the page cache, so that whoever reads it next (like
+    exiftool) doesn't wait for the storage. Where we can, we just ask
+    the kernel to start reading it (posix_fadvise(WILLNEED)); otherwise
+    we read it ourselves, and throw the data away.
+    """
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            return
+        buffer = bytearray(PREFETCH_CHUNK_SIZE)
+        while f.readinto(buffer) != 0:
+            pass
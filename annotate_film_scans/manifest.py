@@ -0,0 +1,168 @@
+##############################################################################
+#
+# Name: manifest.py
+#
+# Function:
+#       Classes for the per-output-directory manifest used to skip frames
+#       that are already up to date, and the journal of a run in progress
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import logging
+import os
+import pathlib
+import threading
+
+from .constants import Constants
+from .fileutil import atomic_write_text
+from .__version__ import __version__
+
+#### The Manifest class
+class Manifest:
+    """
+    Records, for each output file in a directory, what it was made from:
+    the input path, size and modification time, the output mode, the
+    complete tag settings, and the version of this tool. If all of these
+    match on a later run (and the outputs are still there), the frame
+    doesn't need to be written again.
+
+    The manifest is kept in the output directory, in Constants.MANIFEST_NAME.
+    """
+
+    class Error(Exception):
+        """ this is the Exception thrown for manifest errors """
+        pass
+
+    def __init__(self, directory: pathlib.Path, log: logging.Logger = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.path = pathlib.Path(directory) / Constants.MANIFEST_NAME
+        self.frames = dict()
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self) -> "Manifest":
+        """ read the manifest, if there is one """
+        if not self.path.is_file():
+            return self
+        try:
+            contents = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            # it's only a cache: start over.
+            self.log.warning("ignoring unreadable manifest %s: %s", self.path, e)
+            return self
+        if type(contents) == dict and type(contents.get("frames")) == dict:
+            self.frames = contents["frames"]
+        return self
+
+    def save(self) -> None:
+        """ write the manifest, if anything changed """
+        with self.lock:
+            if not self.dirty:
+                return
+            contents = { "version": __version__, "frames": self.frames }
+            text = json.dumps(contents, indent=1, sort_keys=True)
+            self.dirty = False
+        atomic_write_text(self.path, text)
+        self.log.debug("Manifest.save: %d frames: %s", len(self.frames), self.path)
+
+    @staticmethod
+    def make_record(inpath: pathlib.Path, output_mode: str, settings: dict) -> dict:
+        """ describe how an output is made """
+        stat = pathlib.Path(inpath).stat()
+        return {
+            "input": str(inpath),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "mode": output_mode,
+            # as it will read back from the manifest
+            "settings": json.loads(json.dumps(settings)),
+            "tool": __version__
+            }
+
+    def get(self, outpath: pathlib.Path) -> dict | None:
+        with self.lock:
+            return self.frames.get(pathlib.Path(outpath).name)
+
+    def is_current(self, outpaths: list, record: dict) -> bool:
+        """ true if outpaths all exist, and were made as described by record """
+        if self.get(outpaths[0]) != record:
+            return False
+        return all(pathlib.Path(outpath).exists() for outpath in outpaths)
+
+    def put(self, outpath: pathlib.Path, record: dict) -> None:
+        with self.lock:
+            self.frames[pathlib.Path(outpath).name] = record
+            self.dirty = True
+
+    def update(self, frames: dict) -> None:
+        """ merge { output name: record } into the manifest """
+        with self.lock:
+            if len(frames) != 0:
+                self.frames.update(frames)
+                self.dirty = True
+
+    def forget(self, outpath: pathlib.Path) -> None:
+        with self.lock:
+            if self.frames.pop(pathlib.Path(outpath).name, None) != None:
+                self.dirty = True
+
+#### The Journal class
+class Journal:
+    """
+    The progress journal for a run: one JSON line per completed frame,
+    appended (and flushed to disk) as each frame finishes, so that if the
+    run is interrupted we know which frames were done. Each line is
+    `{"output": name, "record": manifest-record}`.
+
+    The journal is kept in the output directory, in Constants.JOURNAL_NAME,
+    and removed when a run completes.
+    """
+
+    def __init__(self, directory: pathlib.Path, log: logging.Logger = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.path = pathlib.Path(directory) / Constants.JOURNAL_NAME
+        self.file = None
+        self.lock = threading.Lock()
+
+    def read(self) -> dict:
+        """ return the frames recorded by an earlier run, as { output name: record } """
+        result = dict()
+        if not self.path.is_file():
+            return result
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    result[entry["output"]] = entry["record"]
+                except (ValueError, KeyError, TypeError):
+                    # most likely the last line, cut off by the interruption
+                    self.log.warning("ignoring damaged journal entry in %s", self.path)
+        return result
+
+    def open(self, resume: bool) -> None:
+        """ start recording; unless resuming, forget the earlier run """
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def append(self, outpath: pathlib.Path, record: dict) -> None:
+        line = json.dumps({ "output": pathlib.Path(outpath).name, "record": record }) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self, remove: bool) -> None:
+        """ stop recording; if the run is complete, the journal can go """
+        with self.lock:
+            if self.file != None:
+                self.file.close()
+                self.file = None
+            if remove:
+                self.path.unlink(missing_ok=True)
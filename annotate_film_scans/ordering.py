@@ -0,0 +1,175 @@
+##############################################################################
+#
+# Name: ordering.py
+#
+# Function:
+#       InputOrdering() class: the ways of putting a roll's scans in
+#       order, before they're matched to frames
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       Each way of ordering is a method, _order_{name}(paths) -> list
+#       (with "-" in the name made "_"), so adding one is adding a
+#       method and its name in ORDERS. The result is the order the
+#       scans were made in; App applies --forward/--reverse to that as
+#       always, except for "map", which gives the order on the film.
+#
+##############################################################################
+
+#### imports ####
+import json
+import logging
+import os
+import pathlib
+import re
+import time
+
+from .catalog import ScanCatalog, natural_key
+from .constants import Constants
+
+# "2023:06:16 10:11:12", the start of an EXIF date/time
+_RE_EXIF_TIME = re.compile(r"\d{4}:\d\d:\d\d \d\d:\d\d:\d\d")
+
+#### The InputOrdering class
+class InputOrdering:
+    """
+    Put input files in order:
+
+    - "given": as given (on the command line, or as found);
+    - "name": by name, in natural order ("scan2" before "scan10");
+    - "scan-time": by the time each was scanned, from the files' EXIF
+      data (DateTimeOriginal, or else CreateDate), or else their
+      modification time, ties broken by name. The times are read with
+      exiftool, as many files to a command as we can, and kept in the
+      ScanCatalog with the size and mtime of their file, so a file's
+      time is only read once;
+    - "map": as listed in a map file: one file name per line, in the
+      order of the frames on the film. Blank lines, and lines starting
+      with `#`, are ignored. This is for sheet film, whose scans come
+      back in no useful order.
+    """
+    ORDERS = Constants.INPUT_ORDERS
+
+    # the EXIF tags for the scan time, best first
+    TIME_TAGS = ("DateTimeOriginal", "CreateDate")
+
+    # how many unmapped input files to name in the error
+    UNMAPPED_REPORTED = 5
+
+    class Error(Exception):
+        """ this is the Exception thrown if the inputs can't be put in order """
+        pass
+
+    def __init__(self, log: logging.Logger = None, exiftool = None, stats = None, map_path: pathlib.Path | None = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.exiftool = exiftool
+        self.stats = stats
+        self.map_path = map_path
+
+    def order(self, name: str, paths: list) -> list:
+        """ paths, in the order called name """
+        if not name in self.ORDERS:
+            raise self.Error(f"unknown order {name!r}; expected one of: {', '.join(self.ORDERS)}")
+        result = getattr(self, "_order_" + name.replace("-", "_"))(list(paths))
+        self.log.debug("InputOrdering.order: %s: %d files", name, len(result))
+        return result
+
+    def _order_given(self, paths: list) -> list:
+        return paths
+
+    def _order_name(self, paths: list) -> list:
+        return sorted(paths, key=lambda path: natural_key(pathlib.Path(path).name))
+
+    ##############
+    # scan times #
+    ##############
+    def _order_scan_time(self, paths: list) -> list:
+        catalog = ScanCatalog(self.log).load()
+        try:
+            times = catalog.scan_times(paths, self._read_scan_times)
+        except OSError as e:
+            raise self.Error(f"can't read the scan times: {e}")
+        finally:
+            catalog.save()
+        return sorted(paths, key=lambda path: (times[str(pathlib.Path(path).absolute())], natural_key(pathlib.Path(path).name)))
+
+    #
+    # Read the scan times of paths with exiftool, a chunk at a time:
+    # { absolute path: "YYYY:MM:DD HH:MM:SS" }. A file without either
+    # tag gets its modification time, in local time, as EXIF times are.
+    #
+    def _read_scan_times(self, paths: list) -> dict:
+        result = dict()
+        batch_size = Constants.EXIFTOOL_BATCH_SIZE
+        for iChunk in range(0, len(paths), batch_size):
+            chunk = [ str(pathlib.Path(path).absolute()) for path in paths[iChunk : iChunk + batch_size] ]
+            args = [ "-json", "-s" ] + [ f"-{tag}" for tag in self.TIME_TAGS ] + chunk
+            self.log.info("exiftool -json -s %s {%d files}", " ".join(f"-{tag}" for tag in self.TIME_TAGS), len(chunk))
+            try:
+                if self.stats != None:
+                    with self.stats.stage("scan times"):
+                        output = self.exiftool.execute(args)
+                else:
+                    output = self.exiftool.execute(args)
+                records = json.loads(output)
+            except (self.exiftool.Error, ValueError) as e:
+                raise self.Error(f"can't read the scan times of {len(chunk)} files: {e}")
+
+            for record in records:
+                for tag in self.TIME_TAGS:
+                    match = _RE_EXIF_TIME.match(str(record.get(tag, "")))
+                    if match != None and not match.group().startswith("0000"):
+                        result[str(pathlib.Path(record["SourceFile"]).absolute())] = match.group()
+                        break
+
+            for path in chunk:
+                if not path in result:
+                    try:
+                        mtime = os.stat(path).st_mtime
+                    except OSError as e:
+                        raise self.Error(f"can't read the scan time of {path}: {e}")
+                    result[path] = time.strftime("%Y:%m:%d %H:%M:%S", time.localtime(mtime))
+        return result
+
+    ########
+    # maps #
+    ########
+    def _order_map(self, paths: list) -> list:
+        if self.map_path == None:
+            raise self.Error("no order map given")
+        try:
+            with open(self.map_path, "r", encoding="utf-8") as f:
+                names = [ line.strip() for line in f ]
+        except OSError as e:
+            raise self.Error(f"can't read order map: {e}")
+        names = [ name for name in names if name != "" and not name.startswith("#") ]
+
+        by_name = dict()
+        for path in paths:
+            name = pathlib.Path(path).name
+            if name in by_name:
+                raise self.Error(f"two input files named {name}; an order map can't tell them apart: {by_name[name]}, {path}")
+            by_name[name] = path
+
+        result = []
+        listed = set()
+        for name in names:
+            if name in listed:
+                raise self.Error(f"{self.map_path}: {name} is listed twice")
+            listed.add(name)
+            if not name in by_name:
+                self.log.warning("%s: not an input file, ignored: %s", self.map_path, name)
+                continue
+            result.append(by_name[name])
+
+        missing = [ pathlib.Path(path).name for path in paths if not pathlib.Path(path).name in listed ]
+        if len(missing) != 0:
+            shown = ", ".join(missing[:self.UNMAPPED_REPORTED])
+            more = f" and {len(missing) - self.UNMAPPED_REPORTED} more" if len(missing) > self.UNMAPPED_REPORTED else ""
+            raise self.Error(f"{self.map_path}: input files not in the order map: {shown}{more}")
+        return result
@@ -0,0 +1,91 @@
+##############################################################################
+#
+# Name: plan.py
+#
+# Function:
+#       Class for annotation plans: the frames to write, and their tags
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import pathlib
+
+from .fileutil import atomic_write_text
+from .__version__ import __version__
+
+#### The Plan class
+class Plan:
+    """
+    The result of planning a run: for every frame, the input file, the
+    output file and the final tags. A plan can be saved as JSON and
+    executed later (perhaps from another directory, or in parts; see
+    --frames) without the shot-info file. The paths in a plan made by
+    App.make_plan() are absolute.
+
+    While a plan is being made, its frames may be an iterator that
+    plans each frame as it's needed (see App.make_plan()); only a plan
+    whose frames are a list can be saved.
+    """
+    FORMAT = 1
+
+    class Error(Exception):
+        """ this is the Exception thrown for plan errors """
+        pass
+
+    class Frame:
+        """ one frame of a plan """
+        __slots__ = ("frame", "input", "output", "tags")
+
+        def __init__(self, frame: int, input: pathlib.Path, output: pathlib.Path, tags: dict):
+            self.frame = frame
+            self.input = pathlib.Path(input)
+            self.output = pathlib.Path(output)
+            self.tags = tags
+
+        def to_json(self) -> dict:
+            return { "frame": self.frame, "input": str(self.input), "output": str(self.output), "tags": self.tags }
+
+    def __init__(self, dir: pathlib.Path, output_mode: str, frames = None):
+        self.dir = pathlib.Path(dir)
+        self.output_mode = output_mode
+        self.frames = frames if frames != None else []
+
+    def append(self, frame: "Plan.Frame") -> None:
+        self.frames.append(frame)
+
+    def to_json(self) -> dict:
+        return {
+            "format": self.FORMAT,
+            "tool": __version__,
+            "dir": str(self.dir),
+            "output_mode": self.output_mode,
+            "frames": [ frame.to_json() for frame in self.frames ]
+            }
+
+    def save(self, path: pathlib.Path) -> None:
+        atomic_write_text(pathlib.Path(path), json.dumps(self.to_json(), indent=2) + "\n")
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Plan":
+        try:
+            contents = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise cls.Error(f"can't read plan {path}: {e}")
+
+        if type(contents) != dict or contents.get("format") != cls.FORMAT:
+            raise cls.Error(f"not a format {cls.FORMAT} plan: {path}")
+        try:
+            frames = [
+                cls.Frame(entry["frame"], entry["input"], entry["output"], entry["tags"])
+                for entry in contents["frames"]
+                ]
+            return cls(contents["dir"], contents["output_mode"], frames)
+        except (KeyError, TypeError) as e:
+            raise cls.Error(f"invalid plan {path}: {e}")
@@ -0,0 +1,243 @@
+##############################################################################
+#
+# Name: settings.py
+#
+# Function:
+#       Classes for reading, checking, merging and caching the settings
+#       files
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import pickle
+import sys
+from types import MappingProxyType
+
+from .constants import Constants
+from .fileutil import atomic_write_bytes
+
+def user_cache_dir() -> pathlib.Path:
+    """ the directory for our caches, following each platform's convention """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or pathlib.Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = pathlib.Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base) / "annotate_film_scans"
+
+def user_config_dir() -> pathlib.Path:
+    """ the directory for the user's configuration, following each platform's convention """
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or pathlib.Path.home() / "AppData" / "Roaming"
+    elif sys.platform == "darwin":
+        base = pathlib.Path.home() / "Library" / "Application Support"
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or pathlib.Path.home() / ".config"
+    return pathlib.Path(base) / "annotate_film_scans"
+
+#### The SettingsFile class
+class SettingsFile:
+    """
+    One settings file: for each category (camera, lens, and so on), the
+    named entries that can be chosen on the command line or in a
+    shot-info file, each a set of tags.
+
+    The packaged `settings.json` must have every category. Other files
+    (see SettingsCatalog) are overlays: they need only have the entries
+    they add or change, and may use null to remove an entry or a tag.
+    """
+
+    # the packaged settings file must have all of these
+    CATEGORIES = ( "camera", "lens", "film", "lab", "process", "author", "developer" )
+
+    class Error(Exception):
+        """ this is the Exception thrown for settings errors """
+        pass
+
+    def __init__(self, path: pathlib.Path, overlay: bool = False):
+        self.path = pathlib.Path(path)
+        self.overlay = overlay
+
+    def read(self) -> dict:
+        """ read, parse and check the file; return it as plain dicts """
+        try:
+            contents = self.path.read_bytes()
+        except OSError as e:
+            raise self.Error(f"Can't read: {self.path}: {e}")
+        try:
+            settings = json.loads(contents)
+        except ValueError as e:
+            raise self.Error(f"Invalid JSON in {self.path}: {e}")
+
+        if type(settings) != dict:
+            raise self.Error(f"{self.path}: must be an object of categories")
+        if not self.overlay:
+            for category in self.CATEGORIES:
+                if not category in settings:
+                    raise self.Error(f"{self.path}: no \"{category}\" category")
+
+        for category, entries in settings.items():
+            if type(entries) != dict:
+                raise self.Error(f"{self.path}: \"{category}\" must be an object of named entries")
+            for name, tags in entries.items():
+                if tags == None and self.overlay:
+                    continue
+                if type(tags) != dict:
+                    raise self.Error(f"{self.path}: {category} \"{name}\" must be an object of tags")
+                for tag, value in tags.items():
+                    if value == None and self.overlay:
+                        continue
+                    if not type(value) in (str, int, float, bool):
+                        raise self.Error(f"{self.path}: {category} \"{name}\": {tag} must be a string, number or boolean")
+        return settings
+
+#### The SettingsCatalog class
+class SettingsCatalog:
+    """
+    All the settings for a run, merged from these layers, each
+    overriding the ones before:
+
+    1. the packaged `settings.json`;
+    2. the user's `settings.json`, in user_config_dir();
+    3. Constants.LOCAL_SETTINGS_NAME, in the directory of the shot-info
+       file (if we know it);
+    4. the files named in the environment variable
+       Constants.SETTINGS_ENV (separated by os.pathsep).
+
+    An entry in a later layer is merged into the entry of the same name
+    in an earlier one, tag by tag; new entries go at the end. null
+    removes an entry or a tag.
+
+    load() returns the result as read-only lookup tables,
+    `settings[category][name] -> {tag: value}`. The merged settings are
+    pickled in the user's cache directory, and reused until one of the
+    layers is added, removed or modified, so later runs needn't read,
+    check or merge any of them.
+    """
+
+    Error = SettingsFile.Error
+
+    # change this if the compiled form changes
+    CACHE_FORMAT = 2
+
+    def __init__(self, directory: pathlib.Path | None = None, log: logging.Logger = None, cache_dir: pathlib.Path | None = None):
+        self.log = log if log != None else logging.getLogger(__name__)
+        self.directory = pathlib.Path(directory) if directory != None else None
+        self.cache_dir = cache_dir if cache_dir != None else user_cache_dir()
+
+    def layers(self) -> list:
+        """ the settings files for this run, as (path, is-overlay), lowest first """
+        # the package is always installed as files, so we needn't (and,
+        # for startup time, don't) use importlib.resources.
+        result = [ (pathlib.Path(__file__).parent / "settings.json", False) ]
+        result.append((user_config_dir() / "settings.json", True))
+        if self.directory != None:
+            result.append((self.directory / Constants.LOCAL_SETTINGS_NAME, True))
+        for name in os.environ.get(Constants.SETTINGS_ENV, "").split(os.pathsep):
+            if name != "":
+                result.append((pathlib.Path(name).expanduser(), True))
+        return result
+
+    def signature(self, layers: list | None = None) -> list:
+        """
+        the path, size and mtime of each layer (size and mtime are None
+        for an absent overlay); if this changes, the settings have.
+        """
+        if layers == None:
+            layers = self.layers()
+        signature = []
+        for path, overlay in layers:
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                if not overlay:
+                    raise self.Error(f"Can't find settings file: {path}")
+                # absent; but if it's created later, the cache is stale.
+                signature.append((str(path), None, None))
+            except OSError as e:
+                raise self.Error(f"Can't read: {path}: {e}")
+        return signature
+
+    def load(self) -> MappingProxyType:
+        """ return the merged settings, from the cache if possible """
+        layers = self.layers()
+
+        # the cache is named for the list of layers, and is good as long
+        # as all their sizes and mtimes match.
+        signature = self.signature(layers)
+        key = hashlib.sha256(repr([ layer[0] for layer in signature ]).encode()).hexdigest()
+        cache_path = self.cache_dir / f"settings-{key[:32]}.pickle"
+        stamp = (self.CACHE_FORMAT, signature)
+
+        merged = self._read_cache(cache_path, stamp)
+        if merged == None:
+            merged = self.merge([
+                SettingsFile(path, overlay).read()
+                for (path, overlay), (_, size, _) in zip(layers, signature)
+                if size != None
+                ])
+            self._write_cache(cache_path, stamp, merged)
+        return self.freeze(merged)
+
+    @staticmethod
+    def merge(layers: list) -> dict:
+        """ merge the settings from each file, lowest first """
+        result = dict()
+        for layer in layers:
+            for category, entries in layer.items():
+                merged_entries = result.setdefault(category, dict())
+                for name, tags in entries.items():
+                    if tags == None:
+                        merged_entries.pop(name, None)
+                        continue
+                    merged_tags = merged_entries.setdefault(name, dict())
+                    for tag, value in tags.items():
+                        if value == None:
+                            merged_tags.pop(tag, None)
+                        else:
+                            merged_tags[tag] = value
+        return result
+
+    @staticmethod
+    def freeze(merged: dict) -> MappingProxyType:
+        """ wrap the merged settings in read-only views """
+        return MappingProxyType({
+            category: MappingProxyType({ name: MappingProxyType(tags) for name, tags in entries.items() })
+            for category, entries in merged.items()
+            })
+
+    def _read_cache(self, cache_path: pathlib.Path, stamp: tuple) -> dict | None:
+        try:
+            with open(cache_path, "rb") as f:
+                cached_stamp, merged = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # it's only a cache
+            self.log.debug("SettingsCatalog: ignoring unreadable cache %s: %s", cache_path, e)
+            return None
+        if cached_stamp != stamp or type(merged) != dict:
+            self.log.debug("SettingsCatalog: settings changed since %s was written", cache_path)
+            return None
+        self.log.debug("SettingsCatalog: loaded from cache %s", cache_path)
+        return merged
+
+    def _write_cache(self, cache_path: pathlib.Path, stamp: tuple, merged: dict) -> None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(cache_path, pickle.dumps((stamp, merged), protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            self.log.debug("SettingsCatalog: can't write cache %s: %s", cache_path, e)
@@ -13,54 +13,312 @@
 #
 ##############################################################################
 
+import collections
 import configparser
 import csv
 from datetime import date, datetime, time, timezone, timedelta
-from io import TextIOWrapper, StringIO
+from io import TextIOWrapper
 import itertools
 import pathlib
 import re
-from typing import Union, List
+from time import perf_counter
+from typing import Iterator, Union, List
 from .__version__ import __version__
 from .constants import Constants
+from . import fieldparsers
+
+# two-digit seconds, for format_exif_datetimes()
+_SECONDS = tuple(f"{second:02d}" for second in range(60))
+
+def format_exif_datetime(value: datetime) -> str:
+    """ a date and time as EXIF wants it: "2023:06:03 09:14:00-04:00" """
+    return value.isoformat(sep=' ').replace('-', ':', 2)
+
+def format_exif_datetimes(base: datetime, step: int, count: int) -> list:
+    """
+    format_exif_datetime() for base, base + step seconds, base + 2*step
+    seconds and so on: count values in all.
+
+    Rather than adding and formatting a datetime for each, we work in
+    whole seconds from the start of base's day, and format each minute
+    (and date) only once. Offsets are whole seconds, so the fraction and
+    timezone are the same for all, and so is the UTC offset, provided
+    the timezone is a fixed one; if it isn't, we do it the slow way.
+    """
+    if base.tzinfo != None and not isinstance(base.tzinfo, timezone):
+        return [ format_exif_datetime(base + timedelta(seconds = step * i)) for i in range(count) ]
+
+    tail = base.isoformat(sep=' ')[19:]
+    day0 = base.toordinal()
+    second0 = base.hour * 3600 + base.minute * 60 + base.second
+    prefixes = dict()
+    result = []
+    for i in range(count):
+        minute, second = divmod(second0 + step * i, 60)
+        prefix = prefixes.get(minute)
+        if prefix == None:
+            day, minute_of_day = divmod(minute, 24 * 60)
+            thisdate = date.fromordinal(day0 + day)
+            prefix = prefixes[minute] = f"{thisdate.year:04d}:{thisdate.month:02d}:{thisdate.day:02d} {minute_of_day // 60:02d}:{minute_of_day % 60:02d}:"
+        result.append(prefix + _SECONDS[second] + tail)
+    return result
 
 #### The ShotInfoFile class
 class ShotInfoFile:
     def __init__(self, app):
         self.app = app
         self.shot_fields = app.constants.shot_fields
+        self.interned = collections.OrderedDict()
+
+        # the number of input files the frames are matched to; None if
+        # they aren't known yet (for example, when validating a file
+        # before the scans arrive), in which case the file numbers
+        # aren't checked against it.
+        self.file_count = len(app.args.input_files)
+
+        # with --find-duplicates: the content digest of each input file,
+        # by file number - 1, as a Future (see ContentIndex.digests()),
+        # to warn about identical scans used for different frames.
+        self.file_digests = None
+
+        # None to stop at the first error (by raising ShotInfoFile.Error);
+        # or a list, to collect every error as a Diagnostic and carry on
+        # as best we can (see check_path()).
+        self.diagnostics = None
+
+        # the lines before the header (the options), and the column of
+        # each field; set when the header is read.
+        self.line_offset = 0
+        self.columns = dict()
+        self.missing_fields = []
         pass
 
     class Error(Exception):
         """ this is the Exception thrown for ShotInfo errors """
         pass
 
-    def read_from_path(self, ipath: Union[ pathlib.Path, str ] ) -> list:
+    class Diagnostic:
+        """ one error found in a shot-info file; line and column count from 1, and may be None """
+        __slots__ = ("line", "column", "field", "message")
+
+        def __init__(self, line: int | None, column: int | None, field: str | None, message: str):
+            self.line = line
+            self.column = column
+            self.field = field
+            self.message = message
+
+        def to_json(self) -> dict:
+            return { "line": self.line, "column": self.column, "field": self.field, "message": self.message }
+
+    # the tags of a skipped frame (besides "file")
+    SKIP_TAGS = { Constants.TAG_SKIP: True }
+
+    # how many distinct heads and tails to keep for sharing (see
+    # _intern()); rows repeat the last few, so this needn't be large.
+    INTERNED_MAX = 64
+
+    # tags whose values are particular to a row; a tail with one of
+    # these isn't worth interning.
+    PER_ROW_TAGS = ( "XMP-AnnotateFilmScans:ImageNote", )
+
+    class Row:
+        """
+        The tags of a row of the shot-info file, shared by all the
+        frames of the row. `head` and `tail` are the tags that don't
+        depend on the frame; they may be shared with other rows, and
+        must not be changed.
+
+        The row has `count` frames, `timedelta` seconds apart. The first
+        time one of them needs its date and time, they're formatted for
+        all of them (see format_exif_datetimes()).
+        """
+        __slots__ = ("head", "datetime", "tail", "timedelta", "skip", "count", "datestrings")
+
+        def __init__(self, head: dict, datetime: datetime | None, tail: dict | None, timedelta: int, skip: bool, count: int = 1):
+            self.head = head
+            self.datetime = datetime
+            self.tail = tail
+            self.timedelta = timedelta
+            self.skip = skip
+            self.count = count
+            self.datestrings = None
+
+        def datestring(self, index: int) -> str:
+            """ the EXIF date and time of frame index of the row """
+            if index >= self.count:
+                return format_exif_datetime(self.datetime + timedelta(seconds = self.timedelta * index))
+            if self.datestrings == None:
+                self.datestrings = format_exif_datetimes(self.datetime, self.timedelta, self.count)
+            return self.datestrings[index]
+
+    class Frame:
+        """
+        One frame from the shot-info file: its row, the input file
+        number, and its index in the row's range of frames (which sets
+        its time). The tags are only built when asked for, by tags().
+        If the file lists the frame more than once, the later ones are
+        kept in `also`, and merged into the tags.
+        """
+        __slots__ = ("row", "file", "index", "also")
+
+        def __init__(self, row: "ShotInfoFile.Row", file: int, index: int):
+            self.row = row
+            self.file = file
+            self.index = index
+            self.also = ()
+
+        @property
+        def skip(self) -> bool:
+            return self.row.skip or any(other.skip for other in self.also)
+
+        def merge(self, other: "ShotInfoFile.Frame") -> None:
+            """ merge a later entry for the same frame into this one """
+            self.file = other.file
+            self.also = self.also + (other,)
+
+        def tags(self) -> dict:
+            """ build the attributes of the frame """
+            row = self.row
+            result = { "file": self.file }
+            result.update(row.head)
+            if row.datetime != None:
+                datestring = row.datestring(self.index)
+                result["Composite:SubSecDateTimeOriginal"] = datestring
+                # set the CreateDate from the everything but the timezone.
+                result["ExifIFD:CreateDate"] = datestring[0:19]
+                result["System:FileModifyDate"] = datestring
+            if row.tail != None:
+                result.update(row.tail)
+            for other in self.also:
+                result.update(other.tags())
+            return result
+
+    #
+    # The shot-info file is read as a pipeline of generators: rows are
+    # read one at a time, and each passes through the propagation steps
+    # (_extend_datetime() and so on) and is expanded to frames by
+    # _flatten_and_expand(), before the next row is read. So memory use
+    # doesn't grow with the size of the file, and the caller can start
+    # work on the first frames before the last rows are read.
+    #
+    # The frames_from_*() functions read the options and header when
+    # called (so option lines can change the app's settings before any
+    # frames are used), and return an iterator of (frame number,
+    # attributes). A frame number can be yielded more than once; see
+    # merge_frames(). Errors in a row are raised when the row is reached.
+    #
+    # Frames are yielded as ShotInfoFile.Frame records, which share
+    # the tags of their row; the attributes of a frame are only built
+    # when someone calls its tags().
+    #
+    def frames_from_path(self, ipath: Union[ pathlib.Path, str ]) -> Iterator:
         path = pathlib.Path(ipath)
         if path.match("*.csv"):
-            return self.read_csv_from_path(path)
+            return self.frames_from_csv_path(path)
         else:
             raise self.Error(f"Unknown file type: {path}")
 
-    def read_csv_from_path(self, ipath: pathlib.Path) -> list:
+    def frames_from_csv_path(self, ipath: pathlib.Path) -> Iterator:
+        """ open a CSV file and read its header; the iterator closes the file when done """
+        f = open(ipath, "r", newline='')
+        try:
+            frames = self.frames_from_csv_stream(f)
+        except:
+            f.close()
+            raise
+        return self._closing(f, frames)
+
+    @staticmethod
+    def _closing(f: TextIOWrapper, frames: Iterator) -> Iterator:
+        with f:
+            yield from frames
+
+    def frames_from_csv_stream(self, f: TextIOWrapper) -> Iterator:
+        """ read a CSV stream: first line is header, rest are contents """
+        with self.app.stats.stage("csv header"):
+            rows = self._read_csv(f)
+        rows = self._extend_datetime(rows)
+        rows = self._extend_simple_properties(rows)
+        rows = self._extend_camera_and_lens_info(rows)
+        return self._flatten_and_expand(rows)
+
+    @staticmethod
+    def merge_frames(frames: Iterator) -> dict:
+        """ collect (frame number, record) into a dict of attributes; if a frame appears twice, merge """
+        result = dict()
+        for iFrame, record in frames:
+            # just in case, merge things rather than overwriting
+            if iFrame in result:
+                result[iFrame].merge(record)
+            else:
+                result[iFrame] = record
+        return { iFrame: record.tags() for iFrame, record in result.items() }
+
+    def check_path(self, ipath: Union[ pathlib.Path, str ]) -> tuple:
+        """
+        read a whole shot-info file, collecting every error rather than
+        stopping at the first; return (frames, diagnostics), where frames
+        is the number of frames that use a file
+        """
+        self.diagnostics = []
+        frames = 0
+        try:
+            for iFrame, record in self.frames_from_path(ipath):
+                if not record.skip:
+                    frames += 1
+        except (self.Error, OSError, UnicodeDecodeError, csv.Error, configparser.Error) as e:
+            # the ones we can't carry on from
+            self.diagnostics.append(self.Diagnostic(None, None, None, str(e)))
+        return frames, self.diagnostics
+
+    #
+    # report an error in a row (or the header) of the file: raise it, or
+    # if we're collecting diagnostics, record it and return, so the
+    # caller can recover.
+    #
+    def _report(self, message: str, row: dict | None = None, field: str | None = None,
+                line: int | None = None, column: int | None = None) -> None:
+        if self.diagnostics == None:
+            raise self.Error(message)
+        if line == None and row != None:
+            line = row["line_num"]
+        if column == None and field != None:
+            column = self.columns.get(field)
+        self.diagnostics.append(self.Diagnostic(line, column, field, message))
+
+    def read_from_path(self, ipath: Union[ pathlib.Path, str ] ) -> dict:
+        """ read a whole shot-info file; return { frame number: attributes } """
+        return self.merge_frames(self.frames_from_path(ipath))
+
+    def read_csv_from_path(self, ipath: pathlib.Path) -> dict:
         """ read a CSV file given path """
-        # open the file and read it.
-        with open(ipath, "r", newline='') as f:
-            return self.read_csv_from_stream(f)
+        return self.merge_frames(self.frames_from_csv_path(ipath))
 
-    def read_csv_from_stream(self, f: TextIOWrapper) -> list:
-        """ read a CSV stream: first line is header, rest are contents. Retuns a list of dicts """
+    def read_csv_from_stream(self, f: TextIOWrapper) -> dict:
+        """ read a CSV stream: first line is header, rest are contents. Returns { frame number: attributes } """
+        return self.merge_frames(self.frames_from_csv_stream(f))
 
-        # scan options from front of file.
+    def _read_csv(self, f: TextIOWrapper) -> Iterator:
+        """ read the options and header; return an iterator of row dicts """
+
+        # scan options from front of file, noting the line of each, for
+        # errors.
         options = ""
-        firstline = f.readline().splitlines()[0]
+        option_lines = dict()
+        firstline = f.readline()
+        if firstline == "":
+            raise self.Error("empty shot-info file")
+        firstline = firstline.splitlines()[0]
         if firstline == "--":
             self.app.log.debug("_read_csv_from_stream: process '--' options")
+            self.line_offset = 1
             for optionline in f:
                 self.app.log.debug("_read_csv_from_stream: option line: %s", optionline)
+                self.line_offset += 1
                 if optionline.splitlines()[0] == "--":
                     break
                 options += optionline
+                option_lines.setdefault(re.split(r"[:=]", optionline, maxsplit=1)[0].strip().lower(), self.line_offset)
         else:
             self.app.log.debug("_read_csv_from_stream: no option tag: %s", firstline)
             f.seek(0)
@@ -74,9 +332,19 @@ class ShotInfoFile:
             if p.has_option("Options", "forward"):
                 self.app.args.forward = p.getboolean("Options", "forward", raw=True)
                 self.app.log.debug("_read_csv_from_stream: set forward: %d", self.app.args.forward)
+            if p.has_option("Options", "order"):
+                order = p.get("Options", "order", raw=True).strip().lower()
+                if order in Constants.INPUT_ORDERS:
+                    self.app.args.order = order
+                    self.app.log.debug("_read_csv_from_stream: set order: %s", self.app.args.order)
+                else:
+                    self._report(f"unknown order {order!r}; expected one of: {', '.join(Constants.INPUT_ORDERS)}", line=option_lines.get("order"), field="order")
             if p.has_option("Options", "timedelta"):
-                self.app.args.timedelta = p.getint("Options", "timedelta",raw=True)
-                self.app.log.debug("_read_csv_from_stream: set timedelta: %d", self.app.args.timedelta)
+                try:
+                    self.app.args.timedelta = p.getint("Options", "timedelta",raw=True)
+                    self.app.log.debug("_read_csv_from_stream: set timedelta: %d", self.app.args.timedelta)
+                except ValueError as e:
+                    self._report(f'invalid timedelta: {p.get("Options", "timedelta", raw=True)}: {e}', line=option_lines.get("timedelta"), field="timedelta")
             if p.has_option("Options", "camera"):
                 self.app.args.camera = p.get("Options", "camera", raw=True)
                 self.app.log.debug("_read_csv_from_stream: set camera: %s", self.app.args.camera)
@@ -105,107 +373,132 @@ class ShotInfoFile:
                 self.app.args.devnotes = p.get("Options", "devnotes", raw=True)
                 self.app.log.debug("_read_csv_from_stream: set devnotes: %s", self.app.args.devnotes)
 
-        # read rest of file into a string object
-        sBody = f.read()
-        sBodyNoTabs = sBody.replace('\t', ' ')
-
-        # create csv stream from stream -- use excel (default) delimiters
-        filereader = csv.reader(StringIO(sBodyNoTabs), dialect='excel', skipinitialspace=True)
+        # create csv reader for the rest of the file, a line at a time,
+        # with tabs made spaces -- use excel (default) delimiters
+        lines = self._untabbed_lines(f)
+        filereader = csv.reader(lines, dialect='excel', skipinitialspace=True)
 
         # read the header and confirm it
         csv_dict = self._read_first_line(filereader)
 
-        # read list of dict entries
-        result = self._read_body(filereader, csv_dict)
+        # the rows, as they're needed
+        return self._read_body(filereader, csv_dict)
 
-        self._extend_datetime(result)
-        self._extend_simple_properties(result)
-        self._extend_camera_and_lens_info(result)
-        result = self._flatten_and_expand(result)
-        self.app.log.debug("read_csv_from_stream: result=%s", result)
-        return result
+    def _untabbed_lines(self, f: TextIOWrapper) -> Iterator:
+        nChars = 0
+        for line in f:
+            nChars += len(line)
+            yield line.replace('\t', ' ')
+        self.app.stats.count("csv bytes", nChars)
 
+    #
+    # Read the header: return the field of each column. A column we
+    # can't use (reported as an error) is given as "", and ignored.
+    #
     def _read_first_line(self, filereader) -> list:
         # read the first line and parse per CSV
-        header = next(filereader)
+        header = next(filereader, None)
+        if header == None:
+            raise self.Error("no header line")
         self.app.log.debug("_read_first_line: header: %s", header)
+        line = self.line_offset + filereader.line_num
         result = []
         seen_fields = dict()
 
         for field in header:
             canonical_field = field.lower().strip()
             if not canonical_field in self.shot_fields:
-                raise self.Error(f"Unknown CSV field name: {field}")
-            if canonical_field in seen_fields:
-                raise self.Error(f"Duplicate field {field} already seen at index {seen_fields[canonical_field]}")
-            seen_fields[canonical_field] = len(result)
+                self._report(f"Unknown CSV field name: {field}", line=line, column=len(result) + 1, field=field)
+                canonical_field = ""
+            elif canonical_field in seen_fields:
+                self._report(f"Duplicate field {field} already seen at index {seen_fields[canonical_field]}", line=line, column=len(result) + 1, field=field)
+                canonical_field = ""
+            else:
+                seen_fields[canonical_field] = len(result)
+                self.columns[canonical_field] = len(result) + 1
             result.append(canonical_field)
 
+        if not "frame" in seen_fields:
+            raise self.Error("no Frame column")
+
+        # fields that aren't in the file are empty in every row
+        self.missing_fields = sorted(self.shot_fields - set(seen_fields))
+
         self.app.log.debug("_read_first_line: result: %s", [ result ])
         return result
 
-    def _read_body(self, filereader, headers: list) -> list:
+    def _read_body(self, filereader, headers: list) -> Iterator:
         # it's hard to switch back and forth from a normal reader to a dict reader,
         # so we just sort of duplicate dict reader
-        result = []
+        nRows = 0
+        elapsed = 0.0
 
-        thisline = filereader.line_num + 1
+        thisline = self.line_offset + filereader.line_num + 1
+        start = perf_counter()
         for row in filereader:
             self.app.log.debug("_read_next_line: row %d: %s", thisline, row)
             row_result = dict()
-            for column in itertools.zip_longest(headers, row):
+            row_result["line_num"] = thisline
+            for iColumn, column in enumerate(itertools.zip_longest(headers, row)):
                 name = column[0]
                 if name == None:
-                    raise self.Error(f"Extra field value at line {filereader.line_num}: {column[1]}")
+                    self._report(f"Extra field value at line {thisline}: {column[1]}", row_result, column=iColumn + 1)
+                    break
+                if name == "":
+                    continue
                 if column[1] == None or column[1].strip() == "":
                     row_result[name] = None
                 else:
                     row_result[name] = column[1].strip()
+            for name in self.missing_fields:
+                row_result[name] = None
             self.app.log.debug(f"_read_body: line %d: %s", thisline, row_result )
-            row_result["line_num"] = thisline
-            thisline = filereader.line_num + 1
-            result.append(row_result)
+            thisline = self.line_offset + filereader.line_num + 1
+            nRows += 1
+            elapsed += perf_counter() - start
+            yield row_result
+            start = perf_counter()
 
-        return result
+        elapsed += perf_counter() - start
+        self.app.stats.add_time("csv read", elapsed)
+        self.app.stats.count("csv rows", nRows)
 
     #
-    # Propagate date/time through the file; update in place
+    # Propagate date/time through the file; update each row in place
     # This runs before flattening.
     #
-    def _extend_datetime(self, rows: list) -> list:
-        def datetime_fromiso(row: dict, field: str) -> datetime:
+    def _extend_datetime(self, rows: Iterator) -> Iterator:
+        # these return None if there's an error (and we're collecting them)
+        def datetime_fromiso(row: dict, field: str) -> datetime | None:
             result = None
             if row.get(field) == None:
                 raise self.Error("datetime_fromiso: no '%s' in row", field)
             try:
                 result = datetime.fromisoformat(row[field])
             except Exception as e:
-                raise self.Error(f"error converting date({field}) at line {row['line_num']}: {row[field]}: {e}")
+                self._report(f"error converting date({field}) at line {row['line_num']}: {row[field]}: {e}", row, field)
             return result
 
-        def time_fromiso(row: dict, field: str, baseTzInfo=None) -> time:
+        def time_fromiso(row: dict, field: str, baseTzInfo=None) -> time | None:
             result = None
             timestr = row.get(field)
             if timestr == None:
                 raise self.Error("time_fromiso: no '%s' in row", field)
 
-            # fix up missing colon in timezone
-            timematch = re.fullmatch(self.app.constants.re_time_withtz, timestr)
-            if timematch and timematch.group(4) and not timematch.group(8):
-                # we have nnnn; convert to nn:nn
-                timestr = timematch.group(1) + "+" + timematch.group(6) + ":" + timematch.group(7)
-
+            # (this fixes up a missing colon in the timezone)
             try:
-                result = time.fromisoformat(timestr)
+                result = fieldparsers.parse_time(timestr)
             except Exception as e:
-                raise self.Error(f"error converting time({field}) at line {row['line_num']}: {row[field]} => {timestr}: {e}")
+                self._report(f"error converting time({field}) at line {row['line_num']}: {row[field]} => {fieldparsers.normalize_time(timestr)}: {e}", row, field)
+                return None
 
             # if timezone given, return
             if result.tzinfo != None and result.tzinfo.utcoffset(None) != None:
                 return result
 
             if baseTzInfo == None:
-                raise self.Error(f"no timezone in time({field}), and base timezone not known: at line {row['line_num']}: {row[field]}")
+                self._report(f"no timezone in time({field}), and base timezone not known: at line {row['line_num']}: {row[field]}", row, field)
+                return None
             return result.replace(tzinfo=baseTzInfo)
 
         basedatetime = self.app.args.date
@@ -214,63 +507,83 @@ class ShotInfoFile:
         lasttzinfo = None
         delta = timedelta(seconds = self.app.args.timedelta)
 
+        # if a row's time can't be worked out, we carry on from the one
+        # before; if there isn't one, the following rows have no time
+        # either, and that's not reported again.
+        failed = False
+
+        elapsed = 0.0
         for row in rows:
+            start = perf_counter()
+            thisdatetime = None
             if ("time" in row and row["time"] != None):
                 if not ("date" in row and row["date"] != None):
                     # time set without date.
                     if basedatetime == None:
-                        raise self.Error(f"Time set, but base date not known: {row['time']}")
-                    # make the datetime from the basedate
-                    thistime = time_fromiso(row, "time", lasttzinfo)
-                    # overwrite the time part
-                    basedatetime = datetime.combine(basedatetime, thistime)
-                    row["datetime"] = basedatetime
+                        self._report(f"Time set, but base date not known: {row['time']}", row, "time")
+                    else:
+                        # make the datetime from the basedate
+                        thistime = time_fromiso(row, "time", lasttzinfo)
+                        # overwrite the time part
+                        if thistime != None:
+                            thisdatetime = datetime.combine(basedatetime, thistime)
                 else:
                     # time and date set
-                    basedatetime = datetime.combine(
-                                        datetime_fromiso(row, "date"),
-                                        time_fromiso(row, "time", lasttzinfo)
-                                        )
-                    row["datetime"] = basedatetime
+                    thisdate = datetime_fromiso(row, "date")
+                    thistime = time_fromiso(row, "time", lasttzinfo)
+                    if thisdate != None and thistime != None:
+                        thisdatetime = datetime.combine(thisdate, thistime)
             else:
                 # time is blank
 
                 # if date was set, update the base date/time from that.
                 if "date" in row and row["date"] != None:
-                    raise self.Error("it makes no sense to have date and not time")
+                    self._report("it makes no sense to have date and not time", row, "date")
 
                 if nextdatetime != None:
                     # time not specified, so we compute based on last frame in prev row.
-                    basedatetime = nextdatetime
-                else:
-                    raise self.Error(f"Base time is not set: at line {row['line_num']}: {row['time']}")
+                    thisdatetime = nextdatetime
+                elif not failed:
+                    self._report(f"Base time is not set: at line {row['line_num']}: {row['time']}", row, "time")
 
-                thistime = basedatetime.timetz()
+            if thisdatetime == None:
+                # (only if we're collecting errors)
+                failed = True
+                thisdatetime = nextdatetime
 
-                row["datetime"] = basedatetime
+            row["datetime"] = thisdatetime
+            if thisdatetime != None:
+                basedatetime = thisdatetime
 
-            # now remember last time, which must be the time of the *last*
-            # shot in the row.
-            if row.get("frame2") != None and row.get("frame") != None:
-                try:
-                    nextdatetime = basedatetime + (int(row["frame2"]) - int(row["frame"]) + 1) * delta
-                except Exception as e:
-                    raise self.Error("frame and frame2 not ints: %s", e)
-            else:
+                # now remember last time, which must be the time of the *last*
+                # shot in the row.
                 nextdatetime = basedatetime + delta
-            lasttzinfo = nextdatetime.tzinfo
+                if row.get("frame2") != None and row.get("frame") != None:
+                    try:
+                        nextdatetime = basedatetime + (int(row["frame2"]) - int(row["frame"]) + 1) * delta
+                    except Exception as e:
+                        # when collecting, _flatten_and_expand() reports this.
+                        if self.diagnostics == None:
+                            raise self.Error("frame and frame2 not ints: %s", e)
+                lasttzinfo = nextdatetime.tzinfo
 
-        self.app.log.debug("_extend_datetime: result: %s", rows)
-        return rows
+            self.app.log.debug("_extend_datetime: row: %s", row)
+            elapsed += perf_counter() - start
+            yield row
+
+        self.app.stats.add_time("extend datetime", elapsed)
 
     #
-    # helper for extending a setting, used several places
+    # helper for extending a setting, used several places. An unknown
+    # setting is an error; if we're collecting errors, we carry on with
+    # the previous one.
     #
     def _extend_setting(self, row, fieldname: str, currentvalue, setting):
         if fieldname in row and row[fieldname] != None:
-            currentvalue = row[fieldname]
-            if not currentvalue in self.app.settings[setting]:
-                raise self.Error(f"Not a known {setting}: {currentvalue} line={row['line_num']}")
+            if row[fieldname] in self.app.settings[setting]:
+                currentvalue = row[fieldname]
+            else:
+                self._report(f"Not a known {setting}: {row[fieldname]} line={row['line_num']}", row, fieldname)
         row[fieldname] = currentvalue
         return currentvalue
 
@@ -278,13 +591,13 @@ class ShotInfoFile:
     # propagate camera, lens, focallength, aperture, exposure, filter,
     # devtime, devtemp,devnotes, comment
     #
-    def _extend_camera_and_lens_info(self, rows: list) -> list:
-        def to_float(row: dict, field: str) -> float:
+    def _extend_camera_and_lens_info(self, rows: Iterator) -> Iterator:
+        def to_float(row: dict, field: str) -> float | None:
             result = None
             try:
                 result = float(row[field])
             except Exception as e:
-                raise self.Error(f"Not an float: {field=} line={row['line_num']}: {e}")
+                self._report(f"Not an float: {field=} line={row['line_num']}: {e}", row, field)
             return result
 
         currentlens = self.app.args.lens
@@ -298,7 +611,9 @@ class ShotInfoFile:
         currentdevtemp = self.app.args.devtemp
         currentdevnotes = self.app.args.devnotes
 
+        elapsed = 0.0
         for row in rows:
+            start = perf_counter()
             newcamera = self._extend_setting(row, "camera", currentcamera, "camera")
             if newcamera != currentcamera:
                 currentcamera = newcamera
@@ -311,7 +626,11 @@ class ShotInfoFile:
                 currentfocal = None
 
             if "focallength" in row and row["focallength"] != None:
-                currentfocal = to_float(row, "focallength")
+                focal = to_float(row, "focallength")
+                if focal != None:
+                    currentfocal = focal
+                else:
+                    row["focallength"] = currentfocal
             else:
                 row["focallength"] = currentfocal
 
@@ -381,54 +700,95 @@ class ShotInfoFile:
             else:
                 row["devnotes"] = currentdevnotes
 
-        return rows
+            elapsed += perf_counter() - start
+            yield row
+
+        self.app.stats.add_time("extend camera and lens info", elapsed)
 
     #
     # propagate lab, film, process
     #
-    def _extend_simple_properties(self, rows: list) -> list:
+    def _extend_simple_properties(self, rows: Iterator) -> Iterator:
         currentlab = self.app.args.lab
         currentfilm = self.app.args.film
         self.app.log.debug("_extend_simple_properties: initial film: %s", currentfilm)
         currentprocess = self.app.args.process
         currentdeveloper = self.app.args.developer
 
+        elapsed = 0.0
         for row in rows:
+            start = perf_counter()
             currentlab = self._extend_setting(row, "lab", currentlab, "lab")
             currentfilm = self._extend_setting(row, "film", currentfilm, "film")
             self.app.log.debug("_extend_simple_properties: extend film: %s", currentfilm)
             currentprocess = self._extend_setting(row, "process", currentprocess, "process")
             currentdeveloper = self._extend_setting(row, "developer", currentdeveloper, "developer")
-        return rows
+            elapsed += perf_counter() - start
+            yield row
+
+        self.app.stats.add_time("extend simple properties", elapsed)
+
+    #
+    # Warn if the file for frame iFrame has the same contents as one
+    # already used for another frame: the lab may have delivered a scan
+    # twice, under two names (and missed the real one).
+    #
+    def _check_duplicate(self, digest_frames: dict, iFrame: int, file_index: int) -> None:
+        if self.file_digests == None or file_index > len(self.file_digests):
+            return
+        try:
+            digest = self.file_digests[file_index - 1].result()
+        except OSError:
+            # it'll be reported when it's written.
+            return
+        if digest in digest_frames:
+            other_frame, other_file = digest_frames[digest]
+            self.app.log.warning("frame %d: file %d is identical to file %d, used for frame %d", iFrame, file_index, other_file, other_frame)
+        else:
+            digest_frames[digest] = (iFrame, file_index)
 
     #
     # flatten ranges and create per-image attributes
     #
-    # This also processes the SKIP attributes and assigns files
+    # This also processes the SKIP attributes and assigns files. Yields
+    # (frame number, ShotInfoFile.Frame) for each frame.
     #
-    def _flatten_and_expand(self, rows: list) -> dict:
+    def _flatten_and_expand(self, rows: Iterator) -> Iterator:
         constants : Constants = self.app.constants
-        def to_int(row: dict, field: str) -> int:
+        def to_int(row: dict, field: str) -> int | None:
             result = None
             try:
                 result = int(row[field])
             except Exception as e:
-                raise self.Error(f"Not an int: {field=}[{row[field]}] line={row['line_num']}: {e}")
+                self._report(f"Not an int: {field=}[{row[field]}] line={row['line_num']}: {e}", row, field)
             return result
 
-        result = dict()
+        file_count = self.file_count
+        files_used = bytearray(file_count if file_count != None else 0)
 
-        files_used = bytearray(len(self.app.args.input_files))
+        # the first frame using each content digest, and its file
+        digest_frames = dict()
 
         thisfile = 1
 
+        # when collecting errors: we report running out of files once.
+        too_many = False
+
+        elapsed = 0.0
         for row in rows:
+            start = perf_counter()
             # rows may express a range of frames
             # set rowseq to the range of frames to be output.
             firstrow = to_int(row, "frame")
+            if firstrow == None:
+                # (only if we're collecting errors) we can't use the row.
+                elapsed += perf_counter() - start
+                continue
             lastrow = firstrow
             if row["frame2"] != None:
                 lastrow = to_int(row, "frame2")
+                if lastrow == None:
+                    lastrow = firstrow
             if lastrow >= firstrow:
                 frameseq = range(firstrow, lastrow+1)
             else:
@@ -437,106 +797,80 @@ class ShotInfoFile:
             # if they want to set the file number of the row,
             # allow it, and change the sequence number
             if row.get("file") != None:
-                thisfile = to_int(row, "file")
+                file = to_int(row, "file")
+                if file != None and file < 1:
+                    self._report(f"file numbers start at 1: {file=} line={row['line_num']}", row, "file")
+                elif file != None:
+                    thisfile = file
+
+            # the tags are the same for all the frames of the row,
+            # except for the time.
+            row_tags = self._row_tags(row, len(frameseq))
 
             # put one entry in result for each frame to be generated for the row.
             for iFrame in frameseq:
-                # generate the value for the result, and (critically) set
-                # attrs["file"] to thisfile.
-                attrs = self._expand_attrs(row, thisfile, iFrame - firstrow)
+                # generate the record for the frame, and (critically) set
+                # its file to thisfile.
+                record = self.Frame(row_tags, thisfile, iFrame - firstrow)
 
                 # if it's a skip, we leave thisfile alone. Otherwise, we have consumed
                 # a file, so advance, and check that the file is in the input list
-                if attrs.get(constants.TAG_SKIP):
+                if row_tags.skip:
                     pass
                 else:
                     file_index = thisfile
                     thisfile = thisfile + 1
 
+                    if file_count == None:
+                        if file_index > len(files_used):
+                            files_used.extend(bytes(file_index - len(files_used)))
+                    elif file_index > file_count:
+                        if not too_many:
+                            self._report(f"too many effective frames: {file_index=} at frame {iFrame}, max {file_count}", row, "frame")
+                        too_many = True
+
                     if file_index > len(files_used):
-                        raise self.Error(f"too many effective frames: {file_index=} at frame {iFrame}, max {len(files_used)}")
+                        pass
+                    elif files_used[file_index - 1]:
+                        self._report(f"frame {iFrame} tries to reuse file {file_index}", row, "frame")
+                    else:
+                        files_used[file_index - 1] = True
+                        self._check_duplicate(digest_frames, iFrame, file_index)
 
-                    if files_used[file_index - 1]:
-                        raise self.Error(f"frame {iFrame} tries to reuse file {file_index}")
+                elapsed += perf_counter() - start
+                yield iFrame, record
+                start = perf_counter()
 
-                    files_used[file_index - 1] = True
+            elapsed += perf_counter() - start
 
-                # just in case, merge things rather than overwriting
-                if iFrame in result:
-                    result[iFrame].update(attrs)
-                else:
-                    result[iFrame] = attrs
+        self.app.stats.add_time("flatten and expand", elapsed)
 
         # check that all files were used
-        if sum(files_used) != len(files_used):
-            raise self.Error(f"{len(files_used) - sum(files_used)} input files were not used")
-
-        self.app.log.debug("_flatten_and_expand: result=%s", result)
-        return result
+        if file_count != None and sum(files_used) != len(files_used):
+            self._report(f"{len(files_used) - sum(files_used)} input files were not used")
 
     #
-    # convert key elements of a shot info row into equivalent attribute fields
+    # convert key elements of a shot info row into equivalent attribute
+    # fields, as a ShotInfoFile.Row shared by the frames of the row. The
+    # parts that don't depend on the frame are interned, so that rows
+    # with the same camera, lens, film and so on share them (unless a
+    # row has its own comment).
     #
-    def _expand_attrs(self, row: dict, file : int | None, duplicateIndex: int) -> dict:
+    def _row_tags(self, row: dict, count: int) -> "ShotInfoFile.Row":
         constants : Constants = self.app.constants
 
-        def get_fnumber(row, field):
-            if row[field] == None:
-                return None
-            value = row[field].strip()
-            if value == "":
-                return None
-            if value == "?":
-                return "not recorded"
-            result = re.fullmatch(self.app.constants.re_fstop, value, flags=re.IGNORECASE)
-            if result == None:
-                    raise self.Error(f"invalid f-stop: {value}")
-            return float(result.group(1))
-
-        def get_exposure(row, field):
-            if row[field] == None:
-                return None
-            value = row[field].strip()
-            if value == "":
-                return None
-            if value == "?":
-                return "not recorded"
-            result = re.fullmatch(constants.re_exposure, value, flags=re.IGNORECASE)
-            if result == None:
-                raise self.Error(f"invalid exposure: {value}")
-            return value
-
-        def get_time_minutes(row, field):
-            if row[field] == None:
-                return None
-            value = row[field].strip()
-            if value == "":
-                return None
-            if value == "?":
-                return "not recorded"
-            result = re.fullmatch(constants.re_time_minutes, value, flags=re.IGNORECASE)
-            if result == None:
-                raise self.Error(f"invalid time duration (minutes): {value}")
-            return value
-
-        def get_temperature_c(row, field):
-            if row[field] == None:
-                return None
-            value = row[field].strip()
-            if value == "":
+        # an invalid value is an error; if we're collecting errors, it's
+        # left out.
+        def parse(parser, row, field):
+            try:
+                return parser(row[field])
+            except ValueError as e:
+                self._report(f"{e} line={row['line_num']}", row, field)
                 return None
-            if value == "?":
-                return "not recorded"
-            result = re.fullmatch(constants.re_temperature_c, value, flags=re.IGNORECASE)
-            if result == None:
-                raise self.Error(f"invalid temperature (minutes): {value}")
-            if result.group(2) != None:
-                return float(result.group(1) + result.group(2))
-            else:
-                return float(result.group(1))
 
-        result = {}
-        def put_value(name: str, value):
+        head = {}
+        tail = {}
+        def put_value(result: dict, name: str, value):
             if value != None:
                 result[name] = value
         def update_from_settings(result: dict, row: dict, fieldname: str, setting: str):
@@ -544,68 +878,76 @@ class ShotInfoFile:
                 result.update(self.app.settings[setting][row[fieldname]])
             return result
 
-        # annotate the file number if provided.
-        if file != None:
-            result["file"] = file
-
         if row["exposure"] == "skip":
-            put_value(constants.TAG_SKIP, True)
-        else:
-            put_value("ExifIFD:ExposureTime", get_exposure(row, "exposure"))
-            put_value("ExifIFD:FNumber", get_fnumber(row, "aperture"))
+            return self.Row(self.SKIP_TAGS, None, None, 0, True, count)
 
-            if "filter" in row:
-                put_value("XMP-AnalogExif:Filter", row["filter"])
+        put_value(head, "ExifIFD:ExposureTime", parse(fieldparsers.parse_exposure, row, "exposure"))
+        put_value(head, "ExifIFD:FNumber", parse(fieldparsers.parse_fnumber, row, "aperture"))
 
-            if "roll" in row:
-                put_value("XMP-AnalogExif:RollId", row["roll"])
+        if "filter" in row:
+            put_value(head, "XMP-AnalogExif:Filter", row["filter"])
 
-            if "timedelta" in row:
-                try:
-                    deltaTime = int(row["timedelta"])
-                except Exception as e:
-                    raise self.Error(f'invalid timedelta: {row["timedelta"]}: {e}')
-            else:
-                deltaTime = self.app.args.timedelta
-
-            deltaTime = deltaTime * duplicateIndex
-            if row["datetime"] != None:
-                datevalue = row["datetime"]
-                datevalue += timedelta(seconds = deltaTime)
-                datestring = datevalue.isoformat(sep=' ').replace('-', ':', 2)
-                put_value("Composite:SubSecDateTimeOriginal", datestring)
-                # set the CreateDate from the everything but the timezone.
-                put_value("ExifIFD:CreateDate", datestring[0:19])
-                put_value("System:FileModifyDate", datestring)
-            update_from_settings(result, row, "lens", "lens")
-            update_from_settings(result, row, "camera", "camera")
-            update_from_settings(result, row, "lab", "lab")
-            update_from_settings(result, row, "process", "process")
-            update_from_settings(result, row, "film", "film")
-            update_from_settings(result, row, "developer", "developer")
-            #update_from_settings(result, row, "devtime", "devtime")
-            #update_from_settings(result, row, "devtemp", "devtemp")
-            #update_from_settings(result, row, "devnotes", "devnotes")
-
-            put_value(constants.TAG_DEVELOP_TIME, get_time_minutes(row, "devtime"))
-            put_value(constants.TAG_DEVELOP_TEMP, get_temperature_c(row, "devtemp"))
-
-            if row.get("devnotes") != None:
-                put_value(constants.TAG_DEVELOP_NOTES, row["devnotes"].strip())
-
-            if row["focallength"] != None:
-                focallength = float(row["focallength"])
-                TAG_CROP_FACTOR = constants.TAG_CROP_FACTOR
-                crop_factor = 1.0
-                if TAG_CROP_FACTOR in result:
-                    crop_factor = result[TAG_CROP_FACTOR]
-                focallength_35mm = focallength * crop_factor
-                put_value("EXIF:FocalLength", f"{focallength} mm")
-                put_value("ExifIFD:FocalLengthIn35mmFormat", f"{focallength_35mm} mm")
+        if "roll" in row:
+            put_value(head, "XMP-AnalogExif:RollId", row["roll"])
 
-            if "comment" in row and row["comment"] != None:
-                put_value("XMP-AnnotateFilmScans:ImageNote", row["comment"].strip())
+        deltaTime = self.app.args.timedelta
+        if "timedelta" in row:
+            try:
+                deltaTime = int(row["timedelta"])
+            except (TypeError, ValueError) as e:
+                self._report(f'invalid timedelta: {row["timedelta"]}: {e} line={row["line_num"]}', row, "timedelta")
+
+        update_from_settings(tail, row, "lens", "lens")
+        update_from_settings(tail, row, "camera", "camera")
+        update_from_settings(tail, row, "lab", "lab")
+        update_from_settings(tail, row, "process", "process")
+        update_from_settings(tail, row, "film", "film")
+        update_from_settings(tail, row, "developer", "developer")
+        #update_from_settings(tail, row, "devtime", "devtime")
+        #update_from_settings(tail, row, "devtemp", "devtemp")
+        #update_from_settings(tail, row, "devnotes", "devnotes")
+
+        put_value(tail, constants.TAG_DEVELOP_TIME, parse(fieldparsers.parse_time_minutes, row, "devtime"))
+        put_value(tail, constants.TAG_DEVELOP_TEMP, parse(fieldparsers.parse_temperature_c, row, "devtemp"))
+
+        if row.get("devnotes") != None:
+            put_value(tail, constants.TAG_DEVELOP_NOTES, row["devnotes"].strip())
+
+        if row["focallength"] != None:
+            focallength = float(row["focallength"])
+            TAG_CROP_FACTOR = constants.TAG_CROP_FACTOR
+            crop_factor = 1.0
+            if TAG_CROP_FACTOR in tail:
+                crop_factor = tail[TAG_CROP_FACTOR]
+            focallength_35mm = focallength * crop_factor
+            put_value(tail, "EXIF:FocalLength", f"{focallength} mm")
+            put_value(tail, "ExifIFD:FocalLengthIn35mmFormat", f"{focallength_35mm} mm")
+
+        if "comment" in row and row["comment"] != None:
+            put_value(tail, "XMP-AnnotateFilmScans:ImageNote", row["comment"].strip())
+
+        put_value(tail, "XMP-AnnotateFilmScans:AnnotateFilmScansVersion", __version__)
+
+        if not any(name in tail for name in self.PER_ROW_TAGS):
+            tail = self._intern(tail)
+        result = self.Row(self._intern(head), row["datetime"], tail, deltaTime, False, count)
+        self.app.log.debug("_row_tags: row=%s head=%s tail=%s", row, result.head, result.tail)
+        return result
 
-            put_value("XMP-AnnotateFilmScans:AnnotateFilmScansVersion", __version__)
-        self.app.log.debug("_expand_attrs: row=%s result=%s", row, result)
+    #
+    # return the shared copy of a dict of tags equal to tags, making
+    # this one the shared copy if it's the first. Only the last
+    # INTERNED_MAX used are kept, so a long file of varied rows doesn't
+    # collect them all.
+    #
+    def _intern(self, tags: dict) -> dict:
+        # the types matter: 1, 1.0 and True are equal, but aren't the same tag value.
+        key = tuple((name, type(value), value) for name, value in tags.items())
+        result = self.interned.get(key)
+        if result == None:
+            result = self.interned[key] = tags
+            if len(self.interned) > self.INTERNED_MAX:
+                self.interned.popitem(last=False)
+        else:
+            self.interned.move_to_end(key)
         return result
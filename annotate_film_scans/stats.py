@@ -0,0 +1,115 @@
+##############################################################################
+#
+# Name: stats.py
+#
+# Function:
+#       Class for collecting per-stage timings and counters for a run
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import contextlib
+import threading
+import time
+
+from .__version__ import __version__
+
+#### The Stats class
+class Stats:
+    """
+    Timings and counters for one run: the wall time and number of calls
+    of each named stage, named counters (bytes read, and so forth), and
+    one record per frame written, with its wall time, bytes in and out,
+    and exiftool status (0 for success, 1 for an error; None if exiftool
+    wasn't used). Safe to use from worker threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.stages = dict()
+        self.counters = dict()
+        self.frames = []
+        self.status = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """ time the body of a `with` as a call of stage name """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage == None:
+                stage = self.stages[name] = { "calls": 0, "seconds": 0.0 }
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def frame(self, frame: int, input: str, output: str, status: str, seconds: float,
+              bytes_in: int = 0, bytes_out: int = 0, exiftool_status: int | None = None,
+              error: str | None = None) -> None:
+        """ record what happened to one frame """
+        record = {
+            "frame": frame,
+            "input": str(input),
+            "output": str(output),
+            "status": status,
+            "seconds": seconds,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "exiftool_status": exiftool_status,
+            "error": error
+            }
+        with self.lock:
+            self.frames.append(record)
+
+    def to_json(self) -> dict:
+        with self.lock:
+            return {
+                "tool": __version__,
+                "status": self.status,
+                "seconds": time.perf_counter() - self.start,
+                "stages": { name: dict(stage) for name, stage in self.stages.items() },
+                "counters": dict(self.counters),
+                "frames": sorted(self.frames, key=lambda record: record["frame"])
+                }
+
+    def format_table(self) -> str:
+        """ the summary printed by --stats """
+        contents = self.to_json()
+        frames = contents["frames"]
+        width = max([ len("stage") ] + [ len(name) for name in contents["stages"] ])
+
+        lines = [ f"{'stage':<{width}}  {'calls':>6}  {'seconds':>9}  {'ms/call':>8}" ]
+        for name, stage in contents["stages"].items():
+            per_call = 1000 * stage["seconds"] / stage["calls"]
+            lines.append(f"{name:<{width}}  {stage['calls']:>6}  {stage['seconds']:>9.4f}  {per_call:>8.2f}")
+        for name, value in contents["counters"].items():
+            lines.append(f"{name}: {value}")
+
+        by_status = dict()
+        for record in frames:
+            by_status[record["status"]] = by_status.get(record["status"], 0) + 1
+        lines.append(
+            f"frames: {len(frames)} (" +
+            ", ".join(f"{n} {status}" for status, n in sorted(by_status.items())) +
+            f"); {sum(record['bytes_in'] for record in frames)} bytes in" +
+            f", {sum(record['bytes_out'] for record in frames)} bytes out" +
+            f"; exiftool errors: {sum(record['exiftool_status'] == 1 for record in frames)}"
+            )
+        lines.append(f"total: {contents['seconds']:.3f} seconds, status {contents['status']}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,250 @@
+##############################################################################
+#
+# Name: validate.py
+#
+# Function:
+#       ValidateApp() class, for checking many shot-info files without
+#       touching any images
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import json
+import os
+import pathlib
+import time
+
+from .app import App
+from .batch import BatchApp
+from .fileutil import atomic_write_text
+from .shotinfo import ShotInfoFile
+
+##############################################################################
+#
+# The validation application class
+#
+##############################################################################
+
+class ValidateApp(BatchApp):
+    """
+    Check shot-info files: read each one through the ShotInfoFile
+    pipeline, and match its frames against the number of scans
+    expected, without reading or writing any images, and without
+    starting exiftool.
+
+    Rolls are found as for BatchApp (directory trees and manifests);
+    shot-info files can also be named directly. The number of scans for
+    a roll is --count if given, and otherwise the number of images found
+    for it; if there are none (the scans haven't arrived yet), the file
+    numbers are checked only against each other.
+
+    The files are checked in parallel, in a pool of processes. An error
+    doesn't stop the checking: every file is checked, and within each
+    file, every error is reported (see ShotInfoFile.check_path()), as a
+    diagnostic with its line, column and field. The diagnostics can also
+    be written as JSON (--json), for editors and CI.
+    """
+
+    Error = BatchApp.Error
+
+    #######################
+    # parse the arguments #
+    #######################
+    def _parse_arguments(self, argv: list | None):
+        parser = argparse.ArgumentParser(
+            prog="annotate_film_scans validate",
+            description="Check shot-info files, without touching any images. Options not listed here are passed to each roll (see annotate_film_scans --help), and may change the defaults the files are checked with.",
+            allow_abbrev=False
+            )
+        parser.add_argument(
+            "--verbose", "-v",
+            action='count', default=0,
+            help="increase verbosity, once for each use"
+            )
+        parser.add_argument(
+            "--count",
+            metavar="{scans}",
+            type=int,
+            help="the number of scans expected for each roll (default: the number of images found for it; if none, don't check)"
+            )
+        parser.add_argument(
+            "--jobs", "-j",
+            metavar="{jobs}",
+            type=int,
+            default=0,
+            help="number of files to check in parallel; 0 means one per CPU (default %(default)d)"
+            )
+        parser.add_argument(
+            "--json",
+            metavar="{json-file}",
+            help="write the results, with every diagnostic, to this file as JSON; '-' means standard output (and no table)"
+            )
+        parser.add_argument(
+            "sources",
+            metavar="{shot-info-csv-or-manifest-or-dir}",
+            nargs="+",
+            type=pathlib.Path,
+            help="a shot-info file, a JSON manifest listing rolls, or a directory tree to search for shot-info files"
+            )
+
+        # anything we don't know goes to every roll
+        args, roll_options = parser.parse_known_args(argv)
+        args.dir = None
+        args.sources = [ source.expanduser() for source in args.sources ]
+        if args.count != None and args.count < 0:
+            parser.error(f"--count must not be negative: {args.count}")
+        if args.jobs == 0:
+            args.jobs = os.cpu_count() or 1
+        if args.jobs < 0:
+            parser.error(f"--jobs must not be negative: {args.jobs}")
+        return args, roll_options
+
+    #############################
+    # find the rolls to process #
+    #############################
+    def _find_rolls_in(self, source: pathlib.Path) -> list:
+        if source.match("*.csv") and not source.is_dir():
+            rolldir = source.parent
+            if not source.is_file():
+                roll = self.Roll(str(source), source, [], self._default_dir(rolldir, rolldir))
+                roll.error = "no such file"
+                return [ roll ]
+            roll = self._roll_in_dir(rolldir, rolldir, [ child.name for child in rolldir.iterdir() if child.is_file() ], source)
+            roll.name = str(source)
+            return [ roll ]
+        return super()._find_rolls_in(source)
+
+    #################################
+    # Run the app and return status #
+    #################################
+    def run(self) -> int:
+        rolls = self.find_rolls()
+        self.log.info("%d rolls", len(rolls))
+
+        checks = [ roll for roll in rolls if roll.error == None ]
+        tasks = [
+            (
+                str(roll.shot_info_file),
+                self._file_count(roll),
+                self.roll_options + roll.options,
+                self.args.verbose
+            )
+            for roll in checks
+            ]
+
+        jobs = min(self.args.jobs, len(tasks))
+        if jobs <= 1:
+            results = [ validate_roll(*task) for task in tasks ]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            self.log.info("checking %d files with %d processes", len(tasks), jobs)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(validate_roll, *zip(*tasks)))
+
+        for roll in rolls:
+            roll.diagnostics = []
+        for roll, task, (frames, diagnostics, seconds) in zip(checks, tasks, results):
+            roll.counts = { "frames": frames, "scans": task[1] }
+            roll.diagnostics = diagnostics
+            roll.seconds = seconds
+            if len(diagnostics) == 1:
+                roll.error = diagnostics[0]["message"]
+            elif len(diagnostics) > 1:
+                roll.error = f"{len(diagnostics)} errors"
+
+        if self.args.json != None:
+            self._write_json(rolls)
+        if self.args.json != "-":
+            self._print_diagnostics(rolls)
+            self._print_summary(rolls)
+        return 0 if all(roll.error == None for roll in rolls) else 1
+
+    def _file_count(self, roll: "BatchApp.Roll") -> int | None:
+        if self.args.count != None:
+            return self.args.count
+        if len(roll.input_files) != 0:
+            return len(roll.input_files)
+        return None
+
+    #
+    # Each diagnostic as `file:line:column: message`, the form editors
+    # and CI tools understand.
+    #
+    def _print_diagnostics(self, rolls: list) -> None:
+        for roll in rolls:
+            if len(roll.diagnostics) == 0 and roll.error != None:
+                print(f"{roll.shot_info_file}: {roll.error}")
+            for diagnostic in roll.diagnostics:
+                where = "".join(f":{diagnostic[key]}" for key in ("line", "column") if diagnostic[key] != None)
+                print(f"{roll.shot_info_file}{where}: {diagnostic['message']}")
+
+    def _write_json(self, rolls: list) -> None:
+        results = [
+            {
+                "roll": roll.name,
+                "shot_info_file": str(roll.shot_info_file),
+                "frames": roll.counts["frames"] if roll.counts != None else None,
+                "scans": roll.counts["scans"] if roll.counts != None else None,
+                "status": "ok" if roll.error == None else "failed",
+                "error": roll.error,
+                "diagnostics": roll.diagnostics
+            }
+            for roll in rolls
+            ]
+        text = json.dumps(results, indent=2) + "\n"
+        if self.args.json == "-":
+            print(text, end="")
+        else:
+            atomic_write_text(pathlib.Path(self.args.json).expanduser(), text)
+
+    def _print_summary(self, rolls: list) -> None:
+        width = max([ len("roll") ] + [ len(roll.name) for roll in rolls ])
+        print(f"{'roll':<{width}}  {'frames':>6}  {'scans':>5}  {'seconds':>7}  status")
+        for roll in rolls:
+            counts = roll.counts if roll.counts != None else { "frames": 0, "scans": None }
+            scans = counts["scans"] if counts["scans"] != None else "?"
+            status = "ok" if roll.error == None else f"FAILED: {roll.error}"
+            print(f"{roll.name:<{width}}  {counts['frames']:>6}  {scans:>5}  {roll.seconds:>7.2f}  {status}")
+
+        failed = sum(roll.error != None for roll in rolls)
+        print(f"{len(rolls)} files, {failed} failed")
+
+#
+# Check one shot-info file; return (frames, diagnostics, seconds), with
+# the diagnostics as JSON-style dicts. This runs in the worker
+# processes, so it takes and returns only simple values. Each process
+# reads the settings once for each directory.
+#
+_settings = dict()
+
+def validate_roll(shot_info_file: str, file_count: int | None, options: list, verbose: int) -> tuple:
+    start = time.monotonic()
+    frames = 0
+    diagnostics = []
+    try:
+        directory = pathlib.Path(shot_info_file).expanduser().parent
+        if not directory in _settings:
+            _settings[directory] = App.load_settings(directory)
+
+        argv = [ "-s", shot_info_file ] + [ "-v" ] * verbose + options
+        app = App(argv, settings=_settings[directory], check_only=True)
+        shot_info = ShotInfoFile(app)
+        shot_info.file_count = file_count
+        frames, found = shot_info.check_path(app.args.shot_info_file)
+        diagnostics = [ diagnostic.to_json() for diagnostic in found ]
+    except SystemExit as e:
+        # argparse reports errors by exiting
+        diagnostics = [ ShotInfoFile.Diagnostic(None, None, None, f"bad options (exit status {e.code})").to_json() ]
+    except Exception as e:
+        diagnostics = [ ShotInfoFile.Diagnostic(None, None, None, str(e)).to_json() ]
+    return frames, diagnostics, time.monotonic() - start
+
+def main(argv: list | None = None) -> int:
+    return ValidateApp(argv).run()
@@ -0,0 +1,369 @@
+##############################################################################
+#
+# Name: watch.py
+#
+# Function:
+#       WatchApp() class, for annotating rolls as they arrive in a scan
+#       directory
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import math
+import os
+import pathlib
+import signal
+import threading
+import time
+
+from .app import App
+from .batch import BatchApp
+from .constants import Constants
+from .dirwatch import InotifyWatcher, PollingWatcher
+from .exiftool import ExifToolPool
+from .settings import SettingsCatalog
+
+##############################################################################
+#
+# The watch application class
+#
+##############################################################################
+
+class WatchApp(BatchApp):
+    """
+    Watch directory trees for rolls (directories with a `shots-*.csv`
+    file, as for BatchApp), and annotate each one once its files have
+    stopped changing. Runs until interrupted (or sent SIGTERM).
+
+    Changes are found with inotify on Linux, and otherwise (or with
+    --poll) by looking at the trees every --interval seconds. A roll is
+    ready when its shot-info file, scans, local settings and order map
+    have had the same names, sizes and modification times for --settle
+    seconds (and, with --ready-file, when that file is there too). If
+    they change again later (more scans, a corrected shot-info file),
+    the roll is run again; frames that are already up to date are
+    skipped.
+
+    Everything that can be is set up once and kept warm: the settings
+    (read again only if a settings file changes), and one pool of
+    exiftool processes. Each roll is run by its own App, in a pool of
+    --rolls threads.
+    """
+
+    Error = BatchApp.Error
+
+    def __init__(self, argv: list | None = None):
+        super().__init__(argv)
+
+        # the settings signatures, by directory (see _settings_for())
+        self.settings_signatures = dict()
+        self.settings_lock = threading.Lock()
+
+        # roll directories whose files are changing: [signature, since]
+        self.pending = dict()
+        # rolls queued or running: (future, signature)
+        self.running = dict()
+        # the signature of each roll when it was last run
+        self.done = dict()
+        # the mtimes of directories that aren't rolls, for polling
+        # (see _look())
+        self.not_rolls = dict()
+
+    #######################
+    # parse the arguments #
+    #######################
+    def _parse_arguments(self, argv: list | None):
+        parser = argparse.ArgumentParser(
+            prog="annotate_film_scans watch",
+            description="Watch directory trees, and annotate each roll of film scans as it arrives. Options not listed here are passed to each roll (see annotate_film_scans --help).",
+            allow_abbrev=False
+            )
+        parser.add_argument(
+            "--verbose", "-v",
+            action='count', default=0,
+            help="increase verbosity, once for each use"
+            )
+        parser.add_argument(
+            "--dir", "-d",
+            type=pathlib.Path,
+            help=f"put each roll's output in a subdirectory of this directory, named for the roll (default: a '{Constants.BATCH_OUTPUT_DIR}' subdirectory of each roll's directory)"
+            )
+        parser.add_argument(
+            "--rolls",
+            metavar="{rolls}",
+            type=int,
+            default=2,
+            help="number of rolls to annotate at once (default %(default)d)"
+            )
+        parser.add_argument(
+            "--settle",
+            metavar="{seconds}",
+            type=float,
+            default=5.0,
+            help="how long a roll's files must be unchanged before it's annotated (default %(default)g)"
+            )
+        parser.add_argument(
+            "--ready-file",
+            metavar="{name}",
+            help="only annotate a roll once a file of this name is in its directory (for labs that mark finished uploads)"
+            )
+        parser.add_argument(
+            "--poll",
+            action="store_true",
+            help="look for changes by polling, rather than with inotify (for network file systems)"
+            )
+        parser.add_argument(
+            "--interval",
+            metavar="{seconds}",
+            type=float,
+            default=5.0,
+            help="with --poll, or where inotify isn't available, how often to look (default %(default)g)"
+            )
+        parser.add_argument(
+            "--new-only",
+            action="store_true",
+            help="don't annotate the rolls that are already there at startup, until they change"
+            )
+        parser.add_argument(
+            "--define-namespaces",
+            action="store_true",
+            help="start exiftool with a config defining the XMP-AnalogExif and XMP-AnnotateFilmScans namespaces as the sidecar writer writes them (in place of any definitions of them in your ~/.ExifTool_config, which is otherwise loaded as usual)"
+            )
+        parser.add_argument(
+            "sources",
+            metavar="{dir}",
+            nargs="+",
+            type=pathlib.Path,
+            help="a directory tree to watch for rolls"
+            )
+
+        # anything we don't know goes to every roll
+        args, roll_options = parser.parse_known_args(argv)
+        args.dir = args.dir.expanduser().absolute() if args.dir != None else None
+        args.sources = [ source.expanduser().absolute() for source in args.sources ]
+        for source in args.sources:
+            if not source.is_dir():
+                parser.error(f"not a directory: {source}")
+        if args.rolls < 1:
+            parser.error(f"--rolls must be at least 1: {args.rolls}")
+        if args.settle < 0 or args.interval <= 0:
+            parser.error("--settle must not be negative, and --interval must be positive")
+        return args, roll_options
+
+    #
+    # Directories not to look in: hidden ones, and our own output.
+    #
+    def _excluded(self, path: pathlib.Path) -> bool:
+        if path.name.startswith("."):
+            return True
+        if self.args.dir != None:
+            if path.is_relative_to(self.args.dir):
+                return True
+        elif path.name == Constants.BATCH_OUTPUT_DIR:
+            return True
+        return (path / Constants.MANIFEST_NAME).exists()
+
+    def _all_dirs(self):
+        for root in self.args.sources:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                dirnames[:] = [ name for name in dirnames if not self._excluded(pathlib.Path(dirpath) / name) ]
+                yield pathlib.Path(dirpath)
+
+    #
+    # The signature of the roll in rolldir: the name, size and mtime of
+    # each file that matters, sorted; or None if rolldir isn't a roll.
+    # Hidden files (uploads in progress, our partial outputs) are left
+    # out.
+    #
+    def _signature(self, rolldir: pathlib.Path) -> tuple | None:
+        entries = []
+        is_roll = False
+        try:
+            with os.scandir(rolldir) as scan:
+                for entry in scan:
+                    name = entry.name
+                    if name.startswith(".") or not entry.is_file():
+                        continue
+                    if fnmatch.fnmatch(name, Constants.SHOT_INFO_GLOB):
+                        is_roll = True
+                    elif not (os.path.splitext(name)[1].lower() in Constants.IMAGE_SUFFIXES or
+                              name == Constants.LOCAL_SETTINGS_NAME or name == Constants.ORDER_MAP_NAME or
+                              name == self.args.ready_file):
+                        continue
+                    stat = entry.stat()
+                    entries.append((name, stat.st_size, stat.st_mtime_ns))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return tuple(sorted(entries)) if is_roll else None
+
+    def _is_ready(self, signature: tuple) -> bool:
+        return self.args.ready_file == None or any(entry[0] == self.args.ready_file for entry in signature)
+
+    #
+    # Look at the directories that may have changed (None: all of
+    # them), and note the rolls that need to be run.
+    #
+    def _look(self, changed: set | None) -> None:
+        now = time.monotonic()
+        if changed == None:
+            # when polling, a directory that isn't a roll can only
+            # become one if its mtime changes (a shot-info file is
+            # added); but a roll's files can change in place, so we
+            # always look at those.
+            directories = []
+            for directory in self._all_dirs():
+                try:
+                    mtime = directory.stat().st_mtime_ns
+                except OSError:
+                    continue
+                if self.not_rolls.get(directory) != mtime:
+                    directories.append((directory, mtime))
+        else:
+            directories = [ (directory, None) for directory in sorted(changed) ]
+
+        for directory, mtime in directories:
+            signature = self._signature(directory)
+            if signature == None:
+                self.pending.pop(directory, None)
+                if mtime != None:
+                    self.not_rolls[directory] = mtime
+                continue
+            self.not_rolls.pop(directory, None)
+            if directory in self.running:
+                last = self.running[directory][1]
+            else:
+                last = self.done.get(directory)
+            if signature == last:
+                self.pending.pop(directory, None)
+            elif not directory in self.pending or self.pending[directory][0] != signature:
+                self.pending[directory] = [ signature, now ]
+                self.log.info("%s: changed", directory)
+
+    #
+    # Queue the rolls that have settled; the executor runs --rolls at
+    # a time.
+    #
+    def _start_ready(self, executor: ThreadPoolExecutor, exiftool: ExifToolPool) -> None:
+        now = time.monotonic()
+        for directory, (signature, since) in list(self.pending.items()):
+            if directory in self.running or now - since < self.args.settle:
+                continue
+
+            # make sure it's still the same, now that it's time.
+            current = self._signature(directory)
+            if current != signature:
+                if current == None:
+                    del self.pending[directory]
+                else:
+                    self.pending[directory] = [ current, now ]
+                continue
+            if not self._is_ready(signature):
+                continue
+
+            del self.pending[directory]
+            root = max((root for root in self.args.sources if directory.is_relative_to(root)), key=lambda root: len(root.parts))
+            roll = self._roll_in_dir(root, directory, [ entry[0] for entry in signature ])
+            self.log.info("%s: queued", roll.name)
+            self.running[directory] = (executor.submit(self._process, roll, exiftool), signature)
+
+    def _process(self, roll: "BatchApp.Roll", exiftool: ExifToolPool) -> "BatchApp.Roll":
+        self._run_roll(roll, exiftool)
+        return roll
+
+    def _collect(self) -> None:
+        for directory, (future, signature) in list(self.running.items()):
+            if future.cancelled():
+                del self.running[directory]
+            elif future.done():
+                del self.running[directory]
+                self.done[directory] = signature
+                self._print_roll(future.result())
+
+    #
+    # How long to wait for changes: until the next pending roll could
+    # have settled; and, while rolls are running, not too long, so we
+    # report them promptly. None means until something changes.
+    #
+    def _timeout(self) -> float | None:
+        now = time.monotonic()
+        timeout = math.inf
+        for directory, (signature, since) in self.pending.items():
+            if not directory in self.running and self._is_ready(signature):
+                timeout = min(timeout, max(0.0, since + self.args.settle - now))
+        if len(self.running) != 0:
+            timeout = min(timeout, 1.0)
+        return timeout if timeout != math.inf else None
+
+    def _make_watcher(self):
+        if not self.args.poll:
+            try:
+                return InotifyWatcher(self.args.sources, self.log, exclude=self._excluded)
+            except InotifyWatcher.Error as e:
+                self.log.warning("can't use inotify (%s); polling every %gs", e, self.args.interval)
+        return PollingWatcher(self.args.sources, self.args.interval, self.log)
+
+    #
+    # The settings are kept for each directory, as for BatchApp, but
+    # read again if any of their files changes. Rolls run in threads,
+    # so this is locked.
+    #
+    def _settings_for(self, directory: pathlib.Path) -> dict:
+        try:
+            signature = SettingsCatalog(directory, self.log).signature()
+        except SettingsCatalog.Error as e:
+            raise App.Error(str(e))
+        with self.settings_lock:
+            if self.settings_signatures.get(directory) != signature:
+                self.settings[directory] = App.load_settings(directory)
+                self.settings_signatures[directory] = signature
+            return self.settings[directory]
+
+    #################################
+    # Run the app and return status #
+    #################################
+    def run(self) -> int:
+        # stop cleanly (finishing the rolls in progress) on SIGTERM, too.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        with self._make_watcher() as watcher, \
+             ExifToolPool(self.log, define_namespaces=self.args.define_namespaces) as exiftool, \
+             ThreadPoolExecutor(max_workers=self.args.rolls, thread_name_prefix="roll") as executor:
+            self._look(None)
+            if self.args.new_only:
+                for directory, (signature, since) in self.pending.items():
+                    self.done[directory] = signature
+                self.pending = dict()
+            self.log.warning("watching %s for rolls", ", ".join(str(root) for root in self.args.sources))
+
+            try:
+                while True:
+                    self._collect()
+                    self._start_ready(executor, exiftool)
+                    self._look(watcher.wait(self._timeout()))
+            except KeyboardInterrupt:
+                # finish the rolls in progress, but not those queued.
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.log.warning("stopping; waiting for the rolls in progress")
+        self._collect()
+        return 0
+
+    def _print_roll(self, roll: "BatchApp.Roll") -> None:
+        counts = roll.counts if roll.counts != None else { "frames": 0, "written": 0, "current": 0 }
+        status = "ok" if roll.error == None else f"FAILED: {roll.error}"
+        print(
+            f"{roll.name}: {counts['frames']} frames, {counts['written']} written, {counts['current']} current, {roll.seconds:.2f}s: {status}",
+            flush=True
+            )
+
+def main(argv: list | None = None) -> int:
+    return WatchApp(argv).run()
@@ -0,0 +1,308 @@
+##############################################################################
+#
+# Name: xmp.py
+#
+# Function:
+#       Write XMP sidecar files directly from a tag dictionary; and the
+#       exiftool config defining the same non-standard namespaces
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from fractions import Fraction
+import hashlib
+import logging
+import math
+import pathlib
+import threading
+
+from .fileutil import atomic_write_text
+from .__version__ import __version__
+
+#
+# The namespaces we write, by the prefix we use for them. The group names
+# in tag keys (`XMP-dc:Creator`, `XMP-AnalogExif:Film`) use the same
+# prefixes, as exiftool does.
+#
+NAMESPACES = {
+    "dc":           "http://purl.org/dc/elements/1.1/",
+    "xmp":          "http://ns.adobe.com/xap/1.0/",
+    "photoshop":    "http://ns.adobe.com/photoshop/1.0/",
+    "tiff":         "http://ns.adobe.com/tiff/1.0/",
+    "exif":         "http://ns.adobe.com/exif/1.0/",
+    "exifEX":       "http://cipa.jp/exif/1.0/",
+    "aux":          "http://ns.adobe.com/exif/1.0/aux/",
+    "AnalogExif":   "http://analogexif.sourceforge.net/ns",
+    "AnnotateFilmScans": "https://github.com/terrillmoore/annotate_film_scans/ns/1.0/",
+    }
+
+_PREFIXES = { prefix.lower(): prefix for prefix in NAMESPACES }
+
+#
+# The namespaces above that exiftool doesn't know, and the properties we
+# write in each. This is the one definition of them: the sidecar writer
+# writes only these properties in them, and with --define-namespaces,
+# exiftool is told about them by the config from exiftool_config() (see
+# ExifTool.start()), so a tag is written by every output mode, or by
+# none. Without it, exiftool writes them only if the user's own config
+# defines them, as it always has.
+#
+CUSTOM_PROPERTIES = {
+    "AnalogExif": (
+        "CropFactor", "DevelopDuration", "DevelopProcess", "Developer",
+        "DeveloperDilution", "DeveloperMaker", "ExposureNumber", "Film",
+        "FilmAlias", "FilmFormat", "FilmMaker", "FilmType", "Filter", "Lab",
+        "LabAddress", "Multiexposure", "RollId", "Scanner", "ScannerMaker",
+        ),
+    "AnnotateFilmScans": (
+        "AnnotateFilmScansVersion", "CropFactor", "Developer",
+        "DevelopmentNotes", "DevelopmentTemperature", "DevelopmentTime",
+        "ImageNote", "Make", "Model", "Skip",
+        ),
+    }
+
+_CUSTOM_NAMES = {
+    prefix: { name.lower(): name for name in names }
+    for prefix, names in CUSTOM_PROPERTIES.items()
+    }
+
+# tags we couldn't put in a sidecar, reported once each
+_unmapped_reported = set()
+
+#
+# Tags that need more than "XMP-prefix:Name -> prefix:Name", keyed by
+# lower-case tag name. Each entry is a list of (property, kind) targets;
+# kind says how the value is written. Kinds ending in "?" only fill the
+# property if nothing else has set it: these are EXIF tags that duplicate
+# an XMP tag that we'd rather have win.
+#
+# A target of None means the tag has no place in a sidecar.
+#
+_TAG_MAP = {
+    "xmp:creator":                      [ ("dc:creator", "seq") ],
+    "xmp-dc:creator":                   [ ("dc:creator", "seq") ],
+    "ifd0:artist":                      [ ("dc:creator", "seq?") ],
+    "xmp:rights":                       [ ("dc:rights", "alt") ],
+    "xmp-dc:rights":                    [ ("dc:rights", "alt") ],
+    "exif:copyright":                   [ ("dc:rights", "alt?") ],
+    "ifd0:copyright":                   [ ("dc:rights", "alt?") ],
+    "xmp:lensmanufacturer":             [ ("exifEX:LensMake", "text") ],
+    "xmp:lensmodel":                    [ ("exifEX:LensModel", "text") ],
+    "xmp:lensserial":                   [ ("exifEX:LensSerialNumber", "text") ],
+    "xmp:cameraserialnumber":           [ ("aux:SerialNumber", "text") ],
+    "ifd0:make":                        [ ("tiff:Make", "text") ],
+    "ifd0:model":                       [ ("tiff:Model", "text") ],
+    "exififd:exposuretime":             [ ("exif:ExposureTime", "rational") ],
+    "exififd:fnumber":                  [ ("exif:FNumber", "rational") ],
+    "exif:focallength":                 [ ("exif:FocalLength", "rational") ],
+    "exififd:focallengthin35mmformat":  [ ("exif:FocalLengthIn35mmFilm", "int") ],
+    "exif:maxaperturevalue":            [ ("exif:MaxApertureValue", "apex") ],
+    "exif:iso":                         [ ("exif:ISOSpeedRatings", "seq") ],
+    "exififd:createdate":               [ ("exif:DateTimeDigitized", "date") ],
+    "exififd:usercomment":              [ ("exif:UserComment", "alt") ],
+    "exififd:lensmodel":                [ ("exifEX:LensModel", "text?") ],
+    "composite:subsecdatetimeoriginal": [ ("exif:DateTimeOriginal", "date"), ("photoshop:DateCreated", "date") ],
+    # EXIF LensInfo is four rationals; the text form is in aux:LensInfo.
+    "exififd:lensinfo":                 None,
+    # Windows-only duplicate of UserComment
+    "ifd0:xpcomment":                   None,
+    # this is the file's own date; the image keeps its own.
+    "system:filemodifydate":            None,
+    }
+
+def _escape(text: str) -> str:
+    """ escape &, < and > for XML (as xml.sax.saxutils.escape, which is slow to import) """
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _to_rational(value) -> str | None:
+    text = str(value).strip().removesuffix("mm").strip()
+    try:
+        fraction = Fraction(text).limit_denominator(100000)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return f"{fraction.numerator}/{fraction.denominator}"
+
+def _to_apex(value) -> str | None:
+    # MaxApertureValue is written as an f-number; XMP wants APEX units.
+    try:
+        fnumber = float(value)
+    except ValueError:
+        return None
+    if fnumber <= 0:
+        return None
+    return _to_rational(round(2 * math.log2(fnumber), 2))
+
+def _to_int(value) -> str | None:
+    text = str(value).strip().removesuffix("mm").strip()
+    try:
+        return str(round(float(text)))
+    except ValueError:
+        return None
+
+def _to_date(value) -> str | None:
+    # exiftool style "2023:06:02 10:00:00-04:00" to "2023-06-02T10:00:00-04:00"
+    text = str(value).strip()
+    if len(text) < 19:
+        return None
+    return text[0:10].replace(":", "-") + "T" + text[11:]
+
+#
+# The (property, kind) targets of key; None if it has no place in a
+# sidecar that we know of (as opposed to [], for tags that deliberately
+# aren't written).
+#
+def _targets(key: str) -> list | None:
+    lower_key = key.lower()
+    if lower_key in _TAG_MAP:
+        return _TAG_MAP[lower_key] or []
+
+    group, _, name = key.partition(":")
+    lower_group = group.lower()
+    if lower_group.startswith("xmp-"):
+        prefix = _PREFIXES.get(lower_group.removeprefix("xmp-"))
+        if prefix in _CUSTOM_NAMES:
+            name = _CUSTOM_NAMES[prefix].get(name.lower())
+            if name == None:
+                return None
+        if prefix != None:
+            return [ (f"{prefix}:{name}", "text") ]
+    elif lower_group == "xmp":
+        # as exiftool does, put it in the namespace that defines it
+        for prefix, names in _CUSTOM_NAMES.items():
+            if name.lower() in names:
+                return [ (f"{prefix}:{names[name.lower()]}", "text") ]
+    return None
+
+def _element(prop: str, kind: str, value: str) -> str:
+    value = _escape(value)
+    match kind:
+        case "seq" | "bag":
+            container = "rdf:Seq" if kind == "seq" else "rdf:Bag"
+            return f"   <{prop}>\n    <{container}>\n     <rdf:li>{value}</rdf:li>\n    </{container}>\n   </{prop}>\n"
+        case "alt":
+            return f"   <{prop}>\n    <rdf:Alt>\n     <rdf:li xml:lang=\"x-default\">{value}</rdf:li>\n    </rdf:Alt>\n   </{prop}>\n"
+        case _:
+            return f"   <{prop}>{value}</{prop}>\n"
+
+def build_sidecar(settings: dict, log: logging.Logger = None) -> str:
+    """
+    Return the text of an XMP sidecar holding the tags in settings (a
+    dict of exiftool-style "Group:Name" keys, as sent to exiftool -json).
+    Keys without a group are ignored, as are the tags _TAG_MAP says
+    have no place in a sidecar; any other tag we can't place is left out
+    with a warning (once for each tag). As with exiftool, if two keys
+    land on the same property, the later one wins.
+    """
+    log = log if log != None else logging.getLogger(__name__)
+    converters = {
+        "rational": _to_rational,
+        "apex": _to_apex,
+        "int": _to_int,
+        "date": _to_date,
+        }
+
+    properties = dict()
+    for key, value in settings.items():
+        if not ":" in key or value == None:
+            continue
+        targets = _targets(key)
+        if targets == None:
+            if not key in _unmapped_reported:
+                _unmapped_reported.add(key)
+                log.warning("no XMP property for tag %s; it isn't written to sidecars", key)
+            continue
+        for prop, kind in targets:
+            weak = kind.endswith("?")
+            kind = kind.removesuffix("?")
+            if weak and prop in properties:
+                continue
+            if type(value) == bool:
+                text = "True" if value else "False"
+            elif kind in converters:
+                text = converters[kind](value)
+                if text == None:
+                    continue
+            else:
+                text = str(value)
+            # the element kind for the converted ones is plain text
+            properties[prop] = (kind if kind in ("seq", "bag", "alt") else "text", text)
+
+    used = sorted({ prop.partition(":")[0] for prop in properties })
+    xmlns = "".join(f"\n    xmlns:{prefix}=\"{NAMESPACES[prefix]}\"" for prefix in used)
+
+    result = "<?xpacket begin=\"\ufeff\" id=\"W5M0MpCehiHzreSzNTczkc9d\"?>\n"
+    result += f"<x:xmpmeta xmlns:x=\"adobe:ns:meta/\" x:xmptk=\"annotate_film_scans v{_escape(__version__)}\">\n"
+    result += " <rdf:RDF xmlns:rdf=\"http://www.w3.org/1999/02/22-rdf-syntax-ns#\">\n"
+    result += f"  <rdf:Description rdf:about=\"\"{xmlns}>\n"
+    for prop, (kind, text) in properties.items():
+        result += _element(prop, kind, text)
+    result += "  </rdf:Description>\n"
+    result += " </rdf:RDF>\n"
+    result += "</x:xmpmeta>\n"
+    result += "<?xpacket end=\"w\"?>\n"
+    return result
+
+def write_sidecar(path: pathlib.Path, settings: dict, log: logging.Logger = None) -> None:
+    """ write an XMP sidecar for settings to path, which must not exist """
+    with open(path, "x", encoding="utf-8") as f:
+        f.write(build_sidecar(settings, log))
+
+###################
+# exiftool config #
+###################
+def exiftool_config() -> str:
+    """
+    The text of an exiftool config file defining CUSTOM_PROPERTIES.
+    It first loads the user's own config (which `-config` would
+    otherwise replace); then our definitions replace any of the same
+    namespaces there, so exiftool writes them as sidecars do.
+    """
+    result = f"# made by annotate_film_scans v{__version__}: the XMP namespaces it writes\n"
+    result += "{\n"
+    result += "    my $home = $ENV{EXIFTOOL_HOME} || $ENV{HOME} || (($ENV{HOMEDRIVE} || '') . ($ENV{HOMEPATH} || '')) || '.';\n"
+    result += "    my $config = \"$home/.ExifTool_config\";\n"
+    result += "    do $config if -f $config;\n"
+    result += "}\n"
+    for prefix, names in CUSTOM_PROPERTIES.items():
+        table = f"Image::ExifTool::UserDefined::annotate_film_scans_{prefix}"
+        result += f"%{table} = (\n"
+        result += f"    GROUPS => {{ 0 => 'XMP', 1 => 'XMP-{prefix}', 2 => 'Image' }},\n"
+        result += f"    NAMESPACE => {{ '{prefix}' => '{NAMESPACES[prefix]}' }},\n"
+        result += "    WRITABLE => 'string',\n"
+        result += "".join(f"    {name} => {{ }},\n" for name in names)
+        result += ");\n"
+        result += f"$Image::ExifTool::UserDefined{{'Image::ExifTool::XMP::Main'}}{{{prefix}}} = {{\n"
+        result += f"    SubDirectory => {{ TagTable => '{table}' }},\n"
+        result += "};\n"
+    result += "1;\n"
+    return result
+
+_config_lock = threading.Lock()
+_config_path = None
+
+def exiftool_config_path(directory: pathlib.Path, log: logging.Logger = None) -> pathlib.Path | None:
+    """
+    The path of a file in directory holding exiftool_config(), written
+    if need be; None if it can't be written.
+    """
+    global _config_path
+    log = log if log != None else logging.getLogger(__name__)
+    with _config_lock:
+        if _config_path == None:
+            text = exiftool_config()
+            path = pathlib.Path(directory) / f"exiftool-config-{hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()}.pl"
+            try:
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    atomic_write_text(path, text)
+            except OSError as e:
+                log.warning("can't write exiftool config %s: %s; the XMP-AnalogExif and XMP-AnnotateFilmScans tags may not be written", path, e)
+                return None
+            _config_path = path
+        return _config_path
@@ -0,0 +1,14 @@
+##############################################################################
+#
+# Name: __init__.py
+#
+# Function:
+#       Benchmarks for annotate_film_scans (not part of the package)
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
@@ -0,0 +1,104 @@
+##############################################################################
+#
+# Name: bench_catalog.py
+#
+# Function:
+#       Time finding a roll's scans in a large archive, with the scan
+#       catalog cold and warm, against walking the archive each time
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       Run from the top of the repository:
+#
+#           python -m benchmarks.bench_catalog [--rolls 2000] [--files 40] [--repeat 5]
+#
+#       The archive is lab/date/roll directories of empty image files.
+#       "walk" is os.walk() of the archive, listing every directory, as
+#       a run would have to without the catalog. "cold" starts with no
+#       catalog; "warm" loads the catalog the cold run saved, as the
+#       next run would. We report the best of --repeat runs.
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import timeit
+
+from annotate_film_scans.catalog import ScanCatalog, natural_key
+from annotate_film_scans.constants import Constants
+
+def make_archive(root: pathlib.Path, rolls: int, files: int) -> str:
+    """ make the archive; return the name of the last roll """
+    name = None
+    for iRoll in range(rolls):
+        name = f"{iRoll + 46000:08d}"
+        rolldir = root / f"lab{iRoll % 5}" / f"2023-{iRoll // 100 % 12 + 1:02d}-{iRoll % 28 + 1:02d}" / name
+        rolldir.mkdir(parents=True)
+        for iFile in range(files):
+            (rolldir / f"scan{iFile + 1}.jpg").touch()
+    return name
+
+def walk(root: pathlib.Path, name: str) -> list:
+    """ find the roll the way we would without the catalog: every directory named name, with images """
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if os.path.basename(dirpath) == name:
+            images = [ filename for filename in filenames if os.path.splitext(filename)[1].lower() in Constants.IMAGE_SUFFIXES ]
+            if len(images) != 0:
+                found.append([ pathlib.Path(dirpath) / filename for filename in sorted(images, key=natural_key) ])
+    return found
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_catalog",
+        description="Time finding a roll's scans in a large archive, with and without the scan catalog."
+        )
+    parser.add_argument("--rolls", type=int, default=2000, help="roll directories in the archive (default %(default)d)")
+    parser.add_argument("--files", type=int, default=40, help="scans in each roll (default %(default)d)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each case; the best is reported (default %(default)d)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="afs-bench-") as tmpdir:
+        root = pathlib.Path(tmpdir) / "archive"
+        name = make_archive(root, args.rolls, args.files)
+        catalog_path = pathlib.Path(tmpdir) / "catalog.json"
+
+        def cold():
+            catalog_path.unlink(missing_ok=True)
+            catalog = ScanCatalog(path=catalog_path).load()
+            found = catalog.find(name, [ root ])
+            catalog.save()
+            return found
+
+        def warm():
+            catalog = ScanCatalog(path=catalog_path).load()
+            found = catalog.find(name, [ root ])
+            catalog.save()
+            return found
+
+        expected = walk(root, name)[0]
+        cold()
+        found = warm()
+        if found != [ expected[0].parent ] or ScanCatalog(path=catalog_path).load().images(found[0]) != expected:
+            print(f"catalog found {found}, expected {expected[0].parent}", file=sys.stderr)
+            return 1
+
+        print(f"archive: {args.rolls} rolls of {args.files} scans")
+        print(f"{'case':<6} {'seconds':>9}")
+        for label, function in ( ("walk", lambda: walk(root, name)), ("cold", cold), ("warm", warm) ):
+            seconds = min(timeit.repeat(function, number=1, repeat=args.repeat))
+            print(f"{label:<6} {seconds:>9.4f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+##############################################################################
+#
+# Name: bench_fieldparsers.py
+#
+# Function:
+#       Compare the shot-info field parsers with the uncompiled,
+#       unmemoized parsing they replaced, on the values of a large
+#       synthetic shot-info file
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       Run from the top of the repository:
+#
+#           python -m benchmarks.bench_fieldparsers [--frames 50000] [--repeat 5]
+#
+#       The "before" column re-creates the old parsing: re.fullmatch()
+#       with the pattern strings from Constants, on every value. Each
+#       case is run --repeat times, with the caches cleared before each
+#       run, and we report the best.
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import csv
+from datetime import time
+import pathlib
+import re
+import sys
+import tempfile
+import timeit
+
+from annotate_film_scans import fieldparsers
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.shotinfo import ShotInfoFile
+
+from .synthetic import make_roll
+
+#### the parsing we replaced
+def _old_fnumber(value):
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return "not recorded"
+    result = re.fullmatch(Constants.re_fstop, value, flags=re.IGNORECASE)
+    if result == None:
+        raise ValueError(f"invalid f-stop: {value}")
+    return float(result.group(1))
+
+def _old_exposure(value):
+    if value == None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if value == "?":
+        return "not recorded"
+    if re.fullmatch(Constants.re_exposure, value, flags=re.IGNORECASE) == None:
+        raise ValueError(f"invalid exposure: {value}")
+    return value
+
+def _old_time(value):
+    timematch = re.fullmatch(Constants.re_time_withtz, value)
+    if timematch and timematch.group(4) and not timematch.group(8):
+        value = timematch.group(1) + "+" + timematch.group(6) + ":" + timematch.group(7)
+    return time.fromisoformat(value)
+
+def _old_comment_key(tag):
+    pattern = re.compile(r"(XMP-AnalogExif|Exif|XMP|ExifIFD|XMP-AnnotateFilmScans):(.*)", flags=re.IGNORECASE)
+    match = re.fullmatch(pattern, tag)
+    if match != None and match.group(2) != "UserComment":
+        return match.group(2)
+    return None
+
+def _clear_caches() -> None:
+    for parser in ( fieldparsers.parse_fnumber, fieldparsers.parse_exposure, fieldparsers.parse_time_minutes,
+                    fieldparsers.parse_temperature_c, fieldparsers.normalize_time, fieldparsers.parse_time,
+                    fieldparsers.comment_key ):
+        parser.cache_clear()
+
+def _read_columns(shot_info_file: pathlib.Path) -> dict:
+    """ the non-blank values of each column of the shot-info file """
+    with open(shot_info_file, newline="") as f:
+        lines = [ line for line in f if line.strip() != "--" and not ":" in line.split(",")[0] ]
+    reader = csv.DictReader(lines, skipinitialspace=True)
+    columns = dict()
+    for row in reader:
+        for name, value in row.items():
+            if value != None and not value.strip() in ("", "skip"):
+                columns.setdefault(name.strip().lower(), []).append(value)
+    return columns
+
+def _best(function, values: list, repeat: int) -> float:
+    def run():
+        _clear_caches()
+        for value in values:
+            function(value)
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_fieldparsers",
+        description="Compare the shot-info field parsers with the uncompiled, unmemoized parsing they replaced."
+        )
+    parser.add_argument("--frames", type=int, default=50000, help="frames in the synthetic roll (default %(default)d)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each case; the best is reported (default %(default)d)")
+    parser.add_argument("--keep", type=pathlib.Path, help="generate the roll here and keep it, rather than in a temporary directory")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="afs-bench-") as tmpdir:
+        root = args.keep if args.keep != None else pathlib.Path(tmpdir)
+        shot_info_file, scans = make_roll(root / f"roll-{args.frames}", args.frames, image_size=16)
+        columns = _read_columns(shot_info_file)
+
+        # the tags of every frame are scanned for the photo-information comment
+        settings = App.load_settings()
+        tags = sorted({ tag for entries in settings.values() for entry in entries.values() for tag in entry })
+        tag_names = tags * (len(scans) * 40 // max(1, len(tags)))
+
+        cases = (
+            ( "aperture",  columns.get("aperture", []), _old_fnumber,     fieldparsers.parse_fnumber ),
+            ( "exposure",  columns.get("exposure", []), _old_exposure,    fieldparsers.parse_exposure ),
+            ( "time",      columns.get("time", []),     _old_time,        fieldparsers.parse_time ),
+            ( "comment tags", tag_names,                _old_comment_key, fieldparsers.comment_key ),
+            )
+
+        print(f"{args.frames}-frame roll: {shot_info_file}")
+        print(f"{'field':<14} {'values':>8} {'distinct':>8} {'before':>9} {'after':>9} {'speedup':>8}")
+        for name, values, before, after in cases:
+            old = _best(before, values, args.repeat)
+            new = _best(after, values, args.repeat)
+            speedup = old / new if new > 0 else 0
+            print(f"{name:<14} {len(values):>8} {len(set(values)):>8} {old:>9.4f} {new:>9.4f} {speedup:>7.1f}x")
+
+        # and the whole shot-info pipeline, for scale.
+        app = App([ "-d", str(shot_info_file.parent), "-s", str(shot_info_file), "--" ] + [ str(path) for path in scans ])
+        def read_all():
+            _clear_caches()
+            for item in ShotInfoFile(app).frames_from_path(shot_info_file):
+                pass
+        seconds = min(timeit.repeat(read_all, number=1, repeat=args.repeat))
+        print(f"{'shot-info read':<14} {args.frames:>8} {'':>8} {'':>9} {seconds:>9.4f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+##############################################################################
+#
+# Name: bench_pipeline.py
+#
+# Function:
+#       Time each stage of annotate_film_scans on synthetic rolls
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       Run from the top of the repository:
+#
+#           python -m benchmarks.bench_pipeline [--frames 500,5000] [--jobs 8]
+#
+#       exiftool is replaced by the stand-in in benchmarks/bin, so this
+#       runs offline, and the exiftool numbers reflect its configured
+#       latency (--latency), not real exiftool.
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import functools
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from annotate_film_scans.app import App
+from annotate_film_scans.exiftool import ExifToolPool
+from annotate_film_scans.plan import Plan
+
+from .synthetic import make_roll
+
+BIN_DIR = pathlib.Path(__file__).resolve().parent / "bin"
+
+class Timings:
+    """ total seconds and calls, by stage name """
+    def __init__(self):
+        self.seconds = dict()
+        self.calls = dict()
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def wrap(self, name: str, function):
+        """ return function, timed as stage name """
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timed
+
+def _app(outdir: pathlib.Path, extra: list) -> App:
+    outdir.mkdir(parents=True, exist_ok=True)
+    return App([ "-d", str(outdir) ] + extra)
+
+def bench_plan(roll_dir: pathlib.Path, shot_info_file: pathlib.Path, scans: list, settings_timings: Timings) -> tuple:
+    """ plan the roll, timing the stages; return (timings, plan, plan path) """
+    timings = Timings()
+    timings.seconds.update(settings_timings.seconds)
+    timings.calls.update(settings_timings.calls)
+
+    planpath = roll_dir / "plan.json"
+    app = _app(roll_dir / "out-plan", [ "-s", str(shot_info_file), "--forward", "--" ] + [ str(path) for path in scans ])
+    app.exiftool = ExifToolPool(app.log)
+    app.content_index = None
+    try:
+        plan = timings.wrap("plan total", app.make_plan)()
+    finally:
+        app.exiftool.close()
+
+    # the shot-info file is streamed through the planner, so its stages
+    # interleave with the others; the app's own stats time each of them.
+    for name, stage in app.stats.to_json()["stages"].items():
+        timings.seconds[name] = stage["seconds"]
+        timings.calls[name] = stage["calls"]
+    timings.wrap("plan save", plan.save)(planpath)
+    return timings, plan, planpath
+
+def bench_write(roll_dir: pathlib.Path, plan: Plan, name: str, jobs: int, limit: int) -> tuple:
+    """ execute (the first limit frames of) plan with jobs; return (seconds, frames) """
+    outdir = roll_dir / f"out-{name}"
+    outdir.mkdir(parents=True, exist_ok=True)
+    subset = Plan(outdir, plan.output_mode, plan.frames[:limit])
+    for frame in subset.frames:
+        frame.output = outdir / frame.output.name
+    planpath = roll_dir / f"plan-{name}.json"
+    subset.save(planpath)
+
+    app = App([ "--execute-plan", str(planpath), "-j", str(jobs) ])
+    start = time.perf_counter()
+    app.run()
+    return time.perf_counter() - start, len(subset.frames)
+
+def _print_report(frames: int, timings: Timings, writes: list) -> None:
+    print(f"\n== {frames} frames ==")
+    print(f"{'stage':<28} {'calls':>6} {'seconds':>9}")
+    for name, seconds in timings.seconds.items():
+        print(f"{name:<28} {timings.calls[name]:>6} {seconds:>9.4f}")
+    plan_rate = frames / timings.seconds["plan total"] if timings.seconds["plan total"] > 0 else 0
+    print(f"{'planning':<28} {'':>6} {plan_rate:>9.1f} frames/s")
+    for name, jobs, seconds, count in writes:
+        print(f"{'write ' + name + f' (-j {jobs})':<28} {count:>6} {seconds:>9.4f}  {count / seconds:>9.1f} frames/s")
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_pipeline",
+        description="Time the stages of annotate_film_scans on synthetic rolls, using a stand-in for exiftool."
+        )
+    parser.add_argument("--frames", default="500,5000", help="comma-separated roll sizes, in frames (default %(default)s)")
+    parser.add_argument("--write-limit", type=int, default=200, help="frames to write in the write stages (default %(default)d)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="jobs for the pooled write (default %(default)d)")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in exiftool seconds per command (default %(default)s)")
+    parser.add_argument("--startup", type=float, default=0.2, help="stand-in exiftool seconds to start (default %(default)s)")
+    parser.add_argument("--image-size", type=int, default=4096, help="bytes per synthetic scan (default %(default)d)")
+    parser.add_argument("--keep", type=pathlib.Path, help="generate the rolls here and keep them, rather than in a temporary directory")
+    args = parser.parse_args(argv)
+
+    os.environ["PATH"] = str(BIN_DIR) + os.pathsep + os.environ.get("PATH", "")
+    os.environ["FAKE_EXIFTOOL_LATENCY"] = str(args.latency)
+    os.environ["FAKE_EXIFTOOL_STARTUP"] = str(args.startup)
+
+    settings_timings = Timings()
+    settings_timings.wrap("settings load", App.load_settings)()
+
+    print(f"exiftool stand-in: {args.latency}s per command, {args.startup}s startup; pooled writes use -j {args.jobs}")
+    with tempfile.TemporaryDirectory(prefix="afs-bench-") as tmpdir:
+        root = args.keep if args.keep != None else pathlib.Path(tmpdir)
+        for frames in [ int(text) for text in args.frames.split(",") ]:
+            roll_dir = root / f"roll-{frames}"
+            start = time.perf_counter()
+            shot_info_file, scans = make_roll(roll_dir, frames, image_size=args.image_size)
+            print(f"generated {frames}-frame roll ({len(scans)} scans) in {time.perf_counter() - start:.2f}s: {roll_dir}")
+
+            timings, plan, planpath = bench_plan(roll_dir, shot_info_file, scans, settings_timings)
+            writes = []
+            for name, jobs in (("serial", 1), ("pooled", args.jobs)):
+                seconds, count = bench_write(roll_dir, plan, name, jobs, args.write_limit)
+                writes.append((name, jobs, seconds, count))
+            _print_report(frames, timings, writes)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
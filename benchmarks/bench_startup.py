@@ -0,0 +1,115 @@
+##############################################################################
+#
+# Name: bench_startup.py
+#
+# Function:
+#       Time annotate_film_scans startup, for the invocations scripts
+#       make thousands of times
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+# Notes:
+#       Run from the top of the repository:
+#
+#           python -m benchmarks.bench_startup [--runs 20] [--json FILE] [--imports]
+#
+#       Each case is run in a fresh interpreter; we report the median
+#       wall time. Byte-code caching is turned on for the runs (even if
+#       PYTHONDONTWRITEBYTECODE is set), and each case is run once
+#       first, untimed, so we measure a warm start.
+#
+##############################################################################
+
+#### imports ####
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .synthetic import make_roll
+
+BIN_DIR = pathlib.Path(__file__).resolve().parent / "bin"
+
+def _time_runs(argv: list, env: dict, runs: int) -> tuple:
+    """ run argv runs times (after one untimed run); return (median, min) seconds, and last status """
+    subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = []
+    status = None
+    for i in range(runs):
+        start = time.perf_counter()
+        status = subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times), status
+
+def _print_imports(env: dict, count: int) -> None:
+    """ show the slowest imports (cumulative) for --help """
+    result = subprocess.run(
+        [ sys.executable, "-X", "importtime", "-m", "annotate_film_scans", "--help" ],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+    rows = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            rows.append((int(fields[1]), fields[2].rstrip()))
+    rows.sort(reverse=True)
+    print(f"\nslowest imports for --help (cumulative):")
+    for usec, name in rows[:count]:
+        print(f"  {usec / 1000:8.2f} ms {name}")
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_startup",
+        description="Time annotate_film_scans startup for trivial and small invocations."
+        )
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per case (default %(default)d)")
+    parser.add_argument("--json", type=pathlib.Path, help="also write the results to this file, as JSON")
+    parser.add_argument("--imports", action="store_true", help="also list the slowest imports")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PATH"] = str(BIN_DIR) + os.pathsep + env.get("PATH", "")
+    env["FAKE_EXIFTOOL_LATENCY"] = "0"
+    env["FAKE_EXIFTOOL_STARTUP"] = "0"
+
+    python = [ sys.executable ]
+    tool = python + [ "-m", "annotate_film_scans" ]
+    results = dict()
+    with tempfile.TemporaryDirectory(prefix="afs-startup-") as tmpdir:
+        roll_dir = pathlib.Path(tmpdir)
+        shot_info_file, scans = make_roll(roll_dir, 36)
+        (roll_dir / "out").mkdir()
+
+        cases = {
+            "python (baseline)":    python + [ "-c", "pass" ],
+            "--version":            tool + [ "--version" ],
+            "--help":               tool + [ "--help" ],
+            "argument error":       tool + [ "-d", str(roll_dir / "out") ],
+            "dry run, 36 frames":   tool + [ "-d", str(roll_dir / "out"), "-s", str(shot_info_file), "-n", "--" ] + [ str(path) for path in scans ],
+            }
+
+        width = max(len(name) for name in cases)
+        print(f"{'case':<{width}}  {'median ms':>9}  {'min ms':>7}  status")
+        for name, case in cases.items():
+            median, fastest, status = _time_runs(case, env, args.runs)
+            results[name] = { "median_ms": 1000 * median, "min_ms": 1000 * fastest, "status": status }
+            print(f"{name:<{width}}  {1000 * median:>9.1f}  {1000 * fastest:>7.1f}  {status}")
+
+    if args.imports:
+        _print_imports(env, 15)
+    if args.json != None:
+        args.json.write_text(json.dumps({ "python": sys.version, "runs": args.runs, "cases": results }, indent=2) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
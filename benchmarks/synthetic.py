@@ -0,0 +1,114 @@
+##############################################################################
+#
+# Name: synthetic.py
+#
+# Function:
+#       Generate synthetic rolls (a shot-info file and scans) for benchmarks
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from datetime import datetime, timedelta, timezone
+import pathlib
+import random
+
+# names that must be in the packaged settings.json
+CAMERA = "Autocord"
+FILMS = ( "Portra 800", "Tri-X 400", "Delta 100" )
+LAB = "The Darkroom"
+PROCESSES = { "Portra 800": "C-41", "Tri-X 400": "B&W", "Delta 100": "B&W" }
+EXPOSURES = ( "1/30", "1/60", "1/125", "1/250", "1/500" )
+APERTURES = ( "f/2.8", "f/4", "f/5.6", "f/8", "f/11", "f/16" )
+FILTERS = ( "-", "UV", "Proxar 2" )
+TIMEZONES = ( -4, -5, 0, 1, 9 )
+
+# a minimal JPEG: SOI, a comment segment to pad it out, and EOI.
+def _jpeg_bytes(size: int) -> bytes:
+    padding = max(0, size - 8)
+    chunks = []
+    while padding > 0:
+        n = min(padding, 65533)
+        chunks.append(b"\xff\xfe" + (n + 2).to_bytes(2, "big") + bytes(n))
+        padding -= n + 4
+    return b"\xff\xd8" + b"".join(chunks) + b"\xff\xd9"
+
+def make_roll(directory: pathlib.Path, frames: int, image_size: int = 4096, seed: int = 1) -> tuple:
+    """
+    Write a shot-info file, `shots-bench.csv`, and one scan per exposed
+    frame (`scan00001.jpg`...) to directory, and return (csv path, list of
+    scan paths). The roll has `frames` frames in all, and exercises the
+    things that make shot-info processing slow: frame ranges, skipped
+    frames, settings that change part-way, and times with and without
+    dates and in several timezones.
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    header = "Frame, Frame2, Exposure, Aperture, Filter, Date, Time, Camera, Lens, Film, Lab, Process, Comment"
+    lines = [ "--", "Forward: true", "--", header ]
+
+    when = datetime(2023, 6, 2, 10, 0, 0, tzinfo=timezone(timedelta(hours=-4)))
+    frame = 1
+    exposed = 0
+    film = FILMS[0]
+    first = True
+    while frame <= frames:
+        remaining = frames - frame + 1
+        kind = rng.random()
+
+        if not first and kind < 0.05:
+            # a skipped frame
+            lines.append(f"{frame}, , skip")
+            frame += 1
+            continue
+
+        count = 1
+        if kind > 0.8 and remaining > 1:
+            # a range of frames with the same settings
+            count = rng.randint(2, min(12, remaining))
+        frame2 = str(frame + count - 1) if count > 1 else ""
+
+        date = ""
+        time = ""
+        fields = [ "", "", "", "", "" ]
+        if first or rng.random() < 0.1:
+            # a new day, perhaps somewhere else
+            when = when.replace(hour=9) + timedelta(days=1)
+            when = when.replace(tzinfo=timezone(timedelta(hours=rng.choice(TIMEZONES))))
+            date = when.date().isoformat()
+            time = when.timetz().isoformat()
+        elif rng.random() < 0.3:
+            # later the same day, time only
+            when += timedelta(minutes=rng.randint(1, 90))
+            time = when.time().isoformat()
+        if first or rng.random() < 0.02:
+            film = rng.choice(FILMS)
+            fields = [ CAMERA, "", film, LAB, PROCESSES[film] ]
+
+        comment = f"frame {frame} notes" if rng.random() < 0.1 else ""
+        lines.append(", ".join([
+            str(frame), frame2,
+            rng.choice(EXPOSURES), rng.choice(APERTURES), rng.choice(FILTERS),
+            date, time ] + fields + [ comment ]
+            ))
+        first = False
+        frame += count
+        exposed += count
+
+    shot_info_file = directory / "shots-bench.csv"
+    shot_info_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    image = _jpeg_bytes(image_size)
+    scans = []
+    for i in range(1, exposed + 1):
+        path = directory / f"scan{i:05d}.jpg"
+        path.write_bytes(image)
+        scans.append(path)
+    return shot_info_file, scans
@@ -0,0 +1,68 @@
+##############################################################################
+#
+# Name: conftest.py
+#
+# Function:
+#       pytest fixtures shared by the tests: an isolated environment, with
+#       the benchmark stand-in for exiftool, and synthetic rolls
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import os
+import pathlib
+
+import pytest
+
+from annotate_film_scans.constants import Constants
+from benchmarks.synthetic import make_roll
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+
+#
+# Every test runs with its own cache and config directories (so the
+# user's settings, catalogs and indexes are neither used nor changed),
+# and with the stand-in exiftool from the benchmarks, which answers at
+# once.
+#
+@pytest.fixture(autouse=True)
+def environment(tmp_path_factory, monkeypatch):
+    home = tmp_path_factory.mktemp("home")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(home / "cache"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(home / "config"))
+    monkeypatch.delenv(Constants.SETTINGS_ENV, raising=False)
+    monkeypatch.delenv(Constants.SCAN_ROOTS_ENV, raising=False)
+    monkeypatch.setenv("PATH", str(REPO / "benchmarks" / "bin") + os.pathsep + os.environ.get("PATH", ""))
+    monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "0")
+    monkeypatch.setenv("FAKE_EXIFTOOL_STARTUP", "0")
+    return home
+
+@pytest.fixture
+def roll(tmp_path) -> tuple:
+    """ a small synthetic roll: (shot-info file, scans) """
+    return make_roll(tmp_path / "roll", 12, image_size=64)
+
+#
+# A function that writes a shot-info file, and returns a ShotInfoFile to
+# read it with (and its path). The ShotInfoFile checks the frames
+# against `files` input files, if given.
+#
+@pytest.fixture
+def shot_info(tmp_path):
+    from annotate_film_scans.app import App
+    from annotate_film_scans.shotinfo import ShotInfoFile
+
+    def make(text: str, files: int | None = None, argv: list = ()) -> tuple:
+        path = tmp_path / "shots-test.csv"
+        path.write_text(text, encoding="utf-8")
+        app = App([ "-s", str(path) ] + list(argv), check_only=True)
+        result = ShotInfoFile(app)
+        result.file_count = files
+        return result, path
+    return make
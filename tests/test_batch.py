@@ -0,0 +1,95 @@
+##############################################################################
+#
+# Name: test_batch.py
+#
+# Function:
+#       Tests for the batch subcommand
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+
+import pytest
+
+from annotate_film_scans.batch import BatchApp
+from annotate_film_scans.constants import Constants
+from benchmarks.synthetic import make_roll
+
+def _outputs(directory) -> list:
+    return sorted(path.name for path in directory.iterdir() if not path.name.startswith("."))
+
+def _summary(out: str) -> dict:
+    """ the summary table, as { roll: (frames, written, current, status) } """
+    result = dict()
+    for line in out.splitlines()[1:-1]:
+        name, frames, written, current, _, status = line.split(maxsplit=5)
+        result[name] = (int(frames), int(written), int(current), status)
+    return result
+
+def test_tree(tmp_path, capsys):
+    make_roll(tmp_path / "2023" / "roll-a", 6, image_size=64)
+    make_roll(tmp_path / "2023" / "roll-b", 8, image_size=64, seed=2)
+
+    batch = BatchApp([ str(tmp_path) ])
+    rolls = batch.find_rolls()
+    assert [ roll.name for roll in rolls ] == [ "2023/roll-a", "2023/roll-b" ]
+    assert [ path.name for path in rolls[0].input_files ] == [ f"scan{i:05d}.jpg" for i in range(1, len(rolls[0].input_files) + 1) ]
+    assert batch.run() == 0
+    for roll in rolls:
+        assert roll.dir == roll.shot_info_file.parent / Constants.BATCH_OUTPUT_DIR
+        assert len(_outputs(roll.dir)) == len(roll.input_files)
+    assert _summary(capsys.readouterr().out) == { roll.name: (len(roll.input_files), len(roll.input_files), 0, "ok") for roll in rolls }
+
+    # the outputs aren't rolls; and everything is up to date.
+    batch = BatchApp([ str(tmp_path) ])
+    assert len(batch.find_rolls()) == 2
+    assert batch.run() == 0
+    assert _summary(capsys.readouterr().out) == { roll.name: (len(roll.input_files), 0, len(roll.input_files), "ok") for roll in rolls }
+
+def test_a_bad_roll_doesnt_stop_the_others(tmp_path, capsys):
+    make_roll(tmp_path / "good", 6, image_size=64)
+    make_roll(tmp_path / "bad", 6, image_size=64)
+    (tmp_path / "bad" / "shots-other.csv").write_text((tmp_path / "bad" / "shots-bench.csv").read_text())
+
+    batch = BatchApp([ str(tmp_path), "--dir", str(tmp_path / "out") ])
+    assert batch.run() == 1
+    assert len(_outputs(tmp_path / "out" / "good")) != 0
+    assert not (tmp_path / "out" / "bad").exists()
+    out = capsys.readouterr().out
+    assert "more than one shot-info file" in out
+    assert "2 rolls, 1 failed" in out
+
+def test_manifest(tmp_path):
+    _, scans = make_roll(tmp_path / "roll", 8, image_size=64)
+    manifest = tmp_path / "rolls.json"
+    manifest.write_text(json.dumps([
+        { "shot_info_file": "roll/shots-bench.csv", "input_files": [ "roll/scan0000[1-4].jpg", "roll/scan0000[5-9].jpg" ], "dir": "out-all", "options": [ "--in-place" ] },
+        { "shot_info_file": "roll/shots-bench.csv", "dir": "out-default" },
+        ]))
+
+    batch = BatchApp([ str(manifest) ])
+    rolls = batch.find_rolls()
+    assert rolls[0].input_files == scans
+    assert rolls[1].input_files == scans
+    assert rolls[0].options == [ "--in-place" ]
+    assert rolls[1].options == []
+    assert batch.run() == 0
+    assert _outputs(tmp_path / "out-all") == _outputs(tmp_path / "out-default")
+    assert json.loads((tmp_path / "out-all" / Constants.MANIFEST_NAME).read_text())["frames"].popitem()[1]["mode"] == "inplace"
+    assert json.loads((tmp_path / "out-default" / Constants.MANIFEST_NAME).read_text())["frames"].popitem()[1]["mode"] == "rewrite"
+
+def test_roll_options_are_not_shared(tmp_path):
+    first = BatchApp.Roll("a", tmp_path / "shots-a.csv", [], tmp_path)
+    first.options.append("--force")
+    assert BatchApp.Roll("b", tmp_path / "shots-b.csv", [], tmp_path).options == []
+
+def test_bad_source(tmp_path):
+    with pytest.raises(BatchApp.Error):
+        BatchApp([ str(tmp_path / "missing") ]).find_rolls()
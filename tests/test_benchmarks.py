@@ -0,0 +1,63 @@
+##############################################################################
+#
+# Name: test_benchmarks.py
+#
+# Function:
+#       Tests for the benchmark suite: the synthetic rolls, the stand-in
+#       for exiftool, and a small pipeline benchmark
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import subprocess
+
+from annotate_film_scans.app import App
+from annotate_film_scans.plan import Plan
+from benchmarks import bench_pipeline
+from benchmarks.synthetic import make_roll
+
+def test_make_roll_is_repeatable(tmp_path):
+    first, first_scans = make_roll(tmp_path / "a", 40, image_size=100)
+    second, second_scans = make_roll(tmp_path / "b", 40, image_size=100)
+    other, _ = make_roll(tmp_path / "c", 40, image_size=100, seed=2)
+
+    assert first.read_text() == second.read_text()
+    assert first.read_text() != other.read_text()
+    assert [ path.name for path in first_scans ] == [ path.name for path in second_scans ]
+    image = first_scans[0].read_bytes()
+    assert (image[:2], image[-2:], len(image)) == (b"\xff\xd8", b"\xff\xd9", 100)
+
+def test_make_roll_is_a_valid_roll(tmp_path):
+    shot_info_file, scans = make_roll(tmp_path / "roll", 200, image_size=16)
+    planpath = tmp_path / "plan.json"
+    assert App([ "--dry-run", "--plan", str(planpath), "-d", str(tmp_path), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ]).run() == 0
+    assert [ frame.input for frame in Plan.load(planpath).frames ] == scans
+
+def test_stand_in(roll, tmp_path):
+    _, scans = roll
+    result = subprocess.run([ "exiftool", "-json", "-s", "-make", "-model", str(scans[0]), str(scans[1]) ], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert [ entry["SourceFile"] for entry in json.loads(result.stdout) ] == [ str(scans[0]), str(scans[1]) ]
+
+    output = tmp_path / "out.jpg"
+    command = [ "exiftool", "-json=-", "-o", str(output), str(scans[0]) ]
+    assert subprocess.run(command, input="[{}]", capture_output=True, text=True).returncode == 0
+    assert output.read_bytes() == scans[0].read_bytes()
+    # like exiftool, it won't replace an output
+    result = subprocess.run(command, input="[{}]", capture_output=True, text=True)
+    assert result.returncode == 1 and "already exists" in result.stderr
+
+def test_pipeline_benchmark(tmp_path, capsys):
+    assert bench_pipeline.main([ "--frames", "30", "--write-limit", "8", "-j", "2", "--latency", "0", "--startup", "0", "--image-size", "64", "--keep", str(tmp_path) ]) == 0
+    out = capsys.readouterr().out
+    assert "== 30 frames ==" in out
+    assert "write serial (-j 1)" in out and "write pooled (-j 2)" in out
+    for name in ("serial", "pooled"):
+        assert len([ path for path in (tmp_path / "roll-30" / f"out-{name}").iterdir() if not path.name.startswith(".") ]) == 8
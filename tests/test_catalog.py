@@ -0,0 +1,149 @@
+##############################################################################
+#
+# Name: test_catalog.py
+#
+# Function:
+#       Tests for the scan catalog, and finding a roll's input files
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import os
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.catalog import ScanCatalog, natural_key
+from annotate_film_scans.constants import Constants
+from benchmarks.synthetic import make_roll
+
+def test_natural_key():
+    names = [ "scan10.jpg", "Scan2.jpg", "scan1.jpg", "scan01a.jpg", "a.jpg", "scan1.tif", "scan" ]
+    assert sorted(names, key=natural_key) == [ "a.jpg", "scan", "scan1.jpg", "scan1.tif", "scan01a.jpg", "Scan2.jpg", "scan10.jpg" ]
+    assert natural_key("IMG_0010.JPG") == [ "img_", 10, ".jpg" ]
+    assert natural_key("") == [ "" ]
+
+def _touch(directory, *names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_bytes(b"")
+
+def test_images(tmp_path):
+    _touch(tmp_path, "scan10.jpg", "scan9.JPG", "scan1.tif", ".scan3.jpg", "notes.txt", "shots-roll.csv")
+    (tmp_path / "sub").mkdir()
+    catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+    assert [ path.name for path in catalog.images(tmp_path) ] == [ "scan1.tif", "scan9.JPG", "scan10.jpg" ]
+    assert catalog.images(tmp_path / "missing") == []
+
+    # not our own outputs
+    _touch(tmp_path / "out", "001-scan1.jpg", Constants.MANIFEST_NAME)
+    assert catalog.images(tmp_path / "out") == []
+
+def test_directories_are_read_when_they_change(tmp_path, monkeypatch):
+    _touch(tmp_path / "roll", "scan1.jpg", "scan2.jpg")
+    catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+    catalog.images(tmp_path / "roll")
+    catalog.save()
+
+    def scandir(path):
+        raise AssertionError(f"read {path}")
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "scandir", scandir)
+        catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+        assert [ path.name for path in catalog.images(tmp_path / "roll") ] == [ "scan1.jpg", "scan2.jpg" ]
+        assert not catalog.dirty
+
+    _touch(tmp_path / "roll", "scan3.jpg")
+    os.utime(tmp_path / "roll", ns=(0, 0))
+    assert [ path.name for path in catalog.images(tmp_path / "roll") ] == [ "scan1.jpg", "scan2.jpg", "scan3.jpg" ]
+
+def test_find(tmp_path):
+    _touch(tmp_path / "a" / "2023" / "roll-7", "scan1.jpg")
+    _touch(tmp_path / "a" / "2024" / "roll-7")
+    _touch(tmp_path / "a" / "2024" / "roll-7" / "roll-7", "scan1.jpg")
+    _touch(tmp_path / "a" / "roll-7" / "out", "scan1.jpg", Constants.MANIFEST_NAME)
+    _touch(tmp_path / "b" / "roll-7", "scan1.jpg")
+    _touch(tmp_path / "b" / ".hidden" / "roll-7", "scan1.jpg")
+
+    catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+    assert catalog.find("roll-7", [ tmp_path / "a", tmp_path / "b" ]) == [
+        tmp_path / "a" / "2023" / "roll-7",
+        tmp_path / "a" / "2024" / "roll-7" / "roll-7",
+        tmp_path / "b" / "roll-7",
+        ]
+    assert catalog.find("roll-8", [ tmp_path / "a", tmp_path / "missing" ]) == []
+
+def test_forward(tmp_path):
+    catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+    assert catalog.get_forward(tmp_path) == None
+    catalog.set_forward(tmp_path, False)
+    catalog.save()
+    assert ScanCatalog(path=tmp_path / "catalog.json").load().get_forward(tmp_path) == False
+
+def test_unreadable_catalog_is_ignored(tmp_path):
+    (tmp_path / "catalog.json").write_text("{ not json")
+    _touch(tmp_path / "roll", "scan1.jpg")
+    catalog = ScanCatalog(path=tmp_path / "catalog.json").load()
+    assert catalog.dirs == {}
+    assert len(catalog.images(tmp_path / "roll")) == 1
+    catalog.save()
+    assert ScanCatalog(path=tmp_path / "catalog.json").load().dirs != {}
+
+#
+# Finding the input files of a roll whose shot-info file is in one
+# place, and its scans in another.
+#
+@pytest.fixture
+def archive(tmp_path):
+    shot_info_file, scans = make_roll(tmp_path / "scans" / "2023" / "roll-42", 8, image_size=16)
+    (tmp_path / "notes" / "roll-42").mkdir(parents=True)
+    (tmp_path / "out").mkdir()
+    return shot_info_file.rename(tmp_path / "notes" / "roll-42" / shot_info_file.name), scans
+
+def _app(tmp_path, shot_info_file, *extra) -> App:
+    return App([ "-d", str(tmp_path / "out"), "-s", str(shot_info_file) ] + list(extra))
+
+def test_scans_next_to_the_shot_info_file(roll, tmp_path):
+    shot_info_file, scans = roll
+    (tmp_path / "out").mkdir()
+    assert _app(tmp_path, shot_info_file).args.input_files == scans
+
+def test_scan_roots(archive, tmp_path, monkeypatch):
+    shot_info_file, scans = archive
+    with pytest.raises(App.Error, match="no images found next to the shot-info file$"):
+        _app(tmp_path, shot_info_file)
+
+    assert _app(tmp_path, shot_info_file, "--scan-root", str(tmp_path / "scans")).args.input_files == scans
+    monkeypatch.setenv(Constants.SCAN_ROOTS_ENV, os.pathsep.join([ str(tmp_path / "missing"), str(tmp_path / "scans") ]))
+    app = _app(tmp_path, shot_info_file)
+    assert app.args.input_files == scans
+    assert app.run() == 0
+    assert app.counts["written"] == len(scans)
+
+def test_roll_name(archive, tmp_path):
+    shot_info_file, scans = archive
+    other = shot_info_file.rename(tmp_path / "notes" / shot_info_file.name)
+    roots = [ "--scan-root", str(tmp_path / "scans") ]
+    with pytest.raises(App.Error, match="or under the scan roots"):
+        _app(tmp_path, other, *roots)
+    assert _app(tmp_path, other, "--roll", "roll-42", *roots).args.input_files == scans
+
+    # a roll name found twice is a mistake
+    _touch(tmp_path / "scans" / "2024" / "roll-42", "scan00001.jpg")
+    with pytest.raises(App.Error, match="more than one directory of scans for roll roll-42"):
+        _app(tmp_path, other, "--roll", "roll-42", *roots)
+
+def test_order_is_remembered(archive, tmp_path):
+    shot_info_file, scans = archive
+    roots = [ "--scan-root", str(tmp_path / "scans") ]
+    assert _app(tmp_path, shot_info_file, *roots).args.forward == None
+    assert _app(tmp_path, shot_info_file, "--forward", *roots).args.forward == True
+    assert _app(tmp_path, shot_info_file, *roots).args.forward == True
+    assert _app(tmp_path, shot_info_file, "--reverse", *roots).args.forward == False
+    assert _app(tmp_path, shot_info_file, *roots).args.forward == False
@@ -0,0 +1,194 @@
+##############################################################################
+#
+# Name: test_contenthash.py
+#
+# Function:
+#       Tests for the content index, --find-duplicates and
+#       --link-duplicates
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.contenthash import ContentIndex
+
+def _write(path, contents: bytes):
+    path.write_bytes(contents)
+    return path
+
+def _blake2b(contents: bytes) -> str:
+    return hashlib.blake2b(contents, digest_size=32).hexdigest()
+
+def test_digests(tmp_path, monkeypatch):
+    monkeypatch.setattr(ContentIndex, "CHUNK_SIZE", 7)
+    paths = [ _write(tmp_path / f"scan{i}.jpg", bytes(range(i * 10))) for i in range(5) ]
+    with ContentIndex(path=tmp_path / "index") as index:
+        futures = index.digests(paths)
+        assert [ future.result() for future in futures ] == [ _blake2b(path.read_bytes()) for path in paths ]
+        assert index.digest(paths[2]) == _blake2b(paths[2].read_bytes())
+        assert index.digests(paths[:1])[0] is futures[0]
+
+def test_unchanged_files_arent_read_again(tmp_path):
+    path = _write(tmp_path / "scan.jpg", b"before")
+    with ContentIndex(path=tmp_path / "index") as index:
+        before = index.digest(path)
+
+    # same size and mtime: taken to be the same file
+    stat = path.stat()
+    _write(path, b"after!")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.digest(path) == before
+
+    os.utime(path, ns=(0, 0))
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.digest(path) == _blake2b(b"after!")
+
+def test_only_changed_shards_are_written(tmp_path):
+    paths = [ _write(tmp_path / f"scan{i}.jpg", b"%d" % i) for i in range(40) ]
+    with ContentIndex(path=tmp_path / "index") as index:
+        for path in paths:
+            index.digest(path)
+        shards = { index._file_shard(index._key(path)) for path in paths }
+    assert { path.stem for path in (tmp_path / "index").iterdir() } == shards
+
+    mtimes = { path: path.stat().st_mtime_ns for path in (tmp_path / "index").iterdir() }
+    for path in mtimes:
+        os.utime(path, ns=(0, 0))
+    with ContentIndex(path=tmp_path / "index") as index:
+        index.digest(paths[0])
+        index.digest(paths[1])
+    written = { path.stem for path in (tmp_path / "index").iterdir() if path.stat().st_mtime_ns != 0 }
+    assert written == { index._file_shard(index._key(path)) for path in paths[:2] }
+
+#
+# With one shard, the entries of files that are gone are dropped, and
+# then the least recently used beyond the limit.
+#
+def test_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(ContentIndex, "SHARD_DIGITS", 0)
+    monkeypatch.setattr(ContentIndex, "SHARD_FILES_MAX", 3)
+    a, b, c, d, e = [ _write(tmp_path / f"{name}.jpg", name.encode()) for name in "abcde" ]
+    with ContentIndex(path=tmp_path / "index") as index:
+        for path in (a, b, c, e):
+            index.digest(path)
+    e.unlink()
+
+    with ContentIndex(path=tmp_path / "index") as index:
+        index.digest(a)
+        index.digest(d)
+    files = json.loads((tmp_path / "index" / ".json").read_text())["files"]
+    assert list(files) == [ str(c), str(a), str(d) ]
+
+def test_concurrent_runs_merge(tmp_path):
+    a = _write(tmp_path / "a.jpg", b"a")
+    b = _write(tmp_path / "b.jpg", b"b")
+    one = ContentIndex(path=tmp_path / "index")
+    two = ContentIndex(path=tmp_path / "index")
+    one.digest(a)
+    two.digest(b)
+    one.close()
+    two.close()
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.seen({ _blake2b(b"a"), _blake2b(b"b"), _blake2b(b"c") }) == { _blake2b(b"a"): [ str(a) ], _blake2b(b"b"): [ str(b) ] }
+
+def test_unreadable_shard_is_ignored(tmp_path):
+    path = _write(tmp_path / "scan.jpg", b"scan")
+    (tmp_path / "index").mkdir()
+    with ContentIndex(path=tmp_path / "index") as index:
+        (tmp_path / "index" / f"{index._file_shard(index._key(path))}.json").write_text("{ not json")
+        assert index.digest(path) == _blake2b(b"scan")
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.seen({ _blake2b(b"scan") }) == { _blake2b(b"scan"): [ str(path) ] }
+
+def test_outputs(tmp_path):
+    output = _write(tmp_path / "001-scan.jpg", b"output")
+    key = ContentIndex.output_key(_blake2b(b"scan"), "rewrite", { "XMP:Lens": "Xenar" })
+    assert key != ContentIndex.output_key(_blake2b(b"scan"), "inplace", { "XMP:Lens": "Xenar" })
+    assert key != ContentIndex.output_key(_blake2b(b"scan"), "rewrite", { "XMP:Lens": "Tessar" })
+
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.find_output(key) == None
+        index.add_output(key, output)
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.find_output(key) == output
+
+    # a changed output is forgotten
+    _write(output, b"changed output")
+    with ContentIndex(path=tmp_path / "index") as index:
+        assert index.find_output(key) == None
+    shard = json.loads((tmp_path / "index" / f"{key[:ContentIndex.SHARD_DIGITS]}.json").read_text())
+    assert shard["outputs"] == {}
+
+#
+# The synthetic roll's scans are all the same image; make each one
+# different.
+#
+@pytest.fixture
+def distinct_roll(roll):
+    _, scans = roll
+    for i, scan in enumerate(scans):
+        scan.write_bytes(scan.read_bytes() + b"%d" % i)
+    return roll
+
+def _run(roll, outdir, *extra) -> App:
+    shot_info_file, scans = roll
+    outdir.mkdir()
+    app = App([ "-d", str(outdir), "-s", str(shot_info_file) ] + list(extra) + [ "--" ] + [ str(scan) for scan in scans ])
+    assert app.run() == 0
+    return app
+
+def test_find_duplicates(distinct_roll, tmp_path, caplog):
+    shot_info_file, scans = distinct_roll
+    with caplog.at_level(logging.WARNING):
+        _run(distinct_roll, tmp_path / "out1", "--find-duplicates")
+    assert caplog.records == []
+    copy = tmp_path / "copy"
+    shutil.copytree(shot_info_file.parent, copy, ignore=shutil.ignore_patterns("out*"))
+    with caplog.at_level(logging.WARNING):
+        _run((copy / shot_info_file.name, [ copy / scan.name for scan in scans ]), tmp_path / "out2", "--find-duplicates")
+    warnings = [ record.getMessage() for record in caplog.records if record.levelno == logging.WARNING ]
+    assert warnings[0] == f"input {copy / scans[0].name} is identical to {scans[0]}"
+    assert warnings[-1] == f"... and {len(scans) - Constants.DUPLICATES_REPORTED} more input files identical to files seen before"
+
+#
+# Identical scans in one roll are reported as they're read.
+#
+def test_duplicates_in_a_roll(roll, tmp_path, caplog):
+    shot_info_file, scans = roll
+    with caplog.at_level(logging.WARNING):
+        _run(roll, tmp_path / "out", "--find-duplicates")
+    warnings = [ record.getMessage() for record in caplog.records if record.levelno == logging.WARNING ]
+    assert warnings[0] == "frame 2: file 2 is identical to file 1, used for frame 1"
+    assert len([ warning for warning in warnings if warning.startswith("frame ") ]) == len(scans) - 1
+
+def test_link_duplicates(distinct_roll, tmp_path):
+    roll = distinct_roll
+    _, scans = roll
+    app = _run(roll, tmp_path / "out1", "--link-duplicates")
+    assert app.counts["written"] == len(scans)
+    app = _run(roll, tmp_path / "out2", "--link-duplicates")
+    assert (app.counts["written"], app.counts["linked"]) == (0, len(scans))
+    for path in (tmp_path / "out2").glob("*.jpg"):
+        assert path.stat().st_ino == (tmp_path / "out1" / path.name).stat().st_ino
+
+    # another output mode makes other outputs; and --force writes them all
+    app = _run(roll, tmp_path / "out3", "--link-duplicates", "--in-place")
+    assert app.counts["linked"] == 0
+    app = _run(roll, tmp_path / "out4", "--link-duplicates", "--force")
+    assert app.counts["written"] == len(scans)
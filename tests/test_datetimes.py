@@ -0,0 +1,72 @@
+##############################################################################
+#
+# Name: test_datetimes.py
+#
+# Function:
+#       Tests that formatting a row's dates and times all at once gives the
+#       same strings as formatting each frame's
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from annotate_film_scans.shotinfo import ShotInfoFile, format_exif_datetime, format_exif_datetimes
+
+ZONES = [
+    None,
+    timezone.utc,
+    timezone(timedelta(hours=-4)),
+    timezone(timedelta(hours=5, minutes=30)),
+    timezone(timedelta(hours=-9, minutes=-30, seconds=-15)),
+    ZoneInfo("America/New_York"),
+    ]
+
+BASES = [
+    datetime(2023, 6, 3, 9, 14),
+    datetime(2023, 6, 3, 23, 58, 30),
+    datetime(2023, 12, 31, 23, 59, 59, 250000),
+    datetime(2024, 2, 28, 23, 0, 1, 7),
+    datetime(2024, 1, 1, 0, 0, 5),
+    datetime(2023, 3, 12, 1, 59),
+    ]
+
+STEPS = [ 0, 1, 7, 59, 60, 61, 3599, 86399, 86400, 90061, -1, -61, -3600 ]
+
+def _per_frame(base: datetime, step: int, count: int) -> list:
+    return [ format_exif_datetime(base + timedelta(seconds = step * i)) for i in range(count) ]
+
+@pytest.mark.parametrize("tz", ZONES, ids=str)
+@pytest.mark.parametrize("step", STEPS)
+def test_same_as_per_frame(tz, step):
+    for base in BASES:
+        base = base.replace(tzinfo=tz)
+        assert format_exif_datetimes(base, step, 40) == _per_frame(base, step, 40)
+
+def test_counts():
+    base = datetime(2023, 6, 3, 9, 14, tzinfo=timezone.utc)
+    assert format_exif_datetimes(base, 60, 0) == []
+    assert format_exif_datetimes(base, 60, 1) == [ "2023:06:03 09:14:00+00:00" ]
+    assert format_exif_datetimes(base, 1, 5000) == _per_frame(base, 1, 5000)
+
+#
+# A row formats its frames' times when the first is needed; frames past
+# its count (which the shot-info file doesn't make, but may be asked for)
+# are formatted one at a time.
+#
+def test_row_datestring():
+    base = datetime(2023, 12, 31, 23, 59, tzinfo=timezone(timedelta(hours=-4)))
+    row = ShotInfoFile.Row({}, base, None, 45, False, count=3)
+    assert row.datestrings == None
+    assert [ row.datestring(i) for i in range(5) ] == _per_frame(base, 45, 5)
+    assert row.datestrings == _per_frame(base, 45, 3)
+    assert row.datestring(4) == "2024:01:01 00:02:00-04:00"
@@ -0,0 +1,86 @@
+##############################################################################
+#
+# Name: test_diagnostics.py
+#
+# Function:
+#       Tests that every error in a shot-info file is collected, with its
+#       line, column and field
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import pytest
+
+from annotate_film_scans.shotinfo import ShotInfoFile
+from annotate_film_scans.validate import ValidateApp
+
+TEXT = (
+    "--\n"                                                   # 1
+    "Forward: true\n"                                        # 2
+    "Order: scan-tme\n"                                      # 3
+    "TimeDelta: soon\n"                                      # 4
+    "--\n"                                                   # 5
+    "Frame, Frame2, Exposure, Aperture, Bogus, Date, Time\n" # 6
+    "1, , 1/125, f/8, x, 2023-06-03, 09:00:00-04:00\n"       # 7
+    "2, , fast, f/8, , , \n"                                 # 8
+    "3, , 1/125, 8, , , \n"                                  # 9
+    "x, , 1/125, f/8, , , \n"                                # 10
+    "4, , 1/125, f/8, , , , extra\n"                         # 11
+    "5, , 1/125, f/8, , , 25:00\n"                           # 12
+    )
+
+def _where(diagnostics: list) -> list:
+    return [ (diagnostic.line, diagnostic.column, diagnostic.field) for diagnostic in diagnostics ]
+
+def test_every_error_is_collected(shot_info):
+    reader, path = shot_info(TEXT, files=5)
+    frames, diagnostics = reader.check_path(path)
+    assert frames == 5
+    assert _where(diagnostics) == [
+        (3, None, "order"),
+        (4, None, "timedelta"),
+        (6, 5, "Bogus"),
+        (8, 3, "exposure"),
+        (9, 4, "aperture"),
+        (10, 1, "frame"),
+        (11, 8, None),
+        (12, 7, "time"),
+        ]
+    assert "unknown order 'scan-tme'" in diagnostics[0].message
+    assert "invalid timedelta: soon" in diagnostics[1].message
+    assert diagnostics[0].to_json() == { "line": 3, "column": None, "field": "order", "message": diagnostics[0].message }
+
+def test_row_timedelta(shot_info):
+    reader, _ = shot_info("Frame\n")
+    reader.diagnostics = []
+    reader.columns = { "frame": 1, "timedelta": 2 }
+    row = dict.fromkeys(reader.shot_fields) | { "line_num": 7, "datetime": None, "timedelta": "soon" }
+    result = reader._row_tags(row, 1)
+    assert result.timedelta == reader.app.args.timedelta
+    assert _where(reader.diagnostics) == [ (7, 2, "timedelta") ]
+
+def test_without_collecting_the_first_error_is_raised(shot_info):
+    reader, path = shot_info(TEXT, files=5)
+    with pytest.raises(ShotInfoFile.Error, match="unknown order"):
+        reader.read_from_path(path)
+
+def test_fatal_errors_stop_collecting(shot_info):
+    reader, path = shot_info("Exposure, Aperture\n1/125, f/8\n")
+    frames, diagnostics = reader.check_path(path)
+    assert frames == 0
+    assert [ (diagnostic.line, diagnostic.message) for diagnostic in diagnostics ] == [ (None, "no Frame column") ]
+
+def test_validate_prints_locations(shot_info, capsys):
+    _, path = shot_info(TEXT)
+    assert ValidateApp([ str(path) ]).run() == 1
+    out = capsys.readouterr().out
+    assert f"{path}:3: unknown order 'scan-tme'" in out
+    assert f"{path}:4: invalid timedelta: soon" in out
+    assert f"{path}:8:3: invalid exposure: fast" in out
+    assert "FAILED: 8 errors" in out
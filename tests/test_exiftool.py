@@ -0,0 +1,76 @@
+##############################################################################
+#
+# Name: test_exiftool.py
+#
+# Function:
+#       Tests for the persistent exiftool session and pool, run against
+#       the benchmark stand-in for exiftool
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+
+import pytest
+
+from annotate_film_scans.exiftool import ExifTool, ExifToolPool
+
+def test_one_process_for_many_commands(roll):
+    _, scans = roll
+    with ExifTool() as exiftool:
+        results = [ json.loads(exiftool.execute([ "-json", str(scan) ])) for scan in scans ]
+        process = exiftool.process
+        assert exiftool.execute([ "-json", str(scans[0]) ]) != ""
+        assert exiftool.process is process
+        assert process.args[1:] == [ "-stay_open", "True", "-@", "-" ]
+    assert process.poll() == 0
+    assert [ result[0]["SourceFile"] for result in results ] == [ str(scan) for scan in scans ]
+
+def test_input_replaces_json_stdin(roll, tmp_path):
+    _, scans = roll
+    outpath = tmp_path / "out.jpg"
+    with ExifTool() as exiftool:
+        exiftool.execute([ "-json=-", "-o", str(outpath), str(scans[0]) ], input=json.dumps([ { "Lens": "Xenar" } ]))
+        assert outpath.read_bytes() == scans[0].read_bytes()
+        with pytest.raises(ExifTool.Error, match="bad JSON"):
+            exiftool.execute([ "-json=-", "-o", str(tmp_path / "bad.jpg"), str(scans[0]) ], input="{")
+
+def test_errors_are_raised(tmp_path):
+    with ExifTool() as exiftool:
+        with pytest.raises(ExifTool.Error, match="File not found"):
+            exiftool.execute([ "-json", str(tmp_path / "missing.jpg") ])
+        # the session is still usable
+        assert json.loads(exiftool.execute([ "-json" ])) == []
+
+def test_restart_after_exit(roll):
+    _, scans = roll
+    with ExifTool() as exiftool:
+        exiftool.execute([ "-json", str(scans[0]) ])
+        first = exiftool.process
+        first.kill()
+        first.wait()
+        assert json.loads(exiftool.execute([ "-json", str(scans[0]) ]))[0]["SourceFile"] == str(scans[0])
+        assert exiftool.process is not first
+
+def test_timeout_kills_the_process(roll, monkeypatch):
+    _, scans = roll
+    monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "5")
+    with ExifTool(timeout=0.2) as exiftool:
+        with pytest.raises(ExifTool.Timeout):
+            exiftool.execute([ "-json", str(scans[0]) ])
+        assert exiftool.process == None
+        monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "0")
+        assert json.loads(exiftool.execute([ "-json", str(scans[0]) ]))[0]["SourceFile"] == str(scans[0])
+
+def test_pool_reuses_idle_sessions(roll):
+    _, scans = roll
+    with ExifToolPool() as pool:
+        for scan in scans:
+            pool.execute([ "-json", str(scan) ])
+        assert len(pool.sessions) == 1
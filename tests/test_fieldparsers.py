@@ -0,0 +1,91 @@
+##############################################################################
+#
+# Name: test_fieldparsers.py
+#
+# Function:
+#       Tests for the shot-info field parsers
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from datetime import time, timedelta, timezone
+
+import pytest
+
+from annotate_film_scans import fieldparsers
+from annotate_film_scans.fieldparsers import NOT_RECORDED
+from benchmarks import bench_fieldparsers
+from benchmarks.synthetic import make_roll
+
+@pytest.mark.parametrize("value, expected", [
+    ("f/8", 8.0), (" F/5.6 ", 5.6), ("f/11.", 11.0), ("?", NOT_RECORDED), ("", None), (None, None),
+    ])
+def test_fnumber(value, expected):
+    assert fieldparsers.parse_fnumber(value) == expected
+
+@pytest.mark.parametrize("value, expected", [
+    ("1/250", "1/250"), (" 2 ", "2"), ("0.5", "0.5"), ("?", NOT_RECORDED), ("", None), (None, None),
+    ])
+def test_exposure(value, expected):
+    assert fieldparsers.parse_exposure(value) == expected
+
+@pytest.mark.parametrize("value, expected", [ ("7", "7"), ("7:30", "7:30"), ("?", NOT_RECORDED), (" ", None) ])
+def test_time_minutes(value, expected):
+    assert fieldparsers.parse_time_minutes(value) == expected
+
+@pytest.mark.parametrize("value, expected", [ ("20", 20.0), ("20.5", 20.5), ("20c", 20.0), ("20.5C", 20.5), ("?", NOT_RECORDED), ("", None) ])
+def test_temperature(value, expected):
+    assert fieldparsers.parse_temperature_c(value) == expected
+
+@pytest.mark.parametrize("parser, value", [
+    (fieldparsers.parse_fnumber, "8"),
+    (fieldparsers.parse_fnumber, "f/"),
+    (fieldparsers.parse_exposure, "1/"),
+    (fieldparsers.parse_exposure, "fast"),
+    (fieldparsers.parse_time_minutes, "7:3"),
+    (fieldparsers.parse_temperature_c, "20F"),
+    (fieldparsers.parse_time, "9am"),
+    ])
+def test_invalid_values(parser, value):
+    with pytest.raises(ValueError):
+        parser(value)
+    # and again, now that anything cacheable is cached
+    with pytest.raises(ValueError):
+        parser(value)
+
+def test_times():
+    assert fieldparsers.normalize_time("09:14+0400") == "09:14+04:00"
+    assert fieldparsers.normalize_time("09:14:00+04:00") == "09:14:00+04:00"
+    assert fieldparsers.parse_time("09:14+0400") == time(9, 14, tzinfo=timezone(timedelta(hours=4)))
+    assert fieldparsers.parse_time("09:14:30") == time(9, 14, 30)
+
+def test_comment_key():
+    assert fieldparsers.comment_key("XMP-AnalogExif:Film") == "Film"
+    assert fieldparsers.comment_key("exififd:FNumber") == "FNumber"
+    assert fieldparsers.comment_key("ExifIFD:UserComment") == None
+    assert fieldparsers.comment_key("IFD0:Make") == None
+
+#
+# The memoized parsers must give the same results as the parsing they
+# replaced (kept in the benchmark), for every value in a large roll.
+#
+def test_same_as_before(tmp_path):
+    shot_info_file, _ = make_roll(tmp_path / "roll", 2000, image_size=16)
+    columns = bench_fieldparsers._read_columns(shot_info_file)
+    cases = (
+        ( columns["aperture"], bench_fieldparsers._old_fnumber, fieldparsers.parse_fnumber ),
+        ( columns["exposure"], bench_fieldparsers._old_exposure, fieldparsers.parse_exposure ),
+        ( columns["time"], bench_fieldparsers._old_time, fieldparsers.parse_time ),
+        )
+    for values, before, after in cases:
+        assert len(values) != 0
+        assert [ after(value) for value in values ] == [ before(value) for value in values ]
+
+    tags = [ "XMP-AnalogExif:Film", "ExifIFD:UserComment", "IFD0:Make", "xmp:Lens", "EXIF:ISO" ]
+    assert [ fieldparsers.comment_key(tag) for tag in tags ] == [ bench_fieldparsers._old_comment_key(tag) for tag in tags ]
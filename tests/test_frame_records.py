@@ -0,0 +1,65 @@
+##############################################################################
+#
+# Name: test_frame_records.py
+#
+# Function:
+#       Tests that frames share their rows' tags, and that the sharing is
+#       bounded
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from annotate_film_scans.shotinfo import ShotInfoFile
+
+HEADER = "Frame, Frame2, Exposure, Aperture, Date, Time, Camera, Film, Comment\n"
+
+def _frames(reader, path) -> dict:
+    return dict(reader.frames_from_path(path))
+
+def test_frames_share_their_rows(shot_info):
+    reader, path = shot_info(HEADER + (
+        "1, 3, 1/125, f/8, 2023-06-03, 09:00:00-04:00, Autocord, Tri-X 400, \n"
+        "4, , 1/125, f/8, , , , , \n"
+        "5, , 1/125, f/8, , , , , a note\n"
+        "6, , skip\n"
+        ))
+    frames = _frames(reader, path)
+
+    assert frames[1].row is frames[2].row is frames[3].row
+    assert [ frames[i].index for i in (1, 2, 3) ] == [ 0, 1, 2 ]
+    assert frames[4].row is not frames[1].row
+    assert frames[4].row.head is frames[1].row.head
+    assert frames[4].row.tail is frames[1].row.tail
+    assert frames[5].row.tail is not frames[1].row.tail
+    assert frames[6].skip and not frames[5].skip
+
+    # each frame's tags are its own
+    tags = frames[2].tags()
+    tags["ExifIFD:ExposureTime"] = "1/1000"
+    assert frames[1].tags()["ExifIFD:ExposureTime"] == frames[2].tags()["ExifIFD:ExposureTime"] == "1/125"
+    assert [ frames[i].tags()["file"] for i in (1, 2, 3, 4, 5) ] == [ 1, 2, 3, 4, 5 ]
+    assert frames[5].tags()["XMP-AnnotateFilmScans:ImageNote"] == "a note"
+    assert not "XMP-AnnotateFilmScans:ImageNote" in frames[4].tags()
+
+def test_interning_is_bounded(shot_info):
+    reader, _ = shot_info(HEADER)
+    for i in range(ShotInfoFile.INTERNED_MAX * 3):
+        reader._intern({ "ExifIFD:ExposureTime": f"1/{i + 1}" })
+    assert len(reader.interned) == ShotInfoFile.INTERNED_MAX
+
+    # the ones used most recently are kept
+    last = { "ExifIFD:ExposureTime": f"1/{ShotInfoFile.INTERNED_MAX * 3}" }
+    assert reader._intern(dict(last)) is reader._intern(dict(last))
+
+def test_interning_keeps_types_apart(shot_info):
+    reader, _ = shot_info(HEADER)
+    one = reader._intern({ "tag": 1 })
+    assert reader._intern({ "tag": 1.0 }) is not one
+    assert reader._intern({ "tag": True }) is not one
+    assert reader._intern({ "tag": 1 }) is one
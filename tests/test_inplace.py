@@ -0,0 +1,64 @@
+##############################################################################
+#
+# Name: test_inplace.py
+#
+# Function:
+#       Tests for fast_copy() and the --in-place output mode
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import pathlib
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.fileutil import fast_copy
+
+@pytest.mark.parametrize("allow_link", [ False, True ])
+def test_fast_copy(tmp_path, allow_link):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"scan" * 1000)
+    dst = tmp_path / "dst.jpg"
+
+    method = fast_copy(src, dst, allow_link=allow_link)
+    assert method in ("reflink", "link", "copy_file_range", "copy")
+    assert method != "link" or allow_link
+    assert dst.read_bytes() == src.read_bytes()
+
+    with pytest.raises(FileExistsError):
+        fast_copy(src, dst, allow_link=allow_link)
+
+def _run(roll, outdir: pathlib.Path, mode: str) -> dict:
+    shot_info_file, scans = roll
+    outdir.mkdir()
+    assert App([ "--output-mode", mode, "-d", str(outdir), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ]).run() == 0
+    return json.loads((outdir / Constants.MANIFEST_NAME).read_text())["frames"]
+
+def test_inplace_matches_rewrite(roll, tmp_path):
+    _, scans = roll
+    before = { scan: (scan.read_bytes(), scan.stat().st_ino, scan.stat().st_nlink) for scan in scans }
+
+    rewrite = _run(roll, tmp_path / "rewrite", "rewrite")
+    inplace = _run(roll, tmp_path / "inplace", "inplace")
+
+    assert sorted(inplace) == sorted(rewrite)
+    for name, record in inplace.items():
+        assert record["mode"] == "inplace"
+        assert record["settings"] == rewrite[name]["settings"]
+        output = tmp_path / "inplace" / name
+        assert output.read_bytes() == pathlib.Path(record["input"]).read_bytes()
+        assert not output.samefile(record["input"])
+    assert list((tmp_path / "inplace").glob(".*.partial*")) == []
+
+    # the inputs are untouched, and not left linked to the outputs
+    for scan, (contents, inode, links) in before.items():
+        assert (scan.read_bytes(), scan.stat().st_ino, scan.stat().st_nlink) == (contents, inode, links)
@@ -0,0 +1,64 @@
+##############################################################################
+#
+# Name: test_jobs.py
+#
+# Function:
+#       Tests that --jobs writes the same frames, with the same tags, as
+#       a single writer
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import pathlib
+import threading
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.exiftool import ExifToolPool
+
+class RecordingPool(ExifToolPool):
+    """ an exiftool pool that remembers the tags sent for each output """
+    def __init__(self):
+        super().__init__()
+        self.tags = dict()
+        self.threads = set()
+        self.tags_lock = threading.Lock()
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        if input != None:
+            name = pathlib.Path(args[-1] if not "-o" in args else args[args.index("-o") + 1]).name
+            with self.tags_lock:
+                self.tags[name] = json.loads(input)
+                self.threads.add(threading.get_ident())
+        return super().execute(args, input)
+
+def _run(roll, outdir: pathlib.Path, jobs: int) -> tuple:
+    shot_info_file, scans = roll
+    outdir.mkdir()
+    with RecordingPool() as pool:
+        app = App([ "-d", str(outdir), "-j", str(jobs), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ], exiftool=pool)
+        assert app.run() == 0
+    manifest = json.loads((outdir / Constants.MANIFEST_NAME).read_text())
+    outputs = sorted(path.name for path in outdir.iterdir() if not path.name.startswith("."))
+    return outputs, manifest["frames"], pool
+
+@pytest.mark.parametrize("jobs", [ 2, 4, 0 ])
+def test_jobs_match_one_writer(roll, tmp_path, jobs):
+    outputs, frames, pool = _run(roll, tmp_path / "one", 1)
+    j_outputs, j_frames, j_pool = _run(roll, tmp_path / f"jobs{jobs}", jobs)
+
+    assert len(outputs) == len(roll[1])
+    assert j_outputs == outputs
+    assert j_frames == frames
+    assert j_pool.tags == pool.tags
+    assert len(pool.tags) == len(outputs)
+    assert len(pool.threads) == 1
@@ -0,0 +1,118 @@
+##############################################################################
+#
+# Name: test_manifest.py
+#
+# Function:
+#       Tests for the output manifest, skipping frames that are already
+#       up to date, stale outputs, and atomic writes
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import os
+import threading
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.fileutil import atomic_write_bytes
+from annotate_film_scans.manifest import Manifest
+
+def test_manifest_round_trip(tmp_path):
+    inpath = tmp_path / "scan.jpg"
+    inpath.write_bytes(b"scan")
+    outpath = tmp_path / "001-scan.jpg"
+    record = Manifest.make_record(inpath, "rewrite", { "XMP:Lens": "Xenar", "file": 1 })
+
+    manifest = Manifest(tmp_path)
+    manifest.put(outpath, record)
+    manifest.save()
+
+    loaded = Manifest(tmp_path).load()
+    assert loaded.get(outpath) == record
+    assert not loaded.is_current([ outpath ], record)
+    outpath.write_bytes(b"output")
+    assert loaded.is_current([ outpath ], record)
+    assert not loaded.is_current([ outpath ], Manifest.make_record(inpath, "inplace", { "XMP:Lens": "Xenar", "file": 1 }))
+
+    # a changed input is a different record
+    os.utime(inpath, ns=(0, 0))
+    assert not loaded.is_current([ outpath ], Manifest.make_record(inpath, "rewrite", { "XMP:Lens": "Xenar", "file": 1 }))
+
+def test_unreadable_manifest_is_ignored(tmp_path):
+    (tmp_path / Constants.MANIFEST_NAME).write_text("{ not json")
+    assert Manifest(tmp_path).load().frames == {}
+
+def _run(roll, outdir, *extra, scans=None) -> App:
+    shot_info_file, all_scans = roll
+    scans = all_scans if scans == None else scans
+    app = App([ "-d", str(outdir), "-s", str(shot_info_file) ] + list(extra) + [ "--" ] + [ str(scan) for scan in scans ])
+    assert app.run() == 0
+    return app
+
+def test_rerun_skips_current_frames(roll, tmp_path):
+    _, scans = roll
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    assert _run(roll, outdir).counts["written"] == len(scans)
+
+    app = _run(roll, outdir)
+    assert (app.counts["written"], app.counts["current"]) == (0, len(scans))
+
+    scans[3].write_bytes(scans[3].read_bytes() + b"\0")
+    app = _run(roll, outdir)
+    assert (app.counts["written"], app.counts["current"]) == (1, len(scans) - 1)
+
+    app = _run(roll, outdir, "--force")
+    assert app.counts["written"] == len(scans)
+
+def test_stale_outputs(roll, tmp_path):
+    _, scans = roll
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    _run(roll, outdir)
+    outputs = { path.name for path in outdir.iterdir() if not path.name.startswith(".") }
+
+    # the last frame now comes from a file with another name, so it has
+    # a new output, and the old one is stale.
+    renamed = scans[-1].rename(scans[-1].with_name("renamed.jpg"))
+    scans = scans[:-1] + [ renamed ]
+    app = _run(roll, outdir, scans=scans)
+    assert (app.counts["written"], app.counts["stale"]) == (1, 1)
+    current = { path.name for path in outdir.iterdir() if not path.name.startswith(".") }
+    assert len(current - outputs) == 1
+    assert outputs < current
+
+    app = _run(roll, outdir, "--prune", scans=scans)
+    assert app.counts["stale"] == 1
+    remaining = { path.name for path in outdir.iterdir() if not path.name.startswith(".") }
+    pruned = outputs - remaining
+    assert len(pruned) == 1
+    assert remaining == current - pruned
+    assert sorted(Manifest(outdir).load().frames) == sorted(remaining)
+
+def test_atomic_write_from_threads(tmp_path):
+    path = tmp_path / "shared.json"
+    contents = [ bytes([ i ]) * 100000 for i in range(16) ]
+    errors = []
+
+    def write(data):
+        try:
+            atomic_write_bytes(path, data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [ threading.Thread(target=write, args=(data,)) for data in contents ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert path.read_bytes() in contents
+    assert list(tmp_path.iterdir()) == [ path ]
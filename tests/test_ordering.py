@@ -0,0 +1,199 @@
+##############################################################################
+#
+# Name: test_ordering.py
+#
+# Function:
+#       Tests for putting a roll's scans in order, and for merging the
+#       scan catalog when it's saved
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.catalog import ScanCatalog
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.exiftool import ExifToolPool
+from annotate_film_scans.ordering import InputOrdering
+from annotate_film_scans.plan import Plan
+
+class TimesPool(ExifToolPool):
+    """ an exiftool pool that reports the scan times it's given, and counts the files asked about """
+    def __init__(self, times: dict):
+        super().__init__()
+        self.times = times
+        self.asked = []
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        paths = [ arg for arg in args if not arg.startswith("-") ]
+        self.asked.append(len(paths))
+        return json.dumps([ { "SourceFile": path } | self.times.get(os.path.basename(path), {}) for path in paths ])
+
+def _touch(directory, names: list) -> list:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name in names:
+        (directory / name).write_bytes(name.encode())
+        paths.append(directory / name)
+    return paths
+
+def _names(paths: list) -> list:
+    return [ path.name for path in paths ]
+
+def test_given_and_name(tmp_path):
+    paths = _touch(tmp_path, [ "scan10.jpg", "scan2.jpg", "Scan1.jpg" ])
+    ordering = InputOrdering()
+    assert ordering.order("given", paths) == paths
+    assert _names(ordering.order("name", paths)) == [ "Scan1.jpg", "scan2.jpg", "scan10.jpg" ]
+    with pytest.raises(InputOrdering.Error, match="unknown order 'size'"):
+        ordering.order("size", paths)
+
+def test_scan_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, "EXIFTOOL_BATCH_SIZE", 2)
+    paths = _touch(tmp_path, [ "a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg" ])
+    os.utime(paths[4], (0, time.mktime((2023, 6, 16, 10, 11, 13, 0, 0, -1))))
+    pool = TimesPool({
+        "a.jpg": { "DateTimeOriginal": "2023:06:16 10:11:14" },
+        "b.jpg": { "DateTimeOriginal": "0000:00:00 00:00:00", "CreateDate": "2023:06:16 10:11:12" },
+        "c.jpg": { "CreateDate": "2023:06:16 10:11:12.50" },
+        "d.jpg": { "DateTimeOriginal": "2023:06:16 10:11:12-04:00" },
+        })
+    ordering = InputOrdering(exiftool=pool)
+    # ties are broken by name; e has no times, and so has its mtime
+    assert _names(ordering.order("scan-time", paths)) == [ "b.jpg", "c.jpg", "d.jpg", "e.jpg", "a.jpg" ]
+    assert pool.asked == [ 2, 2, 1 ]
+
+    # the times are kept, and read again only for files that change
+    pool.asked = []
+    assert _names(ordering.order("scan-time", list(reversed(paths)))) == [ "b.jpg", "c.jpg", "d.jpg", "e.jpg", "a.jpg" ]
+    assert pool.asked == []
+    paths[0].write_bytes(b"rescanned")
+    pool.times["a.jpg"] = { "DateTimeOriginal": "2023:06:16 09:00:00" }
+    assert _names(ordering.order("scan-time", paths)) == [ "a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg" ]
+    assert pool.asked == [ 1 ]
+
+def _map(tmp_path, lines: list):
+    path = tmp_path / "order-map.txt"
+    path.write_text("".join(line + "\n" for line in lines))
+    return InputOrdering(map_path=path)
+
+def test_map(tmp_path, caplog):
+    paths = _touch(tmp_path / "scans", [ "a.jpg", "b.jpg", "c.jpg" ])
+    ordering = _map(tmp_path, [ "# sheets, in the order shot", "c.jpg", "", "  a.jpg  ", "x.jpg", "b.jpg" ])
+    with caplog.at_level(logging.WARNING):
+        assert _names(ordering.order("map", paths)) == [ "c.jpg", "a.jpg", "b.jpg" ]
+    assert [ record.getMessage() for record in caplog.records ] == [ f"{tmp_path / 'order-map.txt'}: not an input file, ignored: x.jpg" ]
+
+@pytest.mark.parametrize("lines, message", [
+    ([ "a.jpg", "b.jpg", "a.jpg" ], "a.jpg is listed twice"),
+    ([ "b.jpg" ], "input files not in the order map: a.jpg, c.jpg, d.jpg, e.jpg, f.jpg and 2 more$"),
+    ])
+def test_map_errors(tmp_path, lines, message):
+    paths = _touch(tmp_path / "scans", [ f"{name}.jpg" for name in "abcdefgh" ])
+    with pytest.raises(InputOrdering.Error, match=message):
+        _map(tmp_path, lines).order("map", paths)
+
+def test_map_needs_names(tmp_path):
+    paths = _touch(tmp_path / "1", [ "a.jpg" ]) + _touch(tmp_path / "2", [ "a.jpg" ])
+    with pytest.raises(InputOrdering.Error, match="two input files named a.jpg"):
+        _map(tmp_path, [ "a.jpg" ]).order("map", paths)
+    with pytest.raises(InputOrdering.Error, match="no order map given"):
+        InputOrdering().order("map", paths[:1])
+    with pytest.raises(InputOrdering.Error, match="can't read order map"):
+        InputOrdering(map_path=tmp_path / "missing.txt").order("map", paths[:1])
+
+#
+# The order of the inputs in the plan: from --order, the shot-info
+# file's Order option, or an order map next to it.
+#
+def _planned(roll, tmp_path, inputs: list, *extra) -> list:
+    shot_info_file, _ = roll
+    outdir = tmp_path / "out"
+    outdir.mkdir(exist_ok=True)
+    argv = [ "--dry-run", "-d", str(outdir), "-s", str(shot_info_file) ] + list(extra) + [ "--" ] + [ str(path) for path in inputs ]
+    assert App(argv).run() == 0
+    return [ frame.input.name for frame in Plan.load(outdir / Constants.PLAN_NAME).frames ]
+
+def test_app_orders(roll, tmp_path):
+    shot_info_file, scans = roll
+    shuffled = scans[1::2] + scans[0::2]
+    assert _planned(roll, tmp_path, shuffled) == _names(shuffled)
+    assert _planned(roll, tmp_path, shuffled, "--order", "name") == _names(scans)
+
+    # the shot-info file's option; --reverse still applies
+    text = shot_info_file.read_text()
+    assert text.startswith("--\nForward: true\n")
+    shot_info_file.write_text(text.replace("Forward: true\n", "Forward: true\nOrder: name\n", 1))
+    assert _planned(roll, tmp_path, shuffled) == _names(scans)
+    shot_info_file.write_text(text.replace("Forward: true\n", "Forward: false\nOrder: name\n", 1))
+    assert _planned(roll, tmp_path, shuffled) == _names(reversed(scans))
+
+    # a map is the order on the film, so it isn't reversed
+    shot_info_file.write_text(text.replace("Forward: true\n", "Forward: false\n", 1))
+    (shot_info_file.parent / Constants.ORDER_MAP_NAME).write_text("".join(name + "\n" for name in _names(shuffled)))
+    assert _planned(roll, tmp_path, scans, "--order", "map") == _names(shuffled)
+
+def test_app_scan_time(roll, tmp_path):
+    # the stand-in exiftool reports no times, so the mtimes are used
+    _, scans = roll
+    for i, scan in enumerate(reversed(scans)):
+        os.utime(scan, (0, 1_600_000_000 + 60 * i))
+    assert _planned(roll, tmp_path, scans, "--order", "scan-time") == _names(reversed(scans))
+
+#
+# Catalogs loaded by other runs meanwhile keep each other's changes
+# when they're saved.
+#
+def test_catalog_saves_merge(tmp_path):
+    path = tmp_path / "catalog.json"
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = ScanCatalog(path=path).load()
+    first.set_forward(tmp_path / "a", True)
+    first.save()
+
+    one = ScanCatalog(path=path).load()
+    two = ScanCatalog(path=path).load()
+    one.set_forward(tmp_path / "b", False)
+    one.images(tmp_path / "a")
+    two.set_forward(tmp_path / "a", False)
+    one.save()
+    two.save()
+
+    merged = ScanCatalog(path=path).load()
+    assert merged.get_forward(tmp_path / "a") == False
+    assert merged.get_forward(tmp_path / "b") == False
+    assert str(tmp_path / "a") in merged.dirs
+
+    # a directory that's gone is forgotten
+    (tmp_path / "a").rmdir()
+    assert merged.images(tmp_path / "a") == []
+    merged.save()
+    assert not str(tmp_path / "a") in ScanCatalog(path=path).load().dirs
+
+def test_catalog_saves_from_threads(tmp_path):
+    path = tmp_path / "catalog.json"
+    catalogs = [ ScanCatalog(path=path).load() for _ in range(16) ]
+    for i, catalog in enumerate(catalogs):
+        catalog.set_forward(tmp_path / f"roll{i}", i % 2 == 0)
+    threads = [ threading.Thread(target=catalog.save) for catalog in catalogs ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = ScanCatalog(path=path).load()
+    assert [ merged.get_forward(tmp_path / f"roll{i}") for i in range(16) ] == [ i % 2 == 0 for i in range(16) ]
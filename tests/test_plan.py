@@ -0,0 +1,94 @@
+##############################################################################
+#
+# Name: test_plan.py
+#
+# Function:
+#       Tests for saving, loading and executing annotation plans
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import pathlib
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.plan import Plan
+
+def test_save_load_round_trip(tmp_path):
+    plan = Plan(tmp_path, "default")
+    plan.append(Plan.Frame(1, tmp_path / "a.jpg", tmp_path / "out" / "001-a.jpg", { "Lens": "Xenar" }))
+    plan.append(Plan.Frame(3, tmp_path / "b.jpg", tmp_path / "out" / "003-b.jpg", {}))
+    plan.save(tmp_path / "plan.json")
+
+    loaded = Plan.load(tmp_path / "plan.json")
+    assert loaded.to_json() == plan.to_json()
+    assert loaded.frames[0].input == tmp_path / "a.jpg"
+    assert loaded.frames[1].frame == 3
+
+def test_load_rejects_other_formats(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({ "format": Plan.FORMAT + 1, "frames": [] }))
+    with pytest.raises(Plan.Error):
+        Plan.load(path)
+
+    path.write_text("not json")
+    with pytest.raises(Plan.Error):
+        Plan.load(path)
+
+def _dry_run(roll, monkeypatch) -> pathlib.Path:
+    """ plan the roll with relative paths, from the roll's directory """
+    shot_info_file, scans = roll
+    monkeypatch.chdir(shot_info_file.parent)
+    pathlib.Path("out").mkdir()
+    assert App([ "--dry-run", "-d", "out", "-s", shot_info_file.name, "--" ] + [ scan.name for scan in scans ]).run() == 0
+    return shot_info_file.parent / "out" / Constants.PLAN_NAME
+
+def test_plan_paths_are_absolute(roll, monkeypatch):
+    plan = Plan.load(_dry_run(roll, monkeypatch))
+    assert plan.dir.is_absolute()
+    for frame in plan.frames:
+        assert frame.input.is_absolute()
+        assert frame.output.is_absolute()
+
+def test_execute_plan_from_another_directory(roll, tmp_path, monkeypatch):
+    planpath = _dry_run(roll, monkeypatch)
+    plan = Plan.load(planpath)
+    assert not any(frame.output.exists() for frame in plan.frames)
+
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    assert App([ "--execute-plan", str(planpath) ]).run() == 0
+
+    assert all(frame.output.is_file() for frame in plan.frames)
+    assert list(elsewhere.iterdir()) == []
+
+def test_execute_plan_in_parts(roll, tmp_path, monkeypatch):
+    planpath = _dry_run(roll, monkeypatch)
+    plan = Plan.load(planpath)
+    numbers = [ frame.frame for frame in plan.frames ]
+    split = numbers[len(numbers) // 2]
+    monkeypatch.chdir(tmp_path)
+
+    app = App([ "--execute-plan", str(planpath), "--frames", f"{numbers[0]}-{split - 1}" ])
+    assert app.run() == 0
+    assert [ frame.output.exists() for frame in plan.frames ] == [ number < split for number in numbers ]
+
+    app = App([ "--execute-plan", str(planpath), "--frames", f"{split}-{numbers[-1]}" ])
+    assert app.run() == 0
+    assert all(frame.output.is_file() for frame in plan.frames)
+    assert app.counts["stale"] == 0
+
+def test_frames_needs_execute_plan(roll):
+    shot_info_file, scans = roll
+    with pytest.raises(SystemExit):
+        App([ "--frames", "1-2", "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ])
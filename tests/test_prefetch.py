@@ -0,0 +1,68 @@
+##############################################################################
+#
+# Name: test_prefetch.py
+#
+# Function:
+#       Tests for reading the scanners' make and model in batches
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.exiftool import ExifToolPool
+from annotate_film_scans.plan import Plan
+
+class ReadCountingPool(ExifToolPool):
+    """ an exiftool pool that counts the files in each make/model read """
+    def __init__(self, fail_batches: bool = False):
+        super().__init__()
+        self.reads = []
+        self.fail_batches = fail_batches
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        if "-make" in args:
+            files = args[args.index("-model") + 1:]
+            self.reads.append(len(files))
+            if self.fail_batches and len(files) > 1:
+                raise self.Error("can't read one of the files")
+        return super().execute(args, input)
+
+def _plan(roll, tmp_path, pool) -> Plan:
+    shot_info_file, scans = roll
+    outdir = tmp_path / f"out{len(list(tmp_path.iterdir()))}"
+    outdir.mkdir()
+    planpath = outdir / "plan.json"
+    with pool:
+        assert App([ "--dry-run", "--plan", str(planpath), "-d", str(outdir), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ], exiftool=pool).run() == 0
+    return Plan.load(planpath)
+
+def _tags(plan: Plan) -> list:
+    return [ (frame.frame, frame.input, frame.tags) for frame in plan.frames ]
+
+def test_reads_in_batches(roll, tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, "EXIFTOOL_BATCH_SIZE", 1)
+    pool = ReadCountingPool()
+    one_by_one = _plan(roll, tmp_path, pool)
+    assert pool.reads == [ 1 ] * len(roll[1])
+
+    monkeypatch.setattr(Constants, "EXIFTOOL_BATCH_SIZE", 5)
+    pool = ReadCountingPool()
+    batched = _plan(roll, tmp_path, pool)
+    assert pool.reads == [ 5, 5, len(roll[1]) - 10 ]
+    assert _tags(batched) == _tags(one_by_one)
+
+def test_failed_batch_reads_one_by_one(roll, tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, "EXIFTOOL_BATCH_SIZE", 5)
+    expected = _plan(roll, tmp_path, ReadCountingPool())
+
+    pool = ReadCountingPool(fail_batches=True)
+    plan = _plan(roll, tmp_path, pool)
+    assert pool.reads.count(1) == len(roll[1])
+    assert _tags(plan) == _tags(expected)
@@ -0,0 +1,118 @@
+##############################################################################
+#
+# Name: test_read_ahead.py
+#
+# Function:
+#       Tests for reading the inputs of frames ahead of the ones being
+#       written
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import threading
+
+import pytest
+
+from annotate_film_scans import app as app_module
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.fileutil import prefetch_file
+from annotate_film_scans.plan import Plan
+
+@pytest.fixture
+def prefetched(monkeypatch):
+    """ the inputs prefetched, in place of prefetching them """
+    inputs = []
+    lock = threading.Lock()
+    def record(path):
+        with lock:
+            inputs.append(path.name)
+    monkeypatch.setattr(app_module, "prefetch_file", record)
+    return inputs
+
+#
+# An App to try _read_ahead() with, that records the frames it looks
+# at as it takes them.
+#
+def _app(shot_info, monkeypatch, read_ahead: int) -> tuple:
+    reader, _ = shot_info("Frame\n", argv=[ "--read-ahead", str(read_ahead) ])
+    app = reader.app
+    looked = []
+    def needs_writing(frame, output_mode):
+        looked.append(frame.frame)
+        return True
+    monkeypatch.setattr(app, "_needs_writing", needs_writing)
+    return app, looked
+
+def _frames(n: int, fail: bool = False):
+    for i in range(1, n + 1):
+        yield Plan.Frame(i, f"scan{i:05d}.jpg", f"{i:03d}-scan{i:05d}.jpg", {})
+    if fail:
+        raise App.Error("bad frame")
+
+def test_window(shot_info, monkeypatch, prefetched):
+    app, looked = _app(shot_info, monkeypatch, 3)
+    for frame in app._read_ahead(_frames(10), "rewrite"):
+        # the next three have been taken
+        assert len(looked) == min(10, frame.frame + 3)
+    assert looked == list(range(1, 11))
+
+@pytest.mark.parametrize("read_ahead, output_mode", [ (0, "rewrite"), (4, "sidecar") ])
+def test_no_read_ahead(shot_info, monkeypatch, prefetched, read_ahead, output_mode):
+    app, looked = _app(shot_info, monkeypatch, read_ahead)
+    assert [ frame.frame for frame in app._read_ahead(_frames(5), output_mode) ] == [ 1, 2, 3, 4, 5 ]
+    assert looked == []
+
+#
+# A failure taking the next frame doesn't lose the frames taken before
+# it: they're yielded, and then it's raised.
+#
+def test_frames_before_an_error(shot_info, monkeypatch, prefetched):
+    app, _ = _app(shot_info, monkeypatch, 8)
+    frames = app._read_ahead(_frames(3, fail=True), "rewrite")
+    assert [ next(frames).frame for _ in range(3) ] == [ 1, 2, 3 ]
+    with pytest.raises(App.Error, match="bad frame"):
+        next(frames)
+
+def test_prefetch_file(tmp_path):
+    path = tmp_path / "scan.jpg"
+    path.write_bytes(b"x" * 100)
+    prefetch_file(path)
+    with pytest.raises(OSError):
+        prefetch_file(tmp_path / "missing.jpg")
+
+def _run(roll, outdir, *extra) -> dict:
+    shot_info_file, scans = roll
+    outdir.mkdir(exist_ok=True)
+    app = App([ "-d", str(outdir), "-s", str(shot_info_file) ] + list(extra) + [ "--" ] + [ str(scan) for scan in scans ])
+    assert app.run() == 0
+    return app.counts
+
+def _outputs(outdir) -> dict:
+    return { path.name: path.read_bytes() for path in outdir.iterdir() if not path.name.startswith(".") }
+
+def test_same_outputs(roll, tmp_path, prefetched):
+    _, scans = roll
+    _run(roll, tmp_path / "off", "--read-ahead", "0")
+    assert prefetched == []
+    _run(roll, tmp_path / "on", "--read-ahead", "3")
+    assert sorted(prefetched) == sorted(scan.name for scan in scans)
+    _run(roll, tmp_path / "jobs", "--read-ahead", "3", "-j", "3")
+
+    off = _outputs(tmp_path / "off")
+    assert len(off) == len(scans)
+    assert _outputs(tmp_path / "on") == _outputs(tmp_path / "jobs") == off
+    manifests = [ json.loads((tmp_path / name / Constants.MANIFEST_NAME).read_text())["frames"] for name in ("off", "on", "jobs") ]
+    assert manifests[0] == manifests[1] == manifests[2]
+
+    # frames that are up to date aren't read ahead
+    prefetched.clear()
+    assert _run(roll, tmp_path / "on", "--read-ahead", "3")["current"] == len(scans)
+    assert prefetched == []
@@ -0,0 +1,86 @@
+##############################################################################
+#
+# Name: test_resume.py
+#
+# Function:
+#       Tests for the progress journal and --resume
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.exiftool import ExifToolPool
+from annotate_film_scans.manifest import Journal
+
+class FailingPool(ExifToolPool):
+    """ an exiftool pool whose writes fail after the first few """
+    def __init__(self, writes: int):
+        super().__init__()
+        self.writes = writes
+
+    def execute(self, args: list, input: str | None = None) -> str:
+        if input != None:
+            if self.writes == 0:
+                raise self.Error("interrupted")
+            self.writes -= 1
+        return super().execute(args, input)
+
+def _argv(roll, outdir, *extra) -> list:
+    shot_info_file, scans = roll
+    return [ "-d", str(outdir), "-s", str(shot_info_file) ] + list(extra) + [ "--" ] + [ str(scan) for scan in scans ]
+
+def _interrupted_run(roll, outdir, writes: int) -> None:
+    outdir.mkdir()
+    with FailingPool(writes) as pool:
+        with pytest.raises(Exception, match="interrupted"):
+            App(_argv(roll, outdir), exiftool=pool).run()
+
+def test_journal_records_completed_frames(roll, tmp_path):
+    outdir = tmp_path / "out"
+    _interrupted_run(roll, outdir, 4)
+
+    completed = Journal(outdir).read()
+    assert len(completed) == 4
+    assert sorted(completed) == sorted(path.name for path in outdir.iterdir() if not path.name.startswith("."))
+    assert list(outdir.glob(".*.partial*")) == []
+
+def test_resume(roll, tmp_path):
+    _, scans = roll
+    outdir = tmp_path / "out"
+    _interrupted_run(roll, outdir, 4)
+    # as if the run had died before it could save the manifest
+    (outdir / Constants.MANIFEST_NAME).unlink(missing_ok=True)
+
+    app = App(_argv(roll, outdir, "--resume"))
+    assert app.run() == 0
+    assert (app.counts["written"], app.counts["current"]) == (len(scans) - 4, 4)
+    assert not (outdir / Constants.JOURNAL_NAME).exists()
+    assert len(json.loads((outdir / Constants.MANIFEST_NAME).read_text())["frames"]) == len(scans)
+
+def test_damaged_journal_entry(tmp_path):
+    journal = Journal(tmp_path)
+    journal.open(resume=False)
+    journal.append(tmp_path / "001-a.jpg", { "input": "a.jpg" })
+    journal.append(tmp_path / "002-b.jpg", { "input": "b.jpg" })
+    journal.close(remove=False)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"output": "003-c.jpg", "rec')
+
+    assert Journal(tmp_path).read() == { "001-a.jpg": { "input": "a.jpg" }, "002-b.jpg": { "input": "b.jpg" } }
+
+    # starting over (not resuming) forgets the earlier run
+    journal = Journal(tmp_path)
+    journal.open(resume=False)
+    journal.close(remove=False)
+    assert Journal(tmp_path).read() == {}
@@ -0,0 +1,69 @@
+##############################################################################
+#
+# Name: test_settings_cache.py
+#
+# Function:
+#       Tests for the compiled settings cache
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import os
+
+import pytest
+
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.settings import SettingsCatalog, SettingsFile, user_cache_dir
+
+def _cache_files() -> list:
+    return sorted(user_cache_dir().glob("settings-*.pickle"))
+
+def _no_reading(monkeypatch):
+    def read(self):
+        raise AssertionError(f"read {self.path}")
+    monkeypatch.setattr(SettingsFile, "read", read)
+
+def test_cache_is_used(monkeypatch):
+    settings = SettingsCatalog().load()
+    assert len(_cache_files()) == 1
+    with pytest.raises(TypeError):
+        settings["camera"]["new"] = {}
+
+    _no_reading(monkeypatch)
+    assert SettingsCatalog().load() == settings
+
+def test_cache_matches_the_files():
+    uncached = SettingsCatalog.merge([ SettingsFile(path, overlay).read() for path, overlay in SettingsCatalog().layers() if path.exists() ])
+    assert SettingsCatalog().load() == SettingsCatalog.freeze(uncached)
+
+def test_changed_layer_is_read_again(tmp_path, monkeypatch):
+    overlay = tmp_path / "more.json"
+    overlay.write_text(json.dumps({ "lens": { "Test": { "XMP:LensModel": "Test" } } }))
+    monkeypatch.setenv(Constants.SETTINGS_ENV, str(overlay))
+    assert SettingsCatalog().load()["lens"]["Test"]["XMP:LensModel"] == "Test"
+
+    overlay.write_text(json.dumps({ "lens": { "Test": { "XMP:LensModel": "Changed" } } }))
+    os.utime(overlay, ns=(0, 0))
+    assert SettingsCatalog().load()["lens"]["Test"]["XMP:LensModel"] == "Changed"
+
+def test_damaged_cache_is_ignored():
+    settings = SettingsCatalog().load()
+    for path in _cache_files():
+        path.write_bytes(b"not a pickle")
+    assert SettingsCatalog().load() == settings
+
+def test_stale_format_is_ignored(monkeypatch):
+    settings = SettingsCatalog().load()
+    monkeypatch.setattr(SettingsCatalog, "CACHE_FORMAT", SettingsCatalog.CACHE_FORMAT + 1)
+    calls = []
+    read = SettingsFile.read
+    monkeypatch.setattr(SettingsFile, "read", lambda self: calls.append(self.path) or read(self))
+    assert SettingsCatalog().load() == settings
+    assert len(calls) != 0
@@ -0,0 +1,83 @@
+##############################################################################
+#
+# Name: test_settings_layers.py
+#
+# Function:
+#       Tests for the user, per-directory and environment settings layers
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import os
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.plan import Plan
+from annotate_film_scans.settings import SettingsCatalog, SettingsFile, user_config_dir
+
+def _write(path, contents: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(contents))
+    return path
+
+def test_merge():
+    merged = SettingsCatalog.merge([
+        { "lens": { "A": { "x": 1, "y": 2 }, "B": { "x": 1 } }, "film": { "F": { "z": 1 } } },
+        { "lens": { "A": { "y": None, "w": 3 }, "B": None, "C": { "x": 4 } } },
+        { "lens": { "B": { "x": 5 } } },
+        ])
+    assert merged == { "lens": { "A": { "x": 1, "w": 3 }, "C": { "x": 4 }, "B": { "x": 5 } }, "film": { "F": { "z": 1 } } }
+    assert list(merged["lens"]) == [ "A", "C", "B" ]
+
+def test_layers(tmp_path, monkeypatch):
+    packaged = SettingsCatalog().load()
+    lens, tag = next((lens, next(iter(tags))) for lens, tags in packaged["lens"].items() if len(tags) != 0)
+
+    _write(user_config_dir() / "settings.json", { "lens": { lens: { tag: "user" }, "Mine": { "XMP:LensModel": "user" } } })
+    local = _write(tmp_path / "roll" / Constants.LOCAL_SETTINGS_NAME, { "lens": { "Mine": { "XMP:LensModel": "local" } } })
+    env = _write(tmp_path / "env.json", { "lens": { lens: None } })
+
+    settings = SettingsCatalog().load()
+    assert (settings["lens"][lens][tag], settings["lens"]["Mine"]["XMP:LensModel"]) == ("user", "user")
+
+    settings = SettingsCatalog(local.parent).load()
+    assert (settings["lens"][lens][tag], settings["lens"]["Mine"]["XMP:LensModel"]) == ("user", "local")
+
+    monkeypatch.setenv(Constants.SETTINGS_ENV, os.pathsep.join([ str(env), "" ]))
+    settings = SettingsCatalog(local.parent).load()
+    assert not lens in settings["lens"]
+    assert settings["lens"]["Mine"]["XMP:LensModel"] == "local"
+    assert settings["camera"] == packaged["camera"]
+
+def test_bad_overlays(tmp_path, monkeypatch):
+    for contents in ( [ 1 ], { "lens": [] }, { "lens": { "A": 1 } }, { "lens": { "A": { "x": [ 1 ] } } } ):
+        path = _write(tmp_path / "bad.json", contents)
+        with pytest.raises(SettingsFile.Error, match="bad.json"):
+            SettingsFile(path, overlay=True).read()
+
+    (tmp_path / "bad.json").write_text("{")
+    monkeypatch.setenv(Constants.SETTINGS_ENV, str(tmp_path / "bad.json"))
+    with pytest.raises(SettingsCatalog.Error, match="Invalid JSON"):
+        SettingsCatalog().load()
+
+    # the packaged file must have every category; overlays needn't
+    path = _write(tmp_path / "partial.json", { "lens": {} })
+    assert SettingsFile(path, overlay=True).read() == { "lens": {} }
+    with pytest.raises(SettingsFile.Error, match="no \"camera\" category"):
+        SettingsFile(path).read()
+
+def test_local_settings_are_used_by_the_roll(roll, tmp_path):
+    shot_info_file, scans = roll
+    _write(shot_info_file.parent / Constants.LOCAL_SETTINGS_NAME, { "lab": { "The Darkroom": { "XMP-AnalogExif:Lab": "Local Lab" } } })
+    planpath = tmp_path / "plan.json"
+    assert App([ "--dry-run", "--plan", str(planpath), "-d", str(tmp_path), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ]).run() == 0
+    assert { frame.tags["XMP-AnalogExif:Lab"] for frame in Plan.load(planpath).frames } == { "Local Lab" }
@@ -0,0 +1,75 @@
+##############################################################################
+#
+# Name: test_shotinfo_stream.py
+#
+# Function:
+#       Tests that shot-info files are read a row at a time
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import io
+
+import pytest
+
+from annotate_film_scans.shotinfo import ShotInfoFile
+
+HEADER = "Frame, Frame2, Exposure, Aperture, Date, Time, Comment\n"
+
+class CountingStream(io.StringIO):
+    """ a text stream that counts the lines read from it """
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.lines = 0
+
+    def __next__(self):
+        line = super().__next__()
+        self.lines += 1
+        return line
+
+def test_rows_are_read_as_needed(shot_info):
+    rows = "1, , 1/125, f/8, 2023-06-03, 09:01:00-04:00, \n" + "".join(f"{i}, , 1/125, f/8, , , \n" for i in range(2, 101))
+    reader, _ = shot_info(HEADER + rows)
+    stream = CountingStream(HEADER + rows)
+
+    frames = reader.frames_from_csv_stream(stream)
+    iFrame, record = next(frames)
+    assert iFrame == 1
+    assert record.tags()["Composite:SubSecDateTimeOriginal"] == "2023:06:03 09:01:00-04:00"
+    assert stream.lines < 10
+
+    assert [ iFrame for iFrame, _ in frames ] == list(range(2, 101))
+    assert stream.lines == 101
+
+def test_errors_are_raised_when_reached(shot_info):
+    text = HEADER + "1, , 1/125, f/8, 2023-06-03, 09:00:00-04:00, \n2, , 1/125, f/8, , , \nx, , 1/125, f/8, , , \n"
+    reader, path = shot_info(text)
+    frames = reader.frames_from_path(path)
+    assert [ next(frames)[0], next(frames)[0] ] == [ 1, 2 ]
+    with pytest.raises(ShotInfoFile.Error, match="Not an int"):
+        next(frames)
+
+def test_repeated_frames_are_merged(shot_info):
+    text = HEADER + (
+        "1, 3, 1/125, f/8, 2023-06-03, 09:00:00-04:00, \n"
+        "4, , 1/250, f/4, , , \n"
+        "2, , 1/60, , , , second look\n"
+        )
+    reader, path = shot_info(text, argv=[ "--time-delta", "60" ])
+    frames = reader.read_from_path(path)
+    assert sorted(frames) == [ 1, 2, 3, 4 ]
+    assert frames[1]["ExifIFD:ExposureTime"] == "1/125"
+    assert frames[2]["ExifIFD:ExposureTime"] == "1/60"
+    # the later entry wins; and its settings and time carry on from the
+    # row before it in the file.
+    assert frames[2]["ExifIFD:FNumber"] == frames[4]["ExifIFD:FNumber"] == 4.0
+    assert frames[4]["Composite:SubSecDateTimeOriginal"] == "2023:06:03 09:03:00-04:00"
+    assert frames[2]["Composite:SubSecDateTimeOriginal"] == "2023:06:03 09:04:00-04:00"
+    assert frames[2]["file"] == 5
+    assert frames[4]["file"] == 4
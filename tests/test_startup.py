@@ -0,0 +1,68 @@
+##############################################################################
+#
+# Name: test_startup.py
+#
+# Function:
+#       Tests that --version, --help and argument errors don't import
+#       more than they need
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO
+
+#
+# Run the command line in a fresh interpreter; return its output, and
+# the modules it imported.
+#
+def _run(args: list) -> tuple:
+    script = (
+        "import json, sys\n"
+        f"sys.argv = [ 'annotate_film_scans' ] + {args!r}\n"
+        "from annotate_film_scans.__main__ import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(json.dumps(sorted(sys.modules)), file=sys.stderr)\n"
+        )
+    result = subprocess.run([ sys.executable, "-c", script ], cwd=REPO, capture_output=True, text=True)
+    return result.stdout, set(json.loads(result.stderr.splitlines()[-1]))
+
+# the modules that only a real run needs
+HEAVY = {
+    "annotate_film_scans.exiftool",
+    "annotate_film_scans.shotinfo",
+    "annotate_film_scans.xmp",
+    "annotate_film_scans.contenthash",
+    "annotate_film_scans.catalog",
+    "annotate_film_scans.ordering",
+    "concurrent.futures",
+    "subprocess",
+    }
+
+def test_version():
+    out, modules = _run([ "--version" ])
+    slow_out, _ = _run([ "-v", "--version" ])
+    assert out == slow_out
+    assert not "annotate_film_scans.app" in modules
+    assert not modules & HEAVY
+
+@pytest.mark.parametrize("args", [ [ "--help" ], [ "-d", "no-such-directory" ] ])
+def test_help_and_errors(args):
+    out, modules = _run(args)
+    assert out.startswith("usage:") or args != [ "--help" ]
+    assert "annotate_film_scans.app" in modules
+    assert not modules & HEAVY
@@ -0,0 +1,68 @@
+##############################################################################
+#
+# Name: test_stats.py
+#
+# Function:
+#       Tests for the run statistics, --stats and --stats-json
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import threading
+
+from annotate_film_scans.app import App
+from annotate_film_scans.stats import Stats
+
+def test_stages_and_counters_from_threads():
+    stats = Stats()
+
+    def work():
+        for _ in range(100):
+            with stats.stage("work"):
+                stats.count("items")
+
+    threads = [ threading.Thread(target=work) for _ in range(8) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    contents = stats.to_json()
+    assert contents["stages"]["work"]["calls"] == 800
+    assert contents["counters"] == { "items": 800 }
+
+def test_frames_are_sorted_and_summarized():
+    stats = Stats()
+    stats.frame(2, "b.jpg", "002-b.jpg", "written", 0.1, bytes_in=10, bytes_out=12, exiftool_status=0)
+    stats.frame(1, "a.jpg", "001-a.jpg", "current", 0.0)
+    stats.frame(3, "c.jpg", "003-c.jpg", "failed", 0.1, bytes_in=10, exiftool_status=1, error="bad")
+    stats.status = "failed"
+
+    assert [ record["frame"] for record in stats.to_json()["frames"] ] == [ 1, 2, 3 ]
+    table = stats.format_table()
+    assert "frames: 3 (1 current, 1 failed, 1 written); 20 bytes in, 12 bytes out; exiftool errors: 1" in table
+    assert "status failed" in table
+
+def test_stats_json(roll, tmp_path, capsys):
+    shot_info_file, scans = roll
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    statspath = tmp_path / "stats.json"
+    argv = [ "--stats", "--stats-json", str(statspath), "-d", str(outdir), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ]
+    assert App(argv).run() == 0
+
+    contents = json.loads(statspath.read_text())
+    assert contents["status"] == "ok"
+    assert [ record["frame"] for record in contents["frames"] ] == sorted(record["frame"] for record in contents["frames"])
+    assert len(contents["frames"]) == len(scans)
+    assert all(record["status"] == "written" and record["exiftool_status"] == 0 for record in contents["frames"])
+    assert sum(record["bytes_in"] for record in contents["frames"]) == sum(scan.stat().st_size for scan in scans)
+    assert contents["stages"]["write frame"]["calls"] == len(scans)
+    assert f"frames: {len(scans)} ({len(scans)} written)" in capsys.readouterr().out
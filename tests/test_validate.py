@@ -0,0 +1,82 @@
+##############################################################################
+#
+# Name: test_validate.py
+#
+# Function:
+#       Tests for the validate subcommand
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+
+import pytest
+
+from annotate_film_scans.exiftool import ExifTool
+from annotate_film_scans.validate import ValidateApp
+from benchmarks.synthetic import make_roll
+
+@pytest.fixture(autouse=True)
+def no_exiftool(monkeypatch):
+    """ validating mustn't start exiftool """
+    def start(self):
+        raise AssertionError("exiftool started")
+    monkeypatch.setattr(ExifTool, "start", start)
+
+def _validate(argv: list, capsys) -> tuple:
+    status = ValidateApp([ "--json", "-" ] + argv).run()
+    return status, { result["roll"]: result for result in json.loads(capsys.readouterr().out) }
+
+def test_tree_and_files(tmp_path, capsys):
+    _, scans = make_roll(tmp_path / "a", 20, image_size=16)
+    before = { scan: scan.stat().st_mtime_ns for scan in scans }
+    make_roll(tmp_path / "b", 10, image_size=16)
+    (tmp_path / "b" / "shots-bench.csv").rename(tmp_path / "b" / "roll-b.csv")
+
+    status, results = _validate([ "-j", "1", str(tmp_path / "a"), str(tmp_path / "b" / "roll-b.csv") ], capsys)
+    assert status == 0
+    assert results["a"]["status"] == "ok"
+    assert results["a"]["frames"] == results["a"]["scans"] == len(scans)
+    # a shot-info file named directly finds its scans as batch does
+    named = results[str(tmp_path / "b" / "roll-b.csv")]
+    assert named["status"] == "ok" and named["scans"] == named["frames"] != 0
+    assert { scan: scan.stat().st_mtime_ns for scan in scans } == before
+    assert not (tmp_path / "a" / "out").exists()
+
+def test_count_mismatch(tmp_path, capsys):
+    _, scans = make_roll(tmp_path / "a", 20, image_size=16)
+    status, results = _validate([ "--count", str(len(scans) + 2), str(tmp_path / "a") ], capsys)
+    assert status == 1
+    assert results["a"]["status"] == "failed"
+    assert "were not used" in results["a"]["error"]
+
+def test_no_scans_yet(tmp_path, capsys):
+    shot_info_file, scans = make_roll(tmp_path / "a", 20, image_size=16)
+    for scan in scans:
+        scan.unlink()
+    status, results = _validate([ str(shot_info_file) ], capsys)
+    assert status == 0
+    assert results[str(shot_info_file)]["scans"] == None
+    assert results[str(shot_info_file)]["frames"] == len(scans)
+
+def test_missing_file(tmp_path, capsys):
+    status, results = _validate([ str(tmp_path / "shots-missing.csv") ], capsys)
+    assert status == 1
+    assert results[str(tmp_path / "shots-missing.csv")]["error"] == "no such file"
+
+def test_processes_match_one(tmp_path, capsys):
+    for i in range(4):
+        make_roll(tmp_path / f"roll{i}", 15, image_size=16, seed=i)
+    (tmp_path / "roll2" / "scan00001.jpg").unlink()
+
+    one = _validate([ "-j", "1", str(tmp_path) ], capsys)
+    many = _validate([ "-j", "3", str(tmp_path) ], capsys)
+    assert one == many
+    assert one[0] == 1
+    assert [ result["status"] for result in one[1].values() ] == [ "ok", "ok", "failed", "ok" ]
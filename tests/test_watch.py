@@ -0,0 +1,171 @@
+##############################################################################
+#
+# Name: test_watch.py
+#
+# Function:
+#       Tests for the watch subcommand, and the directory watchers
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from annotate_film_scans.constants import Constants
+from annotate_film_scans.dirwatch import InotifyWatcher, PollingWatcher
+from annotate_film_scans.exiftool import ExifToolPool
+from annotate_film_scans.watch import WatchApp
+from benchmarks.synthetic import make_roll
+from conftest import REPO
+
+@pytest.fixture
+def inotify(tmp_path):
+    try:
+        watcher = InotifyWatcher([ tmp_path ], exclude=lambda path: path.name == "excluded")
+    except InotifyWatcher.Error as e:
+        pytest.skip(str(e))
+    with watcher:
+        yield watcher
+
+def test_inotify_reports_where(tmp_path, inotify):
+    (tmp_path / "a").mkdir()
+    assert inotify.wait(5) == { tmp_path, tmp_path / "a" }
+    assert inotify.wait(0) == set()
+
+    # a new directory is watched, and a file finished in it is seen
+    (tmp_path / "a" / "scan00001.jpg").write_bytes(b"x")
+    assert inotify.wait(5) == { tmp_path / "a" }
+
+    (tmp_path / "excluded").mkdir()
+    inotify.wait(5)
+    (tmp_path / "excluded" / "scan00001.jpg").write_bytes(b"x")
+    assert inotify.wait(0.2) == set()
+
+def test_inotify_tree_moved_in(tmp_path, inotify):
+    outside = tmp_path.parent / (tmp_path.name + "-outside")
+    (outside / "2023" / "roll").mkdir(parents=True)
+    (outside / "2023" / "roll" / "shots-x.csv").write_text("Frame\n")
+    (outside / "2023").rename(tmp_path / "2023")
+
+    # the whole tree is reported, and watched
+    assert inotify.wait(5) == { tmp_path, tmp_path / "2023", tmp_path / "2023" / "roll" }
+    (tmp_path / "2023" / "roll" / "scan00001.jpg").write_bytes(b"x")
+    assert inotify.wait(5) == { tmp_path / "2023" / "roll" }
+
+def test_polling(tmp_path):
+    watcher = PollingWatcher([ tmp_path ], 0.05)
+    start = time.monotonic()
+    assert watcher.wait() == None
+    assert watcher.wait(0) == None
+    assert time.monotonic() - start < 1
+
+#
+# Drive the watch loop a step at a time, in this thread: look at
+# everything, start what's ready, and wait for it to finish.
+#
+def _step(app: WatchApp, executor: ThreadPoolExecutor, exiftool: ExifToolPool) -> None:
+    app._look(None)
+    app._start_ready(executor, exiftool)
+    for future, _ in list(app.running.values()):
+        future.result()
+    app._collect()
+
+def _lines(capsys) -> list:
+    return [ line.split(":")[0] for line in capsys.readouterr().out.splitlines() ]
+
+def test_rolls_are_run_once_settled(tmp_path, capsys):
+    _, scans = make_roll(tmp_path / "roll-a", 6, image_size=32)
+    app = WatchApp([ "--settle", "0", "--poll", str(tmp_path) ])
+    with ExifToolPool(app.log) as exiftool, ThreadPoolExecutor(max_workers=1) as executor:
+        _step(app, executor, exiftool)
+        assert _lines(capsys) == [ "roll-a" ]
+        assert len(list((tmp_path / "roll-a" / Constants.BATCH_OUTPUT_DIR).glob("*.jpg"))) == len(scans)
+
+        # nothing changed, so nothing is run; nor is the output a roll
+        _step(app, executor, exiftool)
+        assert _lines(capsys) == []
+        assert app.pending == {}
+
+        # another roll arrives, and the first one changes
+        make_roll(tmp_path / "2023" / "roll-b", 4, image_size=32)
+        os.utime(scans[0], ns=(0, 0))
+        _step(app, executor, exiftool)
+        assert sorted(_lines(capsys)) == [ "2023/roll-b", "roll-a" ]
+
+def test_settle_and_ready_file(tmp_path, capsys):
+    make_roll(tmp_path / "roll", 4, image_size=32)
+    app = WatchApp([ "--settle", "60", "--ready-file", "DONE", "--poll", str(tmp_path) ])
+    with ExifToolPool(app.log) as exiftool, ThreadPoolExecutor(max_workers=1) as executor:
+        # still settling
+        _step(app, executor, exiftool)
+        assert list(app.pending) == [ tmp_path / "roll" ]
+        assert _lines(capsys) == []
+
+        # settled, but not ready
+        app.pending[tmp_path / "roll"][1] -= 60
+        _step(app, executor, exiftool)
+        assert list(app.pending) == [ tmp_path / "roll" ]
+        assert app._timeout() == None
+
+        # the marker is a change, so the roll settles again
+        (tmp_path / "roll" / "DONE").write_text("")
+        _step(app, executor, exiftool)
+        assert 59 < app._timeout() <= 60
+        app.pending[tmp_path / "roll"][1] -= 60
+        _step(app, executor, exiftool)
+        assert _lines(capsys) == [ "roll" ]
+
+def test_changing_files_are_not_run(tmp_path, capsys):
+    _, scans = make_roll(tmp_path / "roll", 4, image_size=32)
+    app = WatchApp([ "--settle", "0", "--poll", str(tmp_path) ])
+    app._look(None)
+    # a file changes after the roll was seen, but before it's started
+    os.utime(scans[-1], ns=(0, 0))
+    with ExifToolPool(app.log) as exiftool, ThreadPoolExecutor(max_workers=1) as executor:
+        app._start_ready(executor, exiftool)
+        assert app.running == {}
+        assert app.pending[tmp_path / "roll"][0] == app._signature(tmp_path / "roll")
+        _step(app, executor, exiftool)
+    assert _lines(capsys) == [ "roll" ]
+
+#
+# The whole thing, as it's run: a roll that arrives is annotated, and
+# SIGTERM stops it cleanly.
+#
+def test_watch_command(tmp_path):
+    (tmp_path / "scans").mkdir()
+    process = subprocess.Popen(
+        [ sys.executable, "-m", "annotate_film_scans", "watch", "-v", "--settle", "0.2", str(tmp_path / "scans") ],
+        cwd=REPO, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+    lines = queue.Queue()
+    threading.Thread(target=lambda: [ lines.put(line) for line in process.stdout ], daemon=True).start()
+    try:
+        # wait until it's watching before the roll is moved in
+        deadline = time.monotonic() + 30
+        while not "watching" in process.stderr.readline():
+            assert process.poll() == None and time.monotonic() < deadline
+        _, scans = make_roll(tmp_path / "roll", 6, image_size=32)
+        (tmp_path / "roll").rename(tmp_path / "scans" / "roll")
+        line = lines.get(timeout=30)
+        assert line.startswith(f"roll: {len(scans)} frames, {len(scans)} written, 0 current")
+        assert line.rstrip().endswith(": ok")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        status = process.wait(timeout=30)
+    assert status == 0
+    assert len(list((tmp_path / "scans" / "roll" / Constants.BATCH_OUTPUT_DIR).glob("*.jpg"))) == len(scans)
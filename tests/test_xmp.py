@@ -0,0 +1,172 @@
+##############################################################################
+#
+# Name: test_xmp.py
+#
+# Function:
+#       Tests for the XMP sidecar writer, --sidecar, and the exiftool
+#       config for --define-namespaces
+#
+# Copyright notice and license:
+#       See LICENSE.md
+#
+# Author:
+#       Terry Moore
+#
+##############################################################################
+
+#### imports ####
+import json
+import logging
+import os
+import pathlib
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from annotate_film_scans.app import App
+from annotate_film_scans.exiftool import ExifTool
+from annotate_film_scans.plan import Plan
+from annotate_film_scans import xmp
+from annotate_film_scans.xmp import NAMESPACES, build_sidecar, exiftool_config
+
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+
+def _properties(text: str) -> dict:
+    """ the properties in a sidecar, as { "prefix:Name": text or [ items ] } """
+    prefixes = { uri: prefix for prefix, uri in NAMESPACES.items() }
+    description = ET.fromstring(text.split("\n", 1)[1].rsplit("<?xpacket", 1)[0]).find(f"{RDF}RDF/{RDF}Description")
+    result = dict()
+    for element in description:
+        uri, _, name = element.tag[1:].partition("}")
+        items = element.findall(f".//{RDF}li")
+        result[f"{prefixes[uri]}:{name}"] = [ item.text for item in items ] if len(element) != 0 else element.text
+    return result
+
+def test_conversions():
+    properties = _properties(build_sidecar({
+        "ExifIFD:ExposureTime": "1/250",
+        "ExifIFD:FNumber": 8.0,
+        "EXIF:FocalLength": "75.0 mm",
+        "ExifIFD:FocalLengthIn35mmFormat": "40 mm",
+        "EXIF:MaxApertureValue": 3.5,
+        "Composite:SubSecDateTimeOriginal": "2023:06:03 09:00:00-04:00",
+        "ExifIFD:CreateDate": "2023:06:03 09:00:00",
+        }))
+    assert properties == {
+        "exif:ExposureTime": "1/250",
+        "exif:FNumber": "8/1",
+        "exif:FocalLength": "75/1",
+        "exif:FocalLengthIn35mmFilm": "40",
+        "exif:MaxApertureValue": "361/100",
+        "exif:DateTimeOriginal": "2023-06-03T09:00:00-04:00",
+        "photoshop:DateCreated": "2023-06-03T09:00:00-04:00",
+        "exif:DateTimeDigitized": "2023-06-03T09:00:00",
+        }
+
+def test_containers_and_weak_tags():
+    properties = _properties(build_sidecar({
+        "XMP:Creator": "Terrill Moore",
+        "IFD0:Artist": "Someone Else",
+        "EXIF:Copyright": "Copyright Terrill Moore",
+        "ExifIFD:UserComment": "Tom & Jerry <2>",
+        }))
+    assert properties["dc:creator"] == [ "Terrill Moore" ]
+    assert properties["dc:rights"] == [ "Copyright Terrill Moore" ]
+    assert properties["exif:UserComment"] == [ "Tom & Jerry <2>" ]
+
+    # a weak tag only fills in for a missing one
+    assert _properties(build_sidecar({ "IFD0:Artist": "Someone Else" }))["dc:creator"] == [ "Someone Else" ]
+
+def test_custom_namespaces():
+    text = build_sidecar({
+        "XMP-AnalogExif:Film": "Tri-X 400",
+        "XMP-analogexif:filmmaker": "Kodak",
+        "XMP:Lab": "The Darkroom Lab",
+        "XMP-AnnotateFilmScans:DevelopmentNotes": "push 1",
+        "file": 1,
+        })
+    assert _properties(text) == {
+        "AnalogExif:Film": "Tri-X 400",
+        "AnalogExif:FilmMaker": "Kodak",
+        "AnalogExif:Lab": "The Darkroom Lab",
+        "AnnotateFilmScans:DevelopmentNotes": "push 1",
+        }
+    assert f'xmlns:AnalogExif="{NAMESPACES["AnalogExif"]}"' in text
+    assert not "xmlns:tiff" in text
+
+def test_unmapped_tags_warn_once(caplog, monkeypatch):
+    monkeypatch.setattr(xmp, "_unmapped_reported", set())
+    with caplog.at_level(logging.WARNING):
+        for _ in range(2):
+            assert _properties(build_sidecar({ "MakerNotes:Whatever": "x", "XMP-AnalogExif:NotAProperty": "y", "IFD0:XPComment": "z" })) == {}
+    warnings = [ record.getMessage() for record in caplog.records ]
+    assert len(warnings) == 2
+    assert any("MakerNotes:Whatever" in warning for warning in warnings)
+    assert any("XMP-AnalogExif:NotAProperty" in warning for warning in warnings)
+
+def test_sidecar_mode(roll, tmp_path):
+    shot_info_file, scans = roll
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    planpath = tmp_path / "plan.json"
+    assert App([ "--sidecar", "--dry-run", "--plan", str(planpath), "-d", str(outdir), "-s", str(shot_info_file), "--" ] + [ str(scan) for scan in scans ]).run() == 0
+    assert App([ "--execute-plan", str(planpath) ]).run() == 0
+
+    plan = Plan.load(planpath)
+    assert len(plan.frames) == len(scans)
+    for frame in plan.frames:
+        assert frame.output.read_bytes() == frame.input.read_bytes()
+        sidecar = frame.output.with_suffix(".xmp").read_text(encoding="utf-8")
+        assert sidecar == build_sidecar(frame.tags)
+        assert _properties(sidecar)["AnalogExif:Film"] == frame.tags["XMP-AnalogExif:Film"]
+
+@pytest.mark.skipif(shutil.which("perl") == None, reason="needs perl")
+def test_config_is_valid_perl(tmp_path):
+    path = tmp_path / "config.pl"
+    path.write_text(exiftool_config())
+    result = subprocess.run([ "perl", "-c", str(path) ], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    for prefix in xmp.CUSTOM_PROPERTIES:
+        assert f"{{'Image::ExifTool::XMP::Main'}}{{{prefix}}} = {{" in path.read_text()
+
+def test_define_namespaces_adds_config(roll):
+    _, scans = roll
+    with ExifTool() as exiftool:
+        exiftool.execute([ "-json", str(scans[0]) ])
+        assert not "-config" in exiftool.process.args
+    with ExifTool(define_namespaces=True) as exiftool:
+        exiftool.execute([ "-json", str(scans[0]) ])
+        args = exiftool.process.args
+        assert args[1] == "-config"
+        assert pathlib.Path(args[2]).read_text() == exiftool_config()
+
+def _real_exiftool() -> str | None:
+    """ exiftool itself, not the benchmarks' stand-in, if installed """
+    stand_in = pathlib.Path(__file__).resolve().parent.parent / "benchmarks" / "bin"
+    path = os.pathsep.join(entry for entry in os.environ["PATH"].split(os.pathsep) if pathlib.Path(entry).resolve() != stand_in)
+    return shutil.which("exiftool", path=path)
+
+#
+# The point of --define-namespaces: exiftool then writes the same XMP as
+# the sidecar writer does. This needs the real exiftool.
+#
+@pytest.mark.skipif(_real_exiftool() == None, reason="needs exiftool")
+def test_sidecar_matches_exiftool(tmp_path):
+    settings = {
+        "XMP-dc:Creator": "Terrill Moore",
+        "XMP-dc:Rights": "Terrill Moore",
+        "ExifIFD:ExposureTime": "1/250",
+        "ExifIFD:FNumber": 8.0,
+        "EXIF:FocalLength": "75.0 mm",
+        "XMP-AnalogExif:Film": "Tri-X 400",
+        "XMP-AnalogExif:Lab": "The Darkroom Lab",
+        "XMP-AnnotateFilmScans:DevelopmentNotes": "push 1",
+        }
+    with ExifTool(executable=_real_exiftool(), define_namespaces=True) as exiftool:
+        written = tmp_path / "exiftool.xmp"
+        exiftool.execute([ "-json=-", "-o", str(written) ], input=json.dumps([ settings ]))
+    expected = { key: value for key, value in _properties(build_sidecar(settings)).items() if key.partition(":")[0] in ("dc", "AnalogExif", "AnnotateFilmScans") }
+    actual = { key: value for key, value in _properties(written.read_text(encoding="utf-8")).items() if key in expected }
+    assert actual == expected